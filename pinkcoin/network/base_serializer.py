@@ -5,23 +5,221 @@ serialization and deserialization.
 
 import struct
 import hashlib
-from io import BytesIO
 from collections import OrderedDict
+from operator import attrgetter
+from threading import Lock
+from typing import Optional
 
 from . import data_fields
 from . import params
+from .reader import BufferReader, StreamReader
 
 
+class StructRun:
+    """
+    A run of consecutive fixed width fields of a serializer
+    encoded and decoded with one precompiled struct.
+
+    :param fields: list of (field_name, field) pairs
+    """
+    def __init__(self, fields):
+        byte_order = "<"
+        codes = []
+        for _, field_obj in fields:
+            field_order = self.byte_order(field_obj)
+            if field_order:
+                byte_order = field_order
+            codes.append(field_obj.struct_format.lstrip("<>!=@"))
+
+        self.names = tuple(field_name for field_name, _ in fields)
+        self.getter = attrgetter(*self.names)
+        if len(self.names) == 1:
+            single_getter = self.getter
+            self.getter = lambda obj: (single_getter(obj),)
+        self.struct = struct.Struct(byte_order + "".join(codes))
+        self.size = self.struct.size
+        # Conversions are only done for fields which need them.
+        self.decoders = tuple(
+            field_obj.from_struct
+            if type(field_obj).from_struct is not data_fields.Field.from_struct else None
+            for _, field_obj in fields
+        )
+        self.encoders = tuple(
+            field_obj.to_struct
+            if type(field_obj).to_struct is not data_fields.Field.to_struct else None
+            for _, field_obj in fields
+        )
+        self.converts = any(self.decoders) or any(self.encoders)
+
+    @staticmethod
+    def byte_order(field_obj):
+        """
+        Returns explicit byte order of the field struct format
+        or None when the format doesn't depend on it.
+
+        :param field_obj: fixed width field
+        """
+        field_format = field_obj.struct_format
+        if field_format[0] in "<>!=@":
+            return field_format[0]
+        return None
+
+    def unpack(self, reader):
+        """
+        Decodes values of all fields in the run.
+
+        :param reader: BufferReader positioned at the run data
+        """
+        values = reader.unpack(self.struct)
+        if not self.converts:
+            return values
+        return tuple(
+            decode(value) if decode else value
+            for decode, value in zip(self.decoders, values)
+        )
+
+    def pack(self, values):
+        """
+        Encodes values of all fields in the run.
+
+        :param values: values of fields in the run order
+        """
+        if self.converts:
+            values = [
+                encode(value) if encode else value
+                for encode, value in zip(self.encoders, values)
+            ]
+        return self.struct.pack(*values)
+
+    def pack_into(self, buf, offset, values):
+        """
+        Encodes values of all fields in the run into the buffer.
+
+        :param buf: buffer to write to
+        :param offset: position of the run in the buffer
+        :param values: values of fields in the run order
+        """
+        if self.converts:
+            values = [
+                encode(value) if encode else value
+                for encode, value in zip(self.encoders, values)
+            ]
+        self.struct.pack_into(buf, offset, *values)
+        return offset + self.size
+
+    def __repr__(self):
+        return "<{} Format=[{}] Fields=[{}]>".format(
+            self.__class__.__name__, self.struct.format, ", ".join(self.names)
+        )
+
 # pylint: disable=E1101
 class SerializerMeta(type):
     """
     The serializer meta class. This class will create an attribute
     called '_fields' in each serializer with the ordered dict of
-    fields present on the subclasses.
+    fields present on the subclasses, an attribute called
+    '_layout' with the fields grouped into struct runs and
+    '_fixed_size' with the binary size of serializers having
+    only fixed width fields (None for others).
+
+    When the model class uses __slots__, the meta class verifies
+    that every field has a slot and creates '_model_factory', a
+    function building the model from positional field values.
     """
     def __new__(cls, name, bases, attrs):
         attrs["_fields"] = cls.get_fields(bases, attrs, data_fields.Field)
-        return super().__new__(cls, name, bases, attrs)
+        attrs["_layout"] = cls.get_layout(attrs["_fields"])
+        attrs["_fixed_size"] = cls.get_fixed_size(attrs["_layout"])
+        new_cls = super().__new__(cls, name, bases, attrs)
+        model_class = getattr(new_cls, "model_class", None)
+        new_cls._model_factory = None
+        if model_class is not None and cls.has_slots(model_class):
+            new_cls._model_factory = staticmethod(
+                cls.get_model_factory(name, model_class, list(attrs["_fields"]))
+            )
+        return new_cls
+
+    @staticmethod
+    def get_fixed_size(layout):
+        """
+        Returns binary size of the layout made of struct runs only.
+        """
+        if all(isinstance(step, StructRun) for step in layout):
+            return sum(step.size for step in layout)
+        return None
+
+    @staticmethod
+    def has_slots(model_class):
+        """
+        Checks if instances of the model class have no __dict__.
+        """
+        return all("__slots__" in vars(klass) for klass in model_class.__mro__[:-1])
+
+    @staticmethod
+    def get_model_factory(name, model_class, field_names):
+        """
+        This method will verify model __slots__ against the fields
+        and generate a function which creates the model (without
+        calling its __init__) and sets all the fields at once.
+        """
+        slots = set()
+        for klass in model_class.__mro__[:-1]:
+            class_slots = vars(klass)["__slots__"]
+            slots.update((class_slots,) if isinstance(class_slots, str) else class_slots)
+        missing = [field_name for field_name in field_names if field_name not in slots]
+        if missing:
+            raise TypeError("{}: fields [{}] have no slots in {}.".format(
+                name, ", ".join(missing), model_class.__name__
+            ))
+
+        namespace = {"new": object.__new__, "model_class": model_class}
+        lines = [f"def build_{model_class.__name__}({', '.join(field_names)}):"]
+        if model_class.__setattr__ is object.__setattr__:
+            lines.append("    model = new(model_class)")
+            lines.extend(f"    model.{field_name} = {field_name}" for field_name in field_names)
+        else:
+            # Fields are set on a subclass without the model __setattr__,
+            # then the model gets its class (the layout is the same).
+            namespace["fields_class"] = type(
+                f"{model_class.__name__}Fields", (model_class,),
+                {"__slots__": (), "__setattr__": object.__setattr__},
+            )
+            lines.append("    model = new(fields_class)")
+            lines.extend(f"    model.{field_name} = {field_name}" for field_name in field_names)
+            lines.append("    model.__class__ = model_class")
+        lines.append("    return model")
+        exec("\n".join(lines), namespace)  # pylint: disable=exec-used
+        return namespace[f"build_{model_class.__name__}"]
+
+    @classmethod
+    def get_layout(cls, fields):
+        """
+        This method will group consecutive fixed width fields
+        into struct runs. Returns a list where each item is either
+        a StructRun or a (field_name, field) pair of a variable
+        length field.
+        """
+        layout = []
+        run = []
+        run_order = None
+        for field_name, field_obj in fields.items():
+            if field_obj.struct_format is None:
+                if run:
+                    layout.append(StructRun(run))
+                    run, run_order = [], None
+                layout.append((field_name, field_obj))
+                continue
+
+            field_order = StructRun.byte_order(field_obj)
+            if run and field_order and run_order and field_order != run_order:
+                layout.append(StructRun(run))
+                run, run_order = [], None
+            run.append((field_name, field_obj))
+            run_order = run_order or field_order
+
+        if run:
+            layout.append(StructRun(run))
+        return layout
 
     @classmethod
     def get_fields(cls, bases, attrs, field_class):
@@ -56,58 +254,345 @@ class Serializer(SerializerABC):
 
         class VerAckSerializer(Serializer):
             model_class = VerAck
+
+    Serializers with retain_raw set keep the binary data models
+    were deserialized from in model '_raw' attribute (and reset
+    memoised '_hash'). Such models (RawDataModel subclasses)
+    are serialized by copying the retained data until a field
+    is set.
+
+    Payloads of received messages bigger than max_payload_size
+    (params.MAX_PROTOCOL_MESSAGE_LENGTH when not set) are rejected.
+    Serializers with only fixed width fields also reject payloads of
+    other size, unless exact_size is disabled.
     """
+    retain_raw = False
+    max_payload_size: Optional[int] = None
+    exact_size = True
+
     def serialize(self, obj, fields=None):
         """
         This method will receive an object and then will serialize
         it according to the fields declared on the serializer.
 
         :param obj: The object to serializer.
+        :param fields: Optional list of names of serialized fields.
+        """
+        if fields:
+            bin_data = bytearray()
+            self.encode_into(bin_data, obj, fields)
+        else:
+            bin_data = bytearray(self.serialized_size(obj))
+            self.serialize_into(bin_data, 0, obj)
+        return bytes(bin_data)
+
+    def serialized_size(self, obj):
+        """
+        This method will calculate the size of the serialized object.
+
+        :param obj: The object to serialize.
+        """
+        if self._fixed_size is not None:
+            return self._fixed_size
+        if self.retain_raw:
+            raw = getattr(obj, "_raw", None)
+            if raw is not None:
+                return len(raw)
+
+        size = 0
+        for step in self._layout:
+            if isinstance(step, StructRun):
+                size += step.size
+            else:
+                field_name, field_obj = step
+                size += field_obj.serialized_size(getattr(obj, field_name, None))
+        return size
+
+    def serialize_into(self, buf, offset, obj):
+        """
+        This method will serialize the object into preallocated
+        buffer of at least serialized_size(obj) bytes after offset.
+
+        :param buf: bytearray (or writable memoryview) to write to
+        :param offset: position of the serialized object in the buffer
+        :param obj: The object to serialize.
+        :returns: position after the serialized object
         """
-        bin_data = BytesIO()
-        for field_name, field_obj in self._fields.items():
-            if fields:
-                if field_name not in fields:
-                    continue
-            attr = getattr(obj, field_name, None)
-            field_obj.parse(attr)
-            bin_data.write(field_obj.serialize())
+        if self.retain_raw:
+            raw = getattr(obj, "_raw", None)
+            if raw is not None:
+                end = offset + len(raw)
+                buf[offset:end] = raw
+                return end
 
-        return bin_data.getvalue()
+        for step in self._layout:
+            if isinstance(step, StructRun):
+                offset = step.pack_into(buf, offset, step.getter(obj))
+            else:
+                field_name, field_obj = step
+                offset = field_obj.serialize_into(buf, offset, getattr(obj, field_name, None))
+        return offset
+
+    def encode_into(self, buf, obj, fields=None):
+        """
+        This method will serialize the object and append serialized
+        data to the buffer. It doesn't keep any state in serializer
+        or fields, so it's safe to use concurrently.
+
+        :param buf: bytearray to extend
+        :param obj: The object to serialize.
+        :param fields: Optional list of names of serialized fields.
+        """
+        if fields:
+            for field_name, field_obj in self._fields.items():
+                if field_name in fields:
+                    field_obj.encode_into(buf, getattr(obj, field_name, None))
+            return
+
+        if self.retain_raw:
+            raw = getattr(obj, "_raw", None)
+            if raw is not None:
+                buf += raw
+                return
+
+        for step in self._layout:
+            if isinstance(step, StructRun):
+                buf += step.pack(step.getter(obj))
+            else:
+                field_name, field_obj = step
+                field_obj.encode_into(buf, getattr(obj, field_name, None))
 
     def deserialize(self, stream):
         """
         This method will read the stream and then will deserialize the
         binary data information present on it.
 
-        :param stream: A file-like object (BytesIO, file, socket, etc.)
+        :param stream: A BufferReader or a file-like object (BytesIO, file, socket, etc.),
+                       only the bytes of the object are read from file-like objects
         """
-        model = self.model_class()
-        for field_name, field_obj in self._fields.items():
-            value = field_obj.deserialize(stream)
-            setattr(model, field_name, value)
+        if not isinstance(stream, (BufferReader, StreamReader)):
+            stream = StreamReader(stream)
+
+        start = stream.offset
+        if self._model_factory is not None:
+            values = []
+            for step in self._layout:
+                if isinstance(step, StructRun):
+                    values.extend(step.unpack(stream))
+                else:
+                    values.append(step[1].deserialize(stream))
+            model = self._model_factory(*values)
+        else:
+            model = self.model_class()
+            for step in self._layout:
+                if isinstance(step, StructRun):
+                    values = step.unpack(stream)
+                    for field_name, value in zip(step.names, values):
+                        setattr(model, field_name, value)
+                else:
+                    field_name, field_obj = step
+                    setattr(model, field_name, field_obj.deserialize(stream))
+
+        if self.retain_raw:
+            # Bypasses RawDataModel.__setattr__, which is only needed for fields.
+            object.__setattr__(model, "_raw", stream.slice(start, stream.offset))
+            object.__setattr__(model, "_hash", None)
         return model
 
+    def skip(self, stream):
+        """
+        This method will move the reader past the serialized
+        object without deserializing it.
+
+        :param stream: A BufferReader
+        """
+        for step in self._layout:
+            if isinstance(step, StructRun):
+                stream.skip(step.size)
+            else:
+                step[1].skip(stream)
+
+class RawDataModel:
+    """
+    Base of models keeping binary data they were deserialized from
+    in '_raw' and their memoised hash in '_hash'. Setting any other
+    attribute drops both, so modified models are serialized and hashed
+    from their fields. Changes inside field values (e.g. appending
+    to a list of inputs) aren't noticed, clear_raw() has to be called.
+    """
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        if name not in ("_raw", "_hash"):
+            object.__setattr__(self, "_raw", None)
+            object.__setattr__(self, "_hash", None)
+        object.__setattr__(self, name, value)
+
+    def clear_raw(self):
+        """
+        Drops retained binary data and memoised hash.
+        """
+        self._raw = None
+        self._hash = None
+
+    def __getstate__(self):
+        # Retained memoryview is pickled as bytes.
+        state = dict(getattr(self, "__dict__", {}))
+        for cls in type(self).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                if hasattr(self, name):
+                    state[name] = getattr(self, name)
+        if state.get("_raw") is not None:
+            state["_raw"] = bytes(state["_raw"])
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
 class SerializableMessage:
     """
     Represents message serialized to object.
     """
-    def get_message(self, network_type="main"):
-        """Get the binary version of this message, complete with header."""
+    __slots__ = ()
+
+    # Message payload doesn't depend on the message
+    # object, its frame is built once per network type.
+    constant_frame = False
+
+    def get_message(self, network_type="main", cached=False):
+        """
+        Get the binary version of this message, complete with header.
+        Frames of constant messages are returned from FRAME_CACHE
+        (as bytes shared by all callers), other frames are bytearrays.
+
+        :param network_type: network type of the message header
+        :param cached: look up the frame in FRAME_CACHE by payload,
+                       useful when the same message is sent to many peers
+        """
+        if self.constant_frame:
+            return FRAME_CACHE.get_constant(network_type, self)
+        if cached:
+            return FRAME_CACHE.get(network_type, self)
+        return self.build_frame(network_type)
+
+    def get_serializer(self):
+        """
+        Returns serializer of the message command.
+        """
         from . import messages
 
-        message_header = MessageHeader(network_type)
-        message_header_serial = MessageHeaderSerializer()
+        return messages.MESSAGE_MAPPING[self.command]()
 
-        serializer = messages.MESSAGE_MAPPING[self.command]()
-        bin_message = serializer.serialize(self)
-        payload_checksum = MessageHeaderSerializer.calc_checksum(bin_message)
-        message_header.checksum = payload_checksum
-        message_header.length = len(bin_message)
+    def build_frame(self, network_type="main"):
+        """
+        Serializes header and payload into one preallocated
+        bytearray, the header is written after the payload
+        checksum is calculated.
+
+        :param network_type: network type of the message header
+        """
+        bin_data = self.build_payload()
+        self.write_frame_header(bin_data, network_type)
+        return bin_data
+
+    def build_payload(self):
+        """
+        Returns bytearray with the serialized payload
+        preceded by space for the message header.
+        """
+        serializer = self.get_serializer()
+        header_size = MessageHeaderSerializer.calcsize()
+        bin_data = bytearray(header_size + serializer.serialized_size(self))
+        serializer.serialize_into(bin_data, header_size, self)
+        return bin_data
+
+    def write_frame_header(self, bin_data, network_type="main"):
+        """
+        Writes the message header of the payload built by build_payload().
+
+        :param bin_data: bytearray returned by build_payload()
+        :param network_type: network type of the message header
+        """
+        header_size = MessageHeaderSerializer.calcsize()
+        message_header = MessageHeader(network_type)
         message_header.command = self.command
+        message_header.length = len(bin_data) - header_size
+        with memoryview(bin_data) as view:
+            message_header.checksum = MessageHeaderSerializer.calc_checksum(view[header_size:])
+        MessageHeaderSerializer().serialize_into(bin_data, 0, message_header)
 
-        bin_header = message_header_serial.serialize(message_header)
-        return bin_header + bin_message
+class FrameCache:
+    """
+    Cache of complete message frames (header with payload).
+    Constant frames are kept for every network type and command,
+    other frames are keyed also by the payload and evicted
+    in least recently used order. Frames are returned as bytes,
+    so callers can't modify the shared frames. The cache can be
+    used from any thread.
+
+    :param max_frames: number of kept non-constant frames
+    :param max_payload_size: bigger payloads are not cached
+    """
+    def __init__(self, max_frames=256, max_payload_size=64*1024):
+        self.max_frames = max_frames
+        self.max_payload_size = max_payload_size
+        self.constant_frames = {}
+        self.frames = OrderedDict()
+        self.lock = Lock()
+
+    def get_constant(self, network_type, message):
+        """
+        Returns frame of the constant message.
+
+        :param network_type: network type of the message header
+        :param message: message with constant payload
+        """
+        key = (network_type, message.command)
+        frame = self.constant_frames.get(key)
+        if frame is None:
+            frame = bytes(message.build_frame(network_type))
+            with self.lock:
+                frame = self.constant_frames.setdefault(key, frame)
+        return frame
+
+    def get(self, network_type, message):
+        """
+        Returns frame of the message, the message is serialized
+        once and the header is written only when the same payload
+        isn't cached.
+
+        :param network_type: network type of the message header
+        :param message: message to frame
+        """
+        bin_data = message.build_payload()
+        header_size = MessageHeaderSerializer.calcsize()
+        if len(bin_data) - header_size > self.max_payload_size:
+            message.write_frame_header(bin_data, network_type)
+            return bytes(bin_data)
+
+        key = (network_type, message.command, bytes(bin_data[header_size:]))
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is not None:
+                self.frames.move_to_end(key)
+                return frame
+
+        message.write_frame_header(bin_data, network_type)
+        frame = bytes(bin_data)
+        with self.lock:
+            self.frames[key] = frame
+            if len(self.frames) > self.max_frames:
+                self.frames.popitem(last=False)
+        return frame
+
+    def clear(self):
+        """
+        Drops all cached frames.
+        """
+        with self.lock:
+            self.constant_frames.clear()
+            self.frames.clear()
 
 class MessageHeader:
     """
@@ -163,3 +648,7 @@ class MessageHeaderSerializer(Serializer):
         sha256hash = hashlib.sha256(sha256hash.digest())
         checksum = sha256hash.digest()[:4]
         return struct.unpack("<I", checksum)[0]
+
+
+# Frames shared by all nodes and peers.
+FRAME_CACHE = FrameCache()
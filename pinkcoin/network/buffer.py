@@ -2,72 +2,202 @@
 Defines buffers handling protocol messages.
 """
 
-import os
-from io import BytesIO
-
 from .base_serializer import MessageHeaderSerializer
-from .messages import MESSAGE_MAPPING
-from .exceptions import InvalidMessageChecksum
+from .messages import MESSAGE_MAPPING, PAYLOAD_SIZE_LIMITS, DEFAULT_PAYLOAD_SIZE_LIMITS
+from .exceptions import InvalidMessageChecksum, InvalidMessageSize
+from .reader import BufferReader
 
 
 class ProtocolBuffer:
     """
     Buffer handling protocol messages.
+
+    Received data is kept in a bytearray between a read offset
+    (start) and a write offset (end). Extracting a frame only moves
+    the read offset. Unread data is moved to the beginning of the
+    bytearray when there is no room for new data, and the bytearray
+    grows only when unread data doesn't fit into it.
+
+    :param size: initial size of the buffer
     """
-    def __init__(self):
-        self.buffer = BytesIO()
+    def __init__(self, size=64*1024):
+        self.data = bytearray(size)
+        self.start = 0
+        self.end = 0
         self.header_size = MessageHeaderSerializer.calcsize()
+        self.header_serial = MessageHeaderSerializer()
+
+    def __len__(self):
+        return self.end - self.start
+
+    def reserve(self, size):
+        """
+        Ensures there is room for size bytes after the write offset.
+
+        :param size: number of bytes to make room for
+        """
+        if len(self.data) - self.end >= size:
+            return
+        used = self.end - self.start
+        if used + size <= len(self.data):
+            self.data[:used] = self.data[self.start:self.end]
+        else:
+            data = bytearray(max(2*len(self.data), used + size))
+            data[:used] = self.data[self.start:self.end]
+            self.data = data
+        self.start = 0
+        self.end = used
 
     def write(self, data):
         """
         Writes data to bytes buffer.
         """
-        self.buffer.write(data)
+        size = len(data)
+        self.reserve(size)
+        self.data[self.end:self.end + size] = data
+        self.end += size
 
-    def receive_message(self):
+    def get_write_buffer(self, min_size):
         """
-        Attempts to extract a header and message.
-        It returns a tuple of (header, message) and sets whichever
-        can be set so far (None otherwise).
+        Returns writable memoryview of the free space after the write
+        offset, at least min_size bytes long. Data written to it
+        is added to the buffer with commit().
+
+        :param min_size: minimal size of the free space
         """
-        # Calculates the size of the buffer.
-        self.buffer.seek(0, os.SEEK_END)
-        buffer_size = self.buffer.tell()
+        self.reserve(min_size)
+        return memoryview(self.data)[self.end:]
 
-        # Checks if a complete header is present.
-        if buffer_size < self.header_size:
+    def commit(self, size):
+        """
+        Adds size bytes written to the view from get_write_buffer().
+
+        :param size: number of written bytes
+        """
+        self.end += size
+
+    def clear(self):
+        """
+        Drops all buffered data.
+        """
+        self.start = 0
+        self.end = 0
+
+    def check_payload_size(self, message_header):
+        """
+        Checks payload length from the message header against limits
+        of the message command, before the payload is buffered.
+        The buffer is cleared when the length is invalid.
+
+        :param message_header: The message header
+        """
+        exact, maximum = PAYLOAD_SIZE_LIMITS.get(
+            message_header.command, DEFAULT_PAYLOAD_SIZE_LIMITS
+        )
+        length = message_header.length
+        if length > maximum or (exact is not None and length != exact):
+            self.clear()
+            raise InvalidMessageSize(
+                f"Invalid payload size {length} for command {message_header.command}"
+            )
+
+    def next_frame(self):
+        """
+        Attempts to extract the first frame from the buffer.
+        It returns a tuple of (header, payload) and sets whichever
+        can be set so far (None otherwise). The payload is a bytes
+        copy of the frame data, the buffer is not referenced by it.
+        """
+        if self.end - self.start < self.header_size:
             return (None, None)
 
-        # Goes to the beginning of the buffer.
-        self.buffer.seek(0)
+        header_data = self.data[self.start:self.start + self.header_size]
+        message_header = self.header_serial.deserialize(BufferReader(header_data))
+        self.check_payload_size(message_header)
 
-        message_model = None
-        message_header_serial = MessageHeaderSerializer()
-        message_header = message_header_serial.deserialize(self.buffer)
-        total_length = self.header_size + message_header.length
+        payload_start = self.start + self.header_size
+        payload_end = payload_start + message_header.length
 
-        # Incomplete message.
-        if buffer_size < total_length:
-            self.buffer.seek(0, os.SEEK_END)
+        # Incomplete message, makes room for the rest of it.
+        if payload_end > self.end:
+            self.reserve(payload_end - self.end)
             return (message_header, None)
 
-        payload = self.buffer.read(message_header.length)
-        remaining = self.buffer.read()
-        self.buffer = BytesIO()
-        self.buffer.write(remaining)
-        payload_checksum = MessageHeaderSerializer.calc_checksum(payload)
+        with memoryview(self.data) as view:
+            payload = bytes(view[payload_start:payload_end])
+        if payload_end == self.end:
+            self.clear()
+        else:
+            self.start = payload_end
+        return (message_header, payload)
+
+    def frames(self):
+        """
+        Iterates over all complete frames in the buffer
+        yielding (header, payload) tuples.
+        """
+        while True:
+            message_header, payload = self.next_frame()
+            if payload is None:
+                return
+            yield (message_header, payload)
 
+    @staticmethod
+    def verify_checksum(message_header, payload_checksum):
+        """
+        Checks payload checksum against the one in the message header.
+
+        :param message_header: The message header
+        :param payload_checksum: The checksum calculated from the payload
+        """
         # Checks if the checksum is valid.
         # https://bitcoin.stackexchange.com/questions/22882/what-is-the-function-of-the-payload-checksum-field-in-the-bitcoin-protocol
         if payload_checksum != message_header.checksum:
             msg = f"Bad checksum for command {message_header.command}"
             raise InvalidMessageChecksum(msg)
 
-        # TODO: Modify messages mapping / serializers to handle rejecting nodes with wrong
-        # size of received data (bio = io.BytesIO(); ...; bio.getbuffer().nbytes) even
-        # before message deserialization.
+    @staticmethod
+    def deserialize_payload(message_header, payload):
+        """
+        Deserializes the message without checksum verification.
+        Returns None for commands without serializers.
+
+        :param message_header: The message header
+        :param payload: The message payload
+        """
         if message_header.command in MESSAGE_MAPPING:
             deserializer = MESSAGE_MAPPING[message_header.command]()
-            message_model = deserializer.deserialize(BytesIO(payload))
+            return deserializer.deserialize(BufferReader(payload))
+        return None
 
-        return (message_header, message_model)
+    @staticmethod
+    def decode_message(message_header, payload):
+        """
+        Verifies payload checksum and deserializes the message.
+        Returns None for commands without serializers.
+
+        :param message_header: The message header
+        :param payload: The message payload
+        """
+        payload_checksum = MessageHeaderSerializer.calc_checksum(payload)
+        ProtocolBuffer.verify_checksum(message_header, payload_checksum)
+        return ProtocolBuffer.deserialize_payload(message_header, payload)
+
+    def messages(self):
+        """
+        Iterates over all complete messages in the buffer
+        yielding (header, message) tuples.
+        """
+        for message_header, payload in self.frames():
+            yield (message_header, self.decode_message(message_header, payload))
+
+    def receive_message(self):
+        """
+        Attempts to extract a header and message.
+        It returns a tuple of (header, message) and sets whichever
+        can be set so far (None otherwise).
+        """
+        message_header, payload = self.next_frame()
+        if payload is None:
+            return (message_header, None)
+        return (message_header, self.decode_message(message_header, payload))
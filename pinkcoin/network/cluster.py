@@ -0,0 +1,367 @@
+"""
+Multi-process node, worker processes share the listening
+port with SO_REUSEPORT and each of them owns its own peers.
+
+Workers are connected by pipes to the hub in the parent process,
+which forwards inventory announcements (deduplicated), chain tip
+updates and broadcast frames between them.
+"""
+
+import multiprocessing
+import os
+from asyncio import Event, get_event_loop, run
+from collections import OrderedDict
+from multiprocessing.connection import wait
+from queue import Full, Queue
+from threading import Thread
+
+
+class SeenInventory:
+    """
+    Bounded set of seen inventory keys, the oldest are forgotten first.
+
+    :param max_size: maximum number of remembered keys
+    """
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.keys = OrderedDict()
+
+    def add(self, key):
+        """
+        Adds the key, returns False if it was seen already.
+
+        :param key: (inventory type, hash) tuple
+        """
+        if key in self.keys:
+            self.keys.move_to_end(key)
+            return False
+        self.keys[key] = None
+        if len(self.keys) > self.max_size:
+            self.keys.popitem(last=False)
+        return True
+
+    def __contains__(self, key):
+        return key in self.keys
+
+
+class PipeSender:
+    """
+    Sends messages to the pipe connection from a thread, so a full
+    pipe blocks neither the worker event loop nor the hub. Messages
+    which don't fit into the queue are dropped.
+
+    :param connection: pipe connection
+    :param max_queued: maximum number of messages waiting to be sent
+    """
+    def __init__(self, connection, max_queued=1024):
+        self.connection = connection
+        self.queue = Queue(max_queued)
+        self.dropped = 0
+        self.overflowing = False
+        self.failed = False
+        self.closed = False
+        self.thread = Thread(target=self.run, name="pinkcoin-cluster-sender", daemon=True)
+        self.thread.start()
+
+    def send(self, message):
+        """
+        Queues the message, returns False when it was dropped.
+
+        :param message: (kind, *arguments) tuple
+        """
+        if self.failed or self.closed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+        except Full:
+            self.dropped += 1
+            if not self.overflowing:
+                print(f"Warning: Cluster pipe is full, dropping {message[0]} messages.")
+            self.overflowing = True
+            return False
+        self.overflowing = False
+        return True
+
+    def run(self):
+        """
+        Sends queued messages until the sender is closed or the pipe breaks.
+        """
+        while not self.closed:
+            message = self.queue.get()
+            try:
+                if message is not None and not self.closed:
+                    self.connection.send(message)
+            except (BrokenPipeError, EOFError, OSError):
+                self.failed = True
+                return
+            finally:
+                self.queue.task_done()
+
+    def join(self):
+        """
+        Waits until all queued messages are sent.
+        """
+        self.queue.join()
+
+    def close(self):
+        """
+        Stops the sender, queued messages are dropped.
+        """
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except Full:
+            # The thread is blocked in send(), it exits after it.
+            pass
+
+
+class ClusterHub:
+    """
+    Forwards messages between worker processes. Messages to every
+    worker are sent by its own PipeSender, messages to a worker
+    not reading its pipe are dropped.
+
+    :param connections: pipe connections to the workers
+    :param max_queued: maximum number of messages waiting for a worker
+    """
+    def __init__(self, connections, max_queued=1024):
+        self.connections = list(connections)
+        self.senders = {
+            connection: PipeSender(connection, max_queued) for connection in self.connections
+        }
+        self.seen = SeenInventory()
+        self.tip = None
+
+    def process(self, source, message):
+        """
+        Handles message received from the worker
+        and forwards it to the other workers.
+
+        :param source: connection the message came from
+        :param message: (kind, *arguments) tuple
+        """
+        kind = message[0]
+        if kind == "inv" and not self.seen.add(message[1:]):
+            return
+        if kind == "tip":
+            if self.tip is not None and message[1] <= self.tip[0]:
+                return
+            self.tip = message[1:]
+        for connection in self.connections:
+            if connection is not source:
+                self.send(connection, message)
+
+    def send(self, connection, message):
+        """
+        Queues the message, workers which exited are dropped.
+        """
+        sender = self.senders[connection]
+        if not sender.send(message) and sender.failed:
+            self.remove(connection)
+
+    def remove(self, connection):
+        """
+        Stops forwarding messages to the worker.
+        """
+        if connection in self.connections:
+            self.connections.remove(connection)
+            self.senders.pop(connection).close()
+
+    def run(self):
+        """
+        Forwards messages until all workers exit.
+        """
+        while self.connections:
+            for connection in wait(self.connections):
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    self.remove(connection)
+                    continue
+                self.process(connection, message)
+
+
+class ClusterChannel:
+    """
+    Worker side of the IPC channel, available as node.cluster.
+    Received messages are dispatched on the node event loop to the node
+    handle_cluster_inv(inv_type, hash) and handle_cluster_tip(height, hash)
+    methods if defined, broadcast frames are sent to all node peers.
+    Messages are sent to the hub by PipeSender, off the event loop.
+
+    :param connection: pipe connection to the hub
+    :param node: Node of the worker
+    :param worker_index: index of the worker
+    :param workers: number of workers
+    :param max_queued: maximum number of messages waiting for the hub
+    """
+    def __init__(self, connection, node, worker_index=0, workers=1, max_queued=1024):
+        self.connection = connection
+        self.sender = PipeSender(connection, max_queued)
+        self.node = node
+        self.worker_index = worker_index
+        self.workers = workers
+        self.seen = SeenInventory()
+        self.tip = None
+        self.closed = Event()
+
+    def start(self):
+        """
+        Starts receiving messages from the hub.
+        """
+        get_event_loop().add_reader(self.connection.fileno(), self.receive)
+
+    def close(self):
+        """
+        Stops receiving messages.
+        """
+        get_event_loop().remove_reader(self.connection.fileno())
+        self.sender.close()
+        self.closed.set()
+
+    def send(self, message):
+        """
+        Queues the message for the hub.
+        """
+        if not self.sender.send(message) and self.sender.failed:
+            self.close()
+
+    def receive(self):
+        """
+        Handles all messages waiting in the pipe.
+        """
+        try:
+            while self.connection.poll():
+                self.dispatch(self.connection.recv())
+        except (EOFError, OSError):
+            self.close()
+
+    def dispatch(self, message):
+        """
+        Handles message forwarded by the hub.
+
+        :param message: (kind, *arguments) tuple
+        """
+        kind, args = message[0], message[1:]
+        if kind == "inv":
+            self.seen.add(args)
+        elif kind == "tip":
+            self.tip = args
+        elif kind == "broadcast":
+            self.node.broadcast_frame(args[0])
+            return
+        handle_func = getattr(self.node, "handle_cluster_" + kind, None)
+        if handle_func and callable(handle_func):
+            handle_func(*args)
+
+    def is_new_inventory(self, inv_type, inv_hash):
+        """
+        Checks if inventory wasn't seen by any worker yet,
+        new inventory is announced to the other workers.
+
+        :param inv_type: inventory type
+        :param inv_hash: inventory hash
+        """
+        key = (inv_type, bytes(inv_hash))
+        if not self.seen.add(key):
+            return False
+        self.send(("inv",) + key)
+        return True
+
+    def update_tip(self, height, tip_hash):
+        """
+        Announces new chain tip to the other workers.
+
+        :param height: height of the tip
+        :param tip_hash: hash of the tip
+        """
+        if self.tip is not None and height <= self.tip[0]:
+            return
+        self.tip = (height, bytes(tip_hash))
+        self.send(("tip",) + self.tip)
+
+    def broadcast(self, frame):
+        """
+        Sends frame to peers of the other workers.
+
+        :param frame: serialized message with header
+        """
+        self.send(("broadcast", bytes(frame)))
+
+
+def run_worker(node_factory, worker_main, connection, worker_index, workers):
+    """
+    Entry point of the worker process.
+
+    :param node_factory: callable returning Node for the worker index
+    :param worker_main: coroutine function called with the node, None waits
+                        until the hub exits
+    :param connection: pipe connection to the hub
+    :param worker_index: index of the worker
+    :param workers: number of workers
+    """
+    async def main():
+        node = node_factory(worker_index)
+        node.cluster = ClusterChannel(connection, node, worker_index, workers)
+        node.cluster.start()
+        await node.listen(reuse_port=True)
+        if worker_main is not None:
+            await worker_main(node)
+        else:
+            await node.cluster.closed.wait()
+
+    run(main())
+
+
+class NodeCluster:
+    """
+    Runs node in several worker processes sharing the listening port.
+    Module level functions have to be used as node_factory and
+    worker_main when processes are spawned.
+
+    :param node_factory: callable returning Node for the worker index
+    :param worker_main: coroutine function running in every worker with its node
+    :param workers: number of worker processes, CPU count by default
+    """
+    def __init__(self, node_factory, worker_main=None, workers=None):
+        self.node_factory = node_factory
+        self.worker_main = worker_main
+        self.workers = workers or os.cpu_count()
+        self.processes = []
+
+    def start(self):
+        """
+        Starts worker processes and returns the hub.
+        """
+        connections = []
+        for index in range(self.workers):
+            hub_end, worker_end = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=run_worker, name=f"pinkcoin-worker-{index}",
+                args=(self.node_factory, self.worker_main, worker_end, index, self.workers),
+            )
+            process.start()
+            worker_end.close()
+            connections.append(hub_end)
+            self.processes.append(process)
+        return ClusterHub(connections)
+
+    def run(self):
+        """
+        Runs the workers and the hub until all workers exit.
+        """
+        hub = self.start()
+        try:
+            hub.run()
+        finally:
+            self.stop()
+
+    def stop(self):
+        """
+        Terminates the workers.
+        """
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            process.join()
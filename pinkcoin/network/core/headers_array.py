@@ -0,0 +1,168 @@
+"""
+Bulk decoding of headers messages into NumPy arrays.
+
+NumPy is an optional dependency, it's needed only by this module.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    # decode_headers() raises ImportError when NumPy is missing.
+    np = None  # type: ignore[assignment]
+
+from ..reader import BufferReader
+from ..data_fields import VariableIntegerField
+from .serializers import BlockHeader, BlockHeaderSerializer
+
+
+HEADER_SIZE = BlockHeader.header_size
+
+# Layout of the hashed part of the block header.
+HEADER_FIELDS = [
+    ("version", "<u4"),
+    ("prev_block", "u1", (32,)),
+    ("merkle_root", "u1", (32,)),
+    ("timestamp", "<u4"),
+    ("bits", "<u4"),
+    ("nonce", "<u4"),
+]
+
+def _header_dtype(itemsize):
+    """
+    Returns structured dtype of block headers stored every itemsize bytes.
+    """
+    names = [field[0] for field in HEADER_FIELDS]
+    formats = [field[1] if len(field) == 2 else (field[1], field[2]) for field in HEADER_FIELDS]
+    offsets = [0, 4, 36, 68, 72, 76]
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": itemsize})
+
+
+class HeadersArray:
+    """
+    Block headers of a headers message decoded into NumPy arrays.
+
+    :param records: structured array with header fields
+    :param raw: (count, 80) uint8 array with hashed header data
+    :param txns_count: transactions counts of the headers
+    :param sig: values of trailing sig fields of the headers
+    """
+    def __init__(self, records, raw, txns_count, sig):
+        self.records = records
+        self.raw = raw
+        self.txns_count = txns_count
+        self.sig = sig
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, field_name):
+        return self.records[field_name]
+
+    def header_data(self, index):
+        """
+        Returns 80 bytes of the header used for hashing.
+
+        :param index: header index
+        """
+        return self.raw[index].tobytes()
+
+    def iter_header_data(self):
+        """
+        Iterates over binary data of all headers.
+        """
+        for row in self.raw:
+            yield row.tobytes()
+
+    @staticmethod
+    def hashes_to_array(hashes):
+        """
+        Converts sequence of Hash256 into (count, 32) uint8 array.
+
+        :param hashes: hashes of the headers
+        """
+        return np.frombuffer(b"".join(hashes), dtype=np.uint8).reshape(-1, 32)
+
+    def find_broken_link(self, hashes, prev_hash=None):
+        """
+        Checks that every header points to the previous one.
+
+        :param hashes: Hash256 hashes of the headers (or an array of them)
+        :param prev_hash: expected prev_block of the first header
+        :returns: index of the first header not linked to the previous one, -1 if none
+        """
+        if not len(self):
+            return -1
+        if not isinstance(hashes, np.ndarray):
+            hashes = self.hashes_to_array(hashes)
+        prev_blocks = self.records["prev_block"]
+        linked = np.all(prev_blocks[1:] == hashes[:-1], axis=1)
+        if prev_hash is not None and bytes(prev_blocks[0]) != bytes(prev_hash):
+            return 0
+        broken = np.flatnonzero(~linked)
+        return int(broken[0]) + 1 if broken.size else -1
+
+    def to_headers(self):
+        """
+        Builds BlockHeader objects of all headers.
+        """
+        serializer = BlockHeaderSerializer()
+        headers = []
+        for index in range(len(self)):
+            header = serializer.deserialize(BufferReader(self.header_data(index) + b"\x00\x00"))
+            header.txns_count = int(self.txns_count[index])
+            header.sig = int(self.sig[index])
+            header.clear_raw()
+            headers.append(header)
+        return headers
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} Count=[{len(self)}]>"
+
+
+def decode_headers(payload):
+    """
+    Decodes payload of the headers message into HeadersArray.
+    Headers with single byte trailing varints (the usual case)
+    are viewed directly in the payload without copying.
+
+    :param payload: bytes-like payload of the headers message
+    """
+    if np is None:
+        raise ImportError("NumPy is required for bulk headers decoding.")
+
+    reader = BufferReader(payload)
+    count = VariableIntegerField().deserialize(reader)
+    start = reader.offset
+    data = np.frombuffer(payload, dtype=np.uint8)
+    stride = HEADER_SIZE + 2
+
+    if count == 0:
+        records = np.zeros(0, dtype=_header_dtype(HEADER_SIZE))
+        empty = np.zeros(0, dtype=np.uint64)
+        return HeadersArray(records, np.zeros((0, HEADER_SIZE), dtype=np.uint8), empty, empty)
+
+    if len(data) - start == count * stride:
+        rows = data[start:].reshape(count, stride)
+        trailing = rows[:, HEADER_SIZE:]
+        if np.all(trailing < 0xFD):
+            records = np.frombuffer(
+                payload, dtype=_header_dtype(stride), count=count, offset=start
+            )
+            return HeadersArray(
+                records, rows[:, :HEADER_SIZE],
+                trailing[:, 0].astype(np.uint64), trailing[:, 1].astype(np.uint64)
+            )
+
+    # Multi-byte varints, records have to be located one by one.
+    var_int = VariableIntegerField()
+    offsets = np.empty(count, dtype=np.int64)
+    txns_count = np.empty(count, dtype=np.uint64)
+    sig = np.empty(count, dtype=np.uint64)
+    for index in range(count):
+        offsets[index] = reader.offset
+        reader.skip(HEADER_SIZE)
+        txns_count[index] = var_int.deserialize(reader)
+        sig[index] = var_int.deserialize(reader)
+    raw = data[offsets[:, None] + np.arange(HEADER_SIZE)]
+    records = raw.view(_header_dtype(HEADER_SIZE)).reshape(count)
+    return HeadersArray(records, raw, txns_count, sig)
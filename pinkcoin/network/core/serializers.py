@@ -6,16 +6,20 @@ import time
 import random
 import hashlib
 
-from ..base_serializer import Serializer, SerializableMessage
+from ..base_serializer import RawDataModel, Serializer, SerializableMessage
 from .. import data_fields
 from .. import params
 from .. import utils
+from ...primitives.hashes import Hash256
+from ...primitives.header_hashing import cached_scrypt_hash
 
 
 class IPv4Address:
     """
     The IPv4 Address (without timestamp).
     """
+    __slots__ = ("services", "ip_address", "port")
+
     def __init__(self):
         self.services = params.SERVICES["NODE_NETWORK"]
         self.ip_address = "0.0.0.0"
@@ -43,6 +47,8 @@ class IPv4AddressTimestamp(IPv4Address):
     """
     The IPv4 Address with timestamp.
     """
+    __slots__ = ("timestamp",)
+
     def __init__(self):
         super().__init__()
         self.timestamp = int(time.time())
@@ -88,6 +94,8 @@ class VersionSerializer(Serializer):
     The version command serializer.
     """
     model_class = Version
+    # Fixed fields, user agent with its length and relay flag.
+    max_payload_size = 80 + 9 + params.MAX_SUBVERSION_LENGTH + 4 + 1
 
     version = data_fields.Int32LEField()
     services = data_fields.UInt64LEField()
@@ -103,6 +111,7 @@ class VerAck(SerializableMessage):
     The version acknowledge (verack) command.
     """
     command = "verack"
+    constant_frame = True
 
 class VerAckSerializer(Serializer):
     """
@@ -158,9 +167,11 @@ class Inventory(SerializableMessage):
     """
     The Inventory representation.
     """
+    __slots__ = ("inv_type", "inv_hash")
+
     def __init__(self):
         self.inv_type = params.INVENTORY_TYPE["MSG_TX"]
-        self.inv_hash = 0
+        self.inv_hash = Hash256()
 
     def type_to_text(self):
         """
@@ -172,7 +183,7 @@ class Inventory(SerializableMessage):
         return "Unknown Type"
 
     def __repr__(self):
-        return "<{} Type=[{}] Hash=[{:x}]>".format(
+        return "<{} Type=[{}] Hash=[{}]>".format(
             self.__class__.__name__, self.type_to_text(), self.inv_hash
         )
 
@@ -208,6 +219,7 @@ class InventoryVectorSerializer(Serializer):
     The serializer for the vector of inventories.
     """
     model_class = InventoryVector
+    max_payload_size = 9 + params.MAX_INV_SZ*36
 
     inventory = data_fields.ListField(InventorySerializer)
 
@@ -234,6 +246,7 @@ class AddressVectorSerializer(Serializer):
     Serializer for the addresses vector.
     """
     model_class = AddressVector
+    max_payload_size = 9 + params.MAX_ADDR_SZ*30
 
     addresses = data_fields.ListField(IPv4AddressTimestampSerializer)
 
@@ -248,6 +261,7 @@ class GetDataSerializer(Serializer):
     Serializer for the GetData command.
     """
     model_class = GetData
+    max_payload_size = 9 + params.MAX_INV_SZ*36
 
     inventory = data_fields.ListField(InventorySerializer)
 
@@ -262,6 +276,7 @@ class NotFoundSerializer(Serializer):
     Serializer for the NotFound message.
     """
     model_class = NotFound
+    max_payload_size = 9 + params.MAX_INV_SZ*36
 
     inventory = data_fields.ListField(InventorySerializer)
 
@@ -269,12 +284,14 @@ class OutPoint:
     """
     The OutPoint representation.
     """
+    __slots__ = ("out_hash", "index")
+
     def __init__(self):
-        self.out_hash = 0
+        self.out_hash = Hash256()
         self.index = 0
 
     def __repr__(self):
-        return "<{} Index=[{}] Hash=[{:x}]>".format(
+        return "<{} Index=[{}] Hash=[{}]>".format(
             self.__class__.__name__, self.index, self.out_hash
         )
 
@@ -291,6 +308,8 @@ class TxIn:
     """
     The transaction input representation.
     """
+    __slots__ = ("previous_output", "signature_script", "sequence")
+
     def __init__(self):
         self.previous_output = None
         self.signature_script = "Empty"
@@ -315,6 +334,8 @@ class TxOut:
     """
     The transaction output.
     """
+    __slots__ = ("value", "pk_script")
+
     def __init__(self):
         self.value = 0
         self.pk_script = "Empty"
@@ -337,11 +358,13 @@ class TxOutSerializer(Serializer):
     value = data_fields.Int64LEField()
     pk_script = data_fields.VariableStringField()
 
-class Tx(SerializableMessage):
+class Tx(RawDataModel, SerializableMessage):
     """
     The main transaction representation, this object will
     contain all the inputs and outputs of the transaction.
     """
+    __slots__ = ("version", "tx_in", "tx_out", "lock_time", "_raw", "_hash")
+
     command = "tx"
 
     def __init__(self):
@@ -349,6 +372,9 @@ class Tx(SerializableMessage):
         self.tx_in = []
         self.tx_out = []
         self.lock_time = 0
+        # Binary data the transaction was deserialized from and its hash.
+        self._raw = None
+        self._hash = None
 
     def _locktime_to_text(self):
         """
@@ -366,13 +392,19 @@ class Tx(SerializableMessage):
     def calculate_hash(self):
         """
         This method will calculate the hash of the transaction.
+        Hash of a deserialized transaction is calculated from
+        the retained binary data once and memoised.
         """
-        hash_fields = ["version", "tx_in", "tx_out", "lock_time"]
-        serializer = TxSerializer()
-        bin_data = serializer.serialize(self, hash_fields)
+        if self._hash is not None:
+            return self._hash
+        bin_data = self._raw
+        if bin_data is None:
+            bin_data = TxSerializer().serialize(self)
         tx_hash = hashlib.sha256(bin_data).digest()
-        tx_hash = hashlib.sha256(tx_hash).digest()
-        return tx_hash[::-1].encode("hex_codec")
+        tx_hash = Hash256(hashlib.sha256(tx_hash).digest())
+        if self._raw is not None:
+            self._hash = tx_hash
+        return tx_hash
 
     def __repr__(self):
         return "<{} Version=[{}] Lock Time=[{}] TxIn Count=[{}] Hash=[{}] TxOut Count=[{}]>".format(
@@ -385,6 +417,8 @@ class TxSerializer(Serializer):
     The transaction serializer.
     """
     model_class = Tx
+    max_payload_size = params.MAX_BLOCK_SIZE
+    retain_raw = True
 
     version = data_fields.UInt32LEField()
     tx_in = data_fields.ListField(TxInSerializer)
@@ -393,14 +427,22 @@ class TxSerializer(Serializer):
 
 # TODO: Check if that inheritance is necessary (SerializableMessage).
 # There is no command set here and is not a protocol message.
-class BlockHeader(SerializableMessage):
+class BlockHeader(RawDataModel, SerializableMessage):
     """
     The header of the block.
     """
+    __slots__ = (
+        "version", "prev_block", "merkle_root", "timestamp",
+        "bits", "nonce", "txns_count", "sig", "_raw", "_hash",
+    )
+
+    # Size of the header part used for hashing.
+    header_size = 80
+
     def __init__(self):
         self.version = 0
-        self.prev_block = 0
-        self.merkle_root = 0
+        self.prev_block = Hash256()
+        self.merkle_root = Hash256()
         self.timestamp = 0
         self.bits = 0
         self.nonce = 0
@@ -408,22 +450,34 @@ class BlockHeader(SerializableMessage):
         # compatible with Block parsing.
         self.txns_count = 0
         self.sig = 0
+        # Binary data the header was deserialized from and its hash.
+        self._raw = None
+        self._hash = None
 
-    def calculate_hash(self):
+    def get_header_data(self):
         """
-        This method will calculate the hash of the block.
+        Returns the binary header data used for hashing.
         """
+        if self._raw is not None:
+            return self._raw[:self.header_size]
         hash_fields = [
             "version", "prev_block", "merkle_root",
             "timestamp", "bits", "nonce"
         ]
-        serializer = BlockSerializer()
-        bin_data = serializer.serialize(self, hash_fields)
-        header_hash = hashlib.scrypt(
-            password=bin_data, salt=bin_data, n=1024, r=1, p=1, maxmem=0, dklen=32
-        )
-        header_hash = int.from_bytes(header_hash, byteorder="little")
-        return "{0:#0{1}x}".format(header_hash, 66)
+        return BlockHeaderSerializer().serialize(self, hash_fields)
+
+    def calculate_hash(self):
+        """
+        This method will calculate the hash of the block. Hash of
+        a deserialized header is calculated once and memoised,
+        hashes are also kept in HEADER_HASH_CACHE.
+        """
+        if self._hash is not None:
+            return self._hash
+        header_hash = cached_scrypt_hash(self.get_header_data())
+        if self._raw is not None:
+            self._hash = header_hash
+        return header_hash
 
     def __repr__(self):
         return "<{} Version=[{}] Timestamp=[{}] Nonce=[{}] Hash=[{}] Tx Count=[{}]>".format(
@@ -436,6 +490,7 @@ class BlockHeaderSerializer(Serializer):
     The serializer for the block header.
     """
     model_class = BlockHeader
+    retain_raw = True
 
     version = data_fields.UInt32LEField()
     prev_block = data_fields.Hash()
@@ -449,20 +504,25 @@ class BlockHeaderSerializer(Serializer):
 class Block(BlockHeader):
     """
     The block message. This message contains all the transactions
-    present in the block.
+    present in the block. Deserialized blocks hold transactions
+    in a LazyList, which parses each of them on first access.
     """
+    __slots__ = ("txns", "block_sig")
+
     command = "block"
 
     def __init__(self):
         # super().__init__()
         self.version = 0
-        self.prev_block = 0
-        self.merkle_root = 0
+        self.prev_block = Hash256()
+        self.merkle_root = Hash256()
         self.timestamp = 0
         self.bits = 0
         self.nonce = 0
         self.txns = []
         self.block_sig = 0
+        self._raw = None
+        self._hash = None
 
     def __len__(self):
         return len(self.txns)
@@ -481,6 +541,8 @@ class BlockSerializer(Serializer):
     The deserializer for the blocks.
     """
     model_class = Block
+    max_payload_size = params.MAX_BLOCK_SIZE
+    retain_raw = True
 
     version = data_fields.UInt32LEField()
     prev_block = data_fields.Hash()
@@ -488,7 +550,7 @@ class BlockSerializer(Serializer):
     timestamp = data_fields.UInt32LEField()
     bits = data_fields.UInt32LEField()
     nonce = data_fields.UInt32LEField()
-    txns = data_fields.ListField(TxSerializer)
+    txns = data_fields.LazyListField(TxSerializer)
     block_sig = data_fields.VariableStringField()
 
 class HeaderVector(SerializableMessage):
@@ -514,6 +576,7 @@ class HeaderVectorSerializer(Serializer):
     Serializer for the block header vector.
     """
     model_class = HeaderVector
+    max_payload_size = 9 + params.MAX_HEADERS_RESULTS*(80 + 9 + 9)
 
     headers = data_fields.ListField(BlockHeaderSerializer)
 
@@ -522,6 +585,7 @@ class MemPool(SerializableMessage):
     The mempool command.
     """
     command = "mempool"
+    constant_frame = True
 
 class MemPoolSerializer(Serializer):
     """
@@ -534,6 +598,7 @@ class GetAddr(SerializableMessage):
     The getaddr command.
     """
     command = "getaddr"
+    constant_frame = True
 
 class GetAddrSerializer(Serializer):
     """
@@ -550,7 +615,7 @@ class GetBlocks(SerializableMessage):
     def __init__(self, hashes):
         self.version = params.PROTOCOL_VERSION
         self.hash_count = len(hashes)
-        self.hash_stop = 0
+        self.hash_stop = Hash256()
         self.block_hashes = hashes
 
 class GetBlocksSerializer(Serializer):
@@ -558,6 +623,7 @@ class GetBlocksSerializer(Serializer):
     Serializer for getblocks message.
     """
     model_class = GetBlocks
+    max_payload_size = 4 + 9 + params.MAX_LOCATOR_SZ*32 + 32
 
     version = data_fields.UInt32LEField()
     hash_count = data_fields.VariableIntegerField()
@@ -573,7 +639,7 @@ class GetHeaders(SerializableMessage):
     def __init__(self, hashes):
         self.version = params.PROTOCOL_VERSION
         self.hash_count = len(hashes)
-        self.hash_stop = 0
+        self.hash_stop = Hash256()
         self.block_hashes = hashes
 
 class GetHeadersSerializer(Serializer):
@@ -581,6 +647,7 @@ class GetHeadersSerializer(Serializer):
     Serializer for getheaders message.
     """
     model_class = GetHeaders
+    max_payload_size = 4 + 9 + params.MAX_LOCATOR_SZ*32 + 32
 
     version = data_fields.UInt32LEField()
     hash_count = data_fields.VariableIntegerField()
@@ -3,9 +3,14 @@ Module with serializable fields
 used by serializators/deserializators
 """
 
-from io import BytesIO
+from array import array
+from collections.abc import Sequence
 import struct
 import socket
+from typing import Optional
+
+from .reader import BufferReader
+from ..primitives.hashes import Hash256
 
 
 # pylint: disable=E1101
@@ -17,18 +22,44 @@ class Field:
     """
     counter = 0
 
+    # Struct format of the field binary representation when it has
+    # a fixed width (e.g. "<I" or "32s"), None for variable length
+    # fields. Serializers pack runs of consecutive fixed width fields
+    # with a single precompiled struct.
+    struct_format: Optional[str] = None
+
     def __init__(self):
         self.count = Field.counter
         Field.counter += 1
 
+    def from_struct(self, value):
+        """
+        Converts the value unpacked with the field struct format
+        into the field value. Fields that need no conversion
+        don't override it.
+
+        :param value: value unpacked by struct
+        """
+        return value
+
+    def to_struct(self, value):
+        """
+        Converts the field value into the value packed
+        with the field struct format.
+
+        :param value: field value
+        """
+        return value
+
     def parse(self, value):
         """
-        This method should be implemented to parse the value
-        parameter into the field internal representation.
+        This method will set the internal value serialized
+        by serialize() method. Prefer stateless encode(), field
+        instances are shared by all serializers of given class.
 
         :param value: value to be parsed
         """
-        raise NotImplementedError
+        self.value = value
 
     def deserialize(self, stream):
         """
@@ -40,6 +71,18 @@ class Field:
         """
         raise NotImplementedError
 
+    def skip(self, stream):
+        """
+        Moves the reader past the field data without
+        building the deserialized content.
+
+        :param stream: BufferReader to move
+        """
+        if self.struct_format is not None:
+            stream.skip(struct.calcsize(self.struct_format))
+        else:
+            self.deserialize(stream)
+
     def serialize(self):
         """
         Serializes the internal representation and return
@@ -47,7 +90,60 @@ class Field:
 
         :returns: the serialized data
         """
-        raise NotImplementedError
+        return self.encode(self.value)
+
+    def encode(self, value):
+        """
+        Serializes the value and returns the serialized data.
+        Fixed width fields are packed with their struct format,
+        variable length fields implement encode_into().
+
+        :param value: value to serialize
+        :returns: the serialized data
+        """
+        if self.struct_format is None:
+            bin_data = bytearray()
+            self.encode_into(bin_data, value)
+            return bytes(bin_data)
+        return struct.pack(self.struct_format, self.to_struct(value))
+
+    def encode_into(self, buf, value):
+        """
+        Serializes the value and appends serialized data to the buffer.
+
+        :param buf: bytearray to extend
+        :param value: value to serialize
+        """
+        if self.struct_format is None:
+            raise NotImplementedError
+        buf += self.encode(value)
+
+    def serialized_size(self, value):
+        """
+        Returns size of the serialized value.
+
+        :param value: value to serialize
+        """
+        if self.struct_format is None:
+            return len(self.encode(value))
+        return struct.calcsize(self.struct_format)
+
+    def serialize_into(self, buf, offset, value):
+        """
+        Serializes the value into preallocated buffer.
+
+        :param buf: bytearray (or writable memoryview) to write to
+        :param offset: position of the first written byte
+        :param value: value to serialize
+        :returns: position after the last written byte
+        """
+        if self.struct_format is None:
+            bin_data = self.encode(value)
+            end = offset + len(bin_data)
+            buf[offset:end] = bin_data
+            return end
+        struct.pack_into(self.struct_format, buf, offset, self.to_struct(value))
+        return offset + struct.calcsize(self.struct_format)
 
     def __repr__(self):
         return f"<{self.__class__.__name__} [{repr(self.value)}]>"
@@ -66,15 +162,16 @@ class PrimaryField(Field):
         class UInt32LEField(PrimaryField):
             datatype = "<I"
     """
+    def __init__(self):
+        super().__init__()
+        self.compiled = struct.Struct(self.datatype)
 
-    def parse(self, value):
+    @property
+    def struct_format(self):
         """
-        This method will set the internal value to the
-        specified value.
-
-        :param value: the value to be set
+        Primary fields are packed with their datatype.
         """
-        self.value = value
+        return self.datatype
 
     def deserialize(self, stream):
         """
@@ -83,16 +180,22 @@ class PrimaryField(Field):
 
         :param stream: the data stream
         """
-        data_size = struct.calcsize(self.datatype)
-        data = stream.read(data_size)
-        return struct.unpack(self.datatype, data)[0]
+        if isinstance(stream, BufferReader):
+            return stream.unpack(self.compiled)[0]
+        return self.compiled.unpack(stream.read(self.compiled.size))[0]
 
-    def serialize(self):
+    def encode(self, value):
         """
-        Serializes the internal data and then return the
-        serialized data."""
-        data = struct.pack(self.datatype, self.value)
-        return data
+        Packs the value with the struct data type specified.
+        """
+        return self.compiled.pack(value)
+
+    def serialized_size(self, value):
+        return self.compiled.size
+
+    def serialize_into(self, buf, offset, value):
+        self.compiled.pack_into(buf, offset, value)
+        return offset + self.compiled.size
 
 class Int32LEField(PrimaryField):
     """
@@ -152,18 +255,16 @@ class FixedStringField(Field):
     def __init__(self, length):
         super().__init__()
         self.length = length
+        self.struct_format = f"{length}s"
 
-    def parse(self, value):
-        self.value = value[:self.length]
+    def from_struct(self, value):
+        return value.split(b"\x00", 1)[0].decode("utf-8")
 
-    def deserialize(self, stream):
-        data = stream.read(self.length)
-        return data[:(data+b'\x00').index(b'\x00')].decode("utf-8")
+    def to_struct(self, value):
+        return value.encode("utf-8")
 
-    def serialize(self):
-        bin_data = BytesIO()
-        bin_data.write(struct.pack("12s", self.value.encode("utf-8")))
-        return bin_data.getvalue()
+    def deserialize(self, stream):
+        return self.from_struct(bytes(stream.read(self.length)))
 
 class NestedField(Field):
     """
@@ -182,14 +283,20 @@ class NestedField(Field):
         self.serializer_class = serializer_class
         self.serializer = self.serializer_class()
 
-    def parse(self, value):
-        self.value = value
-
     def deserialize(self, stream):
         return self.serializer.deserialize(stream)
 
-    def serialize(self):
-        return self.serializer.serialize(self.value)
+    def skip(self, stream):
+        self.serializer.skip(stream)
+
+    def encode_into(self, buf, value):
+        self.serializer.encode_into(buf, value)
+
+    def serialized_size(self, value):
+        return self.serializer.serialized_size(value)
+
+    def serialize_into(self, buf, offset, value):
+        return self.serializer.serialize_into(buf, offset, value)
 
 class ListField(Field):
     """
@@ -207,65 +314,189 @@ class ListField(Field):
     def __init__(self, serializer_class):
         super().__init__()
         self.serializer_class = serializer_class
+        self.serializer = self.serializer_class()
         self.var_int = VariableIntegerField()
 
-    def parse(self, value):
-        self.value = value
+    def encode_into(self, buf, value):
+        self.var_int.encode_into(buf, len(value))
+        encode_item = self.serializer.encode_into
+        for item in value:
+            encode_item(buf, item)
 
-    def serialize(self):
-        bin_data = BytesIO()
-        self.var_int.parse(len(self))
-        bin_data.write(self.var_int.serialize())
-        serializer = self.serializer_class()
-        for item in self:
-            bin_data.write(serializer.serialize(item))
-        return bin_data.getvalue()
+    def serialized_size(self, value):
+        item_size = self.serializer.serialized_size
+        return self.var_int.serialized_size(len(value)) + sum(item_size(item) for item in value)
+
+    def serialize_into(self, buf, offset, value):
+        offset = self.var_int.serialize_into(buf, offset, len(value))
+        serialize_item = self.serializer.serialize_into
+        for item in value:
+            offset = serialize_item(buf, offset, item)
+        return offset
 
     def deserialize(self, stream):
         count = self.var_int.deserialize(stream)
-        items = []
-        serializer = self.serializer_class()
+        deserialize_item = self.serializer.deserialize
+        return [deserialize_item(stream) for _ in range(count)]
+
+    def skip(self, stream):
+        count = self.var_int.deserialize(stream)
         for _ in range(count):
-            data = serializer.deserialize(stream)
-            items.append(data)
-        return items
+            self.serializer.skip(stream)
+
+class LazyList(Sequence):
+    """
+    Read-only sequence of serialized items. It keeps the raw
+    binary data of the items with an index of their offsets and
+    deserializes each item the first time it is accessed.
+    Accessed items without retained binary data (modified
+    RawDataModel items) are serialized from their fields.
 
-    def __iter__(self):
-        return iter(self.value)
+    :param serializer: serializer of the items
+    :param raw: memoryview with binary data of all items
+    :param offsets: offsets of the items in raw data
+    """
+    def __init__(self, serializer, raw, offsets):
+        self.serializer = serializer
+        self.raw = raw
+        self.offsets = offsets
+        self.items = [None] * len(offsets)
+
+    def item_raw(self, index):
+        """
+        Returns raw binary data of the item.
+
+        :param index: item index
+        """
+        index = range(len(self))[index]
+        start = self.offsets[index]
+        if index + 1 == len(self):
+            return self.raw[start:]
+        return self.raw[start:self.offsets[index + 1]]
+
+    def modified(self):
+        """
+        Checks if any accessed item has no retained binary data.
+        """
+        return any(
+            item is not None and getattr(item, "_raw", None) is None for item in self.items
+        )
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        item = self.items[index]
+        if item is None:
+            reader = BufferReader(self.raw, self.offsets[index])
+            item = self.serializer.deserialize(reader)
+            self.items[index] = item
+        return item
 
     def __len__(self):
-        return len(self.value)
+        return len(self.offsets)
+
+    def __getstate__(self):
+        # Raw memoryview is pickled as bytes.
+        state = dict(self.__dict__)
+        state["raw"] = bytes(self.raw)
+        return state
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} Count=[{len(self)}] Size=[{len(self.raw)}]>"
+
+class LazyListField(ListField):
+    """
+    A list field which deserializes to LazyList. Only offsets of
+    items are found during deserialization, items are deserialized
+    when they are accessed. LazyList values are serialized from
+    the retained raw data, items modified after they were accessed
+    are serialized by the item serializer.
+
+    Example of use::
+
+        class BlockSerializer(Serializer):
+            model_class = Block
+            ...
+            txns = fields.LazyListField(TxSerializer)
+    """
+    def encode_into(self, buf, value):
+        if not isinstance(value, LazyList):
+            super().encode_into(buf, value)
+            return
+        self.var_int.encode_into(buf, len(value))
+        if not value.modified():
+            buf += value.raw
+            return
+        for index, item in enumerate(value.items):
+            if item is None:
+                buf += value.item_raw(index)
+            else:
+                self.serializer.encode_into(buf, item)
+
+    def serialized_size(self, value):
+        if not isinstance(value, LazyList):
+            return super().serialized_size(value)
+        size = self.var_int.serialized_size(len(value))
+        if not value.modified():
+            return size + len(value.raw)
+        for index, item in enumerate(value.items):
+            if item is None:
+                size += len(value.item_raw(index))
+            else:
+                size += self.serializer.serialized_size(item)
+        return size
+
+    def serialize_into(self, buf, offset, value):
+        if not isinstance(value, LazyList):
+            return super().serialize_into(buf, offset, value)
+        offset = self.var_int.serialize_into(buf, offset, len(value))
+        if not value.modified():
+            end = offset + len(value.raw)
+            buf[offset:end] = value.raw
+            return end
+        for index, item in enumerate(value.items):
+            if item is None:
+                raw = value.item_raw(index)
+                buf[offset:offset + len(raw)] = raw
+                offset += len(raw)
+            else:
+                offset = self.serializer.serialize_into(buf, offset, item)
+        return offset
+
+    def deserialize(self, stream):
+        count = self.var_int.deserialize(stream)
+        start = stream.offset
+        offsets = array("L")
+        for _ in range(count):
+            offsets.append(stream.offset - start)
+            self.serializer.skip(stream)
+        return LazyList(self.serializer, stream.slice(start, stream.offset), offsets)
 
 class IPv4AddressField(Field):
     """
     An IPv4 address field without timestamp and reserved IPv6 space.
     """
     reserved = b"\x00"*10 + b"\xff"*2
+    struct_format = "16s"
 
-    def parse(self, value):
-        self.value = value
+    def from_struct(self, value):
+        return socket.inet_ntoa(value[12:])
+
+    def to_struct(self, value):
+        return self.reserved + socket.inet_aton(value)
 
     def deserialize(self, stream):
-        unused_reserved = stream.read(12)
-        addr = stream.read(4)
-        return socket.inet_ntoa(addr)
+        return self.from_struct(stream.read(16))
 
-    def serialize(self):
-        bin_data = BytesIO()
-        bin_data.write(self.reserved)
-        bin_data.write(socket.inet_aton(self.value))
-        return bin_data.getvalue()
+    def encode(self, value):
+        return self.to_struct(value)
 
 class VariableIntegerField(Field):
     """
     A variable size integer field.
     """
-    def parse(self, value):
-        self.value = int(value)
-
     def deserialize(self, stream):
-        int_id_raw = stream.read(struct.calcsize("<B"))
-        int_id = struct.unpack("<B", int_id_raw)[0]
+        int_id = stream.read(1)[0]
         if int_id == 0xFD:
             data = stream.read(2)
             int_id = struct.unpack("<H", data)[0]
@@ -277,14 +508,27 @@ class VariableIntegerField(Field):
             int_id = struct.unpack("<Q", data)[0]
         return int_id
 
-    def serialize(self):
-        if self.value < 0xFD:
-            return struct.pack("B", self.value)
-        if self.value <= 0xFFFF:
-            return b'\xFD' + struct.pack("<H", self.value)
-        if self.value <= 0xFFFFFFFF:
-            return b'\xFE' + struct.pack("<I", self.value)
-        return b'\xFF' + struct.pack("<Q", self.value)
+    def encode(self, value):
+        value = int(value)
+        if value < 0xFD:
+            return struct.pack("B", value)
+        if value <= 0xFFFF:
+            return b'\xFD' + struct.pack("<H", value)
+        if value <= 0xFFFFFFFF:
+            return b'\xFE' + struct.pack("<I", value)
+        return b'\xFF' + struct.pack("<Q", value)
+
+    def encode_into(self, buf, value):
+        buf += self.encode(value)
+
+    def serialized_size(self, value):
+        if value < 0xFD:
+            return 1
+        if value <= 0xFFFF:
+            return 3
+        if value <= 0xFFFFFFFF:
+            return 5
+        return 9
 
 class VariableStringField(Field):
     """
@@ -294,66 +538,66 @@ class VariableStringField(Field):
         super().__init__()
         self.var_int = VariableIntegerField()
 
-    def parse(self, value):
-        self.value = str(value)
-
     def deserialize(self, stream):
+        """
+        Returns bytes read from the stream. Strings are short,
+        copying them keeps decoded models picklable.
+        """
         string_length = self.var_int.deserialize(stream)
-        string_data = stream.read(string_length)
-        return string_data
-
-    def serialize(self):
-        self.var_int.parse(len(self))
-        bin_data = BytesIO()
-        bin_data.write(self.var_int.serialize())
-        bin_data.write(bytes(self.value, "utf-8"))
-        return bin_data.getvalue()
-
-    def __len__(self):
-        return len(self.value)
+        return bytes(stream.read(string_length))
+
+    def skip(self, stream):
+        stream.skip(self.var_int.deserialize(stream))
+
+    def encode_into(self, buf, value):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        self.var_int.encode_into(buf, len(value))
+        buf += value
+
+    def serialized_size(self, value):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        return self.var_int.serialized_size(len(value)) + len(value)
+
+    def serialize_into(self, buf, offset, value):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        offset = self.var_int.serialize_into(buf, offset, len(value))
+        end = offset + len(value)
+        buf[offset:end] = value
+        return end
 
 class Hash(Field):
     """
-    A hash type field.
+    A hash type field. Values are Hash256 instances, integers
+    and hex strings are accepted when serializing.
     """
-    datatype = "<I"
+    struct_format = "32s"
 
-    def parse(self, value):
-        self.value = value
+    def from_struct(self, value):
+        return Hash256(value)
+
+    def to_struct(self, value):
+        return Hash256.from_value(value)
 
     def deserialize(self, stream):
-        data_size = struct.calcsize(self.datatype)
-        intvalue = 0
-        for i in range(8):
-            data = stream.read(data_size)
-            val = struct.unpack(self.datatype, data)[0]
-            intvalue += val << (i * 32)
-        return intvalue
+        return Hash256(stream.read(Hash256.size))
 
-    def serialize(self):
-        hash_ = self.value
-        bin_data = BytesIO()
-        for _ in range(8):
-            pack_data = struct.pack(self.datatype, hash_ & 0xFFFFFFFF)
-            bin_data.write(pack_data)
-            hash_ >>= 32
-        return bin_data.getvalue()
+    def encode(self, value):
+        return self.to_struct(value)
 
 class BlockLocator(Field):
     # pylint: disable=abstract-method
     """
     A block locator type used for getblocks and getheaders.
     """
-    datatype = "<I"
+    def encode(self, value):
+        return b"".join(Hash256.from_value(hash_) for hash_ in value)
 
-    def parse(self, value):
-        self.values = value
+    def encode_into(self, buf, value):
+        for hash_ in value:
+            buf += Hash256.from_value(hash_)
 
-    def serialize(self):
-        bin_data = BytesIO()
-        for hash_ in self.values:
-            for _ in range(8):
-                pack_data = struct.pack(self.datatype, hash_ & 0xFFFFFFFF)
-                bin_data.write(pack_data)
-                hash_ >>= 32
-        return bin_data.getvalue()
+    def serialized_size(self, value):
+        return len(value) * Hash256.size
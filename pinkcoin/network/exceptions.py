@@ -14,3 +14,23 @@ class InvalidMessageChecksum(Exception):
     message in a message header doesn't match the actual
     checksum of the message.
     """
+
+class InvalidMessageSize(Exception):
+    """
+    This exception is thrown when the payload length in a message
+    header exceeds the limit for the message command or doesn't
+    match the size of a fixed size message.
+    """
+
+class InsufficientDataException(Exception):
+    """
+    This exception is thrown when deserializer tries to read
+    more data than is present in the message buffer.
+    """
+
+class OutboundBufferOverflow(Exception):
+    """
+    This exception is thrown when messages queued for a peer
+    exceed the outbound buffer limit, usually because the peer
+    doesn't read data as fast as it is sent.
+    """
@@ -0,0 +1,165 @@
+"""
+Headers-first synchronization of the block headers chain.
+"""
+
+import random
+from asyncio import Event, ensure_future, sleep, wait
+import time
+
+from . import params
+from .core.serializers import GetHeaders
+from ..primitives.chain import BlockIndex, InvalidHeaders
+from ..primitives.header_hashing import HeaderHasher
+
+
+class HeaderSync:
+    """
+    Downloads block headers from the fastest connected peer.
+    The next getheaders is sent as soon as a full headers message
+    arrives (only its last header is hashed), the received headers
+    are validated while the next message is being downloaded.
+    Peers not answering within stall_timeout are replaced.
+    With a store, the sync continues from the stored chain,
+    the active chain is saved after each headers message and
+    the store is flushed to the disk when the sync finishes.
+
+    :param node: Node with connected peers
+    :param chain: BlockIndex extended by the received headers, required
+                  on networks without known genesis block
+    :param hasher: HeaderHasher hashing the headers
+    :param stall_timeout: time to wait for headers (in seconds)
+    :param stall_penalty: time the stalled peer isn't used (in seconds)
+    :param store: opened HeaderStore keeping the active chain
+    :param check_pow: check proof of work of headers added to the created chain,
+                      only for chains without proof of stake blocks
+    """
+    def __init__(self, node, chain=None, hasher=None,
+                 stall_timeout=params.HEADERS_STALL_TIMEOUT, stall_penalty=10*60, store=None,
+                 check_pow=False):
+        self.node = node
+        if chain is None and node.network_type not in params.GENESIS_BLOCK_HASHES:
+            raise ValueError(
+                f"Genesis block of {node.network_type} network isn't known, "
+                f"headers sync needs a chain."
+            )
+        pow_limit = params.POW_LIMITS.get(node.network_type) if check_pow else None
+        if check_pow and pow_limit is None:
+            raise ValueError(f"Proof of work limit of {node.network_type} network isn't known.")
+        if chain is None and store is not None:
+            chain = store.load_index(pow_limit)
+        elif chain is None:
+            chain = BlockIndex(params.GENESIS_BLOCK_HASHES[node.network_type], pow_limit)
+        self.chain = chain
+        self.store = store
+        self.hasher = hasher or HeaderHasher()
+        self.stall_timeout = stall_timeout
+        self.stall_penalty = stall_penalty
+        self.sync_peer = None
+        self.synced = False
+        self.stalled = {}
+        self.progress = Event()
+
+    def select_peer(self):
+        """
+        Returns name of the peer with the lowest ping RTT
+        among peers which finished handshake and didn't stall.
+        """
+        now = time.monotonic()
+        candidates = [
+            peer for name, peer in self.node.peers.items()
+            if peer.verack_received and self.stalled.get(name, 0) <= now
+        ]
+        if not candidates:
+            return None
+        random.shuffle(candidates)
+        fastest = min(candidates, key=lambda peer: (
+            peer.latency.ewma_rtt
+            if peer.latency is not None and peer.latency.ewma_rtt is not None
+            else float("inf")
+        ))
+        return fastest.name
+
+    def request(self, peer_name, locator):
+        """
+        Sends getheaders with the locator to the peer.
+
+        :param peer_name: Peer name
+        :param locator: list of block hashes
+        """
+        self.node.send_message(peer_name, GetHeaders(locator[:params.MAX_LOCATOR_SZ]))
+
+    async def run(self, poll_interval=1.0):
+        """
+        Synchronizes the headers chain, returns when the peer
+        sends less than the maximum number of headers.
+
+        :param poll_interval: time between checks for usable peers (in seconds)
+        """
+        self.node.register_handler("headers", self.handle_headers)
+        try:
+            while not self.synced:
+                peer_name = self.select_peer()
+                if peer_name is None:
+                    await sleep(poll_interval)
+                    continue
+                self.sync_peer = peer_name
+                self.request(peer_name, self.chain.get_locator())
+                await self.follow_peer(peer_name)
+        finally:
+            self.sync_peer = None
+            self.node.unregister_handler("headers", self.handle_headers)
+        return self.chain
+
+    async def follow_peer(self, peer_name):
+        """
+        Waits for headers from the sync peer while it makes progress.
+
+        :param peer_name: Peer name
+        """
+        while not self.synced and self.sync_peer == peer_name:
+            self.progress.clear()
+            progress = ensure_future(self.progress.wait())
+            try:
+                await wait({progress}, timeout=self.stall_timeout)
+            finally:
+                progress.cancel()
+            if not self.progress.is_set():
+                print(f"Warning: Headers sync peer {peer_name} stalled.")
+                self.stalled[peer_name] = time.monotonic() + self.stall_penalty
+                self.sync_peer = None
+
+    async def handle_headers(self, peer_name, message_header, message):
+        #pylint: disable=unused-argument
+        """
+        Requests the next headers and connects received ones to the chain.
+
+        :param peer_name: Peer name
+        :param message_header: The header of the Headers message
+        :param message: The Headers message
+        """
+        if peer_name != self.sync_peer:
+            return
+        headers = message.headers
+        if len(headers) == params.MAX_HEADERS_RESULTS:
+            # Keeps the next request in flight during validation.
+            last_hash = headers[-1].calculate_hash()
+            self.request(peer_name, [last_hash] + self.chain.get_locator())
+
+        hashes = await self.hasher.hash_block_headers(headers)
+        try:
+            self.chain.add_headers(headers, hashes)
+        except InvalidHeaders as ex:
+            print(f"Warning: {ex} (node {peer_name}).")
+            self.stalled[peer_name] = time.monotonic() + self.stall_penalty
+            self.sync_peer = None
+            self.node.disconnect(peer_name)
+        else:
+            if self.store is not None:
+                self.store.save_chain(self.chain)
+            if len(headers) < params.MAX_HEADERS_RESULTS:
+                self.synced = True
+                if self.store is not None:
+                    self.store.flush()
+            if self.node.cluster is not None:
+                self.node.cluster.update_tip(self.chain.height, self.chain.tip)
+        self.progress.set()
@@ -0,0 +1,217 @@
+"""
+Keepalive pings with latency tracking and idle peers disconnection.
+"""
+
+import math
+import random
+import time
+from asyncio import sleep
+
+from . import params
+from .core.serializers import Ping
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel, keys are put into slots by their
+    deadline and the slots are visited one per tick.
+
+    :param tick: duration of one tick (in seconds)
+    :param slots: number of slots
+    """
+    def __init__(self, tick=1.0, slots=256):
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]
+        self.position = 0
+        self.key_slots = {}
+
+    def schedule(self, key, delay):
+        """
+        Schedules the key to expire after delay, replaces previous schedule.
+
+        :param key: hashable key
+        :param delay: time until expiration (in seconds)
+        """
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        index = (self.position + ticks) % len(self.slots)
+        self.slots[index][key] = (ticks - 1) // len(self.slots)
+        self.key_slots[key] = index
+
+    def cancel(self, key):
+        """
+        Removes the key from the wheel.
+
+        :param key: hashable key
+        """
+        index = self.key_slots.pop(key, None)
+        if index is not None:
+            del self.slots[index][key]
+
+    def advance(self):
+        """
+        Moves the wheel by one tick and returns expired keys.
+        """
+        self.position = (self.position + 1) % len(self.slots)
+        slot = self.slots[self.position]
+        expired = []
+        for key, rounds in list(slot.items()):
+            if rounds:
+                slot[key] = rounds - 1
+            else:
+                del slot[key]
+                del self.key_slots[key]
+                expired.append(key)
+        return expired
+
+    def __len__(self):
+        return len(self.key_slots)
+
+
+class PeerLatency:
+    """
+    Ping state and round trip times of the peer (in seconds).
+
+    :param now: monotonic time of the connection
+    """
+    __slots__ = (
+        "ping_nonce", "ping_sent", "last_received", "last_rtt", "min_rtt", "ewma_rtt"
+    )
+
+    def __init__(self, now):
+        self.ping_nonce = None
+        self.ping_sent = None
+        self.last_received = now
+        self.last_rtt = None
+        self.min_rtt = None
+        self.ewma_rtt = None
+
+    def update_rtt(self, rtt, alpha):
+        """
+        Records round trip time of the answered ping.
+
+        :param rtt: round trip time
+        :param alpha: weight of the new sample in moving average
+        """
+        self.last_rtt = rtt
+        self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+        self.ewma_rtt = rtt if self.ewma_rtt is None else (
+            alpha * rtt + (1 - alpha) * self.ewma_rtt
+        )
+
+    def __repr__(self):
+        return "<{} Last=[{}] Min=[{}] EWMA=[{}]>".format(
+            self.__class__.__name__, self.last_rtt, self.min_rtt, self.ewma_rtt
+        )
+
+
+class KeepAlive:
+    """
+    Sends pings to all node peers every ping_interval and
+    disconnects peers that didn't send anything or didn't answer
+    the ping within timeout. One timer wheel serves all peers.
+    Latency of the peer is available as peer.latency.
+
+    :param node: Node whose peers are pinged
+    :param ping_interval: time between pings (in seconds)
+    :param timeout: inactivity time after which peer is disconnected (in seconds)
+    :param tick: timer resolution (in seconds)
+    :param alpha: weight of the new sample in RTT moving average
+    """
+    def __init__(self, node, ping_interval=params.PING_INTERVAL,
+                 timeout=params.TIMEOUT_INTERVAL, tick=1.0, alpha=0.125):
+        self.node = node
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self.alpha = alpha
+        self.wheel = TimerWheel(tick, slots=max(1, math.ceil(ping_interval / tick)))
+        self.states = {}
+
+    def add_peer(self, peer):
+        """
+        Starts tracking the connected peer.
+
+        :param peer: connected Peer
+        """
+        peer.latency = self.states[peer.name] = PeerLatency(time.monotonic())
+        self.wheel.schedule(peer.name, self.ping_interval)
+
+    def remove_peer(self, peer_name):
+        """
+        Stops tracking the peer.
+
+        :param peer_name: Peer name
+        """
+        self.states.pop(peer_name, None)
+        self.wheel.cancel(peer_name)
+
+    def message_received(self, peer_name):
+        """
+        Records activity of the peer.
+
+        :param peer_name: Peer name
+        """
+        state = self.states.get(peer_name)
+        if state is not None:
+            state.last_received = time.monotonic()
+
+    async def handle_pong(self, peer_name, message_header, message):
+        #pylint: disable=unused-argument
+        """
+        Matches the Pong message with sent ping and updates the RTT.
+
+        :param peer_name: Peer name
+        :param message_header: The header of the Pong message
+        :param message: The Pong message
+        """
+        state = self.states.get(peer_name)
+        if state is None or state.ping_nonce is None or message.nonce != state.ping_nonce:
+            return
+        state.update_rtt(time.monotonic() - state.ping_sent, self.alpha)
+        state.ping_nonce = None
+        state.ping_sent = None
+
+    def expire(self, peer_name, now):
+        """
+        Checks the peer whose timer expired, pings or disconnects it.
+
+        :param peer_name: Peer name
+        :param now: current monotonic time
+        """
+        state = self.states.get(peer_name)
+        if state is None:
+            return
+        if now - state.last_received > self.timeout or (
+                state.ping_sent is not None and now - state.ping_sent > self.timeout):
+            print(f"Warning: Peer {peer_name} timed out.")
+            self.remove_peer(peer_name)
+            self.node.disconnect(peer_name)
+            return
+
+        if state.ping_nonce is None:
+            ping = Ping()
+            ping.nonce = random.getrandbits(64)
+            state.ping_nonce = ping.nonce
+            state.ping_sent = now
+            self.node.send_message(peer_name, ping)
+        self.wheel.schedule(peer_name, self.ping_interval)
+
+    def advance(self):
+        """
+        Moves the timer wheel by one tick.
+        """
+        now = time.monotonic()
+        for peer_name in self.wheel.advance():
+            self.expire(peer_name, now)
+
+    async def run(self):
+        """
+        Moves the timer wheel every tick until canceled.
+        """
+        tick = self.wheel.tick
+        next_tick = time.monotonic() + tick
+        while True:
+            await sleep(max(0.0, next_tick - time.monotonic()))
+            while next_tick <= time.monotonic():
+                self.advance()
+                next_tick += tick
@@ -0,0 +1,137 @@
+"""
+Inbound connections listener.
+"""
+
+import time
+from asyncio import create_task, current_task, get_event_loop, start_server
+
+from .peer import Peer
+from .protocol import PeerProtocol
+
+
+class AcceptRateLimiter:
+    """
+    Token bucket limiting rate of accepted connections.
+
+    :param rate: accepted connections per second
+    :param burst: connections accepted at once after idle period
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def allow(self):
+        """
+        Takes one token if available.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class InboundListener:
+    """
+    Accepts connections on the node address. Accepted peers go through
+    the same handshake and message handling as outbound peers.
+    Connections above max_inbound or accept rate are closed.
+    Tasks serving the accepted peers are kept until they finish.
+
+    :param node: Node handling accepted peers
+    :param max_inbound: maximum number of inbound connections
+    :param accept_rate: accepted connections per second
+    :param accept_burst: connections accepted at once after idle period
+    """
+    def __init__(self, node, max_inbound, accept_rate, accept_burst):
+        self.node = node
+        self.max_inbound = max_inbound
+        self.limiter = AcceptRateLimiter(accept_rate, accept_burst)
+        self.inbound = set()
+        self.tasks = set()
+        self.server = None
+
+    async def start(self, **kwargs):
+        """
+        Starts listening on the node address.
+        Keyword arguments are passed to the server creation.
+        """
+        if self.node.buffered_protocol:
+            self.server = await get_event_loop().create_server(
+                lambda: PeerProtocol(connected_callback=self.protocol_connected),
+                self.node.node_ip, self.node.node_port, **kwargs
+            )
+        else:
+            self.server = await start_server(
+                self.stream_connected, self.node.node_ip, self.node.node_port, **kwargs
+            )
+
+    def accept(self):
+        """
+        Checks if a new connection can be accepted.
+        """
+        if len(self.inbound) >= self.max_inbound:
+            return False
+        return self.limiter.allow()
+
+    def track(self, task):
+        """
+        Keeps the task serving a peer until it finishes.
+
+        :param task: asyncio Task
+        """
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def serve(self, peer):
+        """
+        Handles the inbound peer until it disconnects.
+
+        :param peer: accepted Peer
+        """
+        self.inbound.add(peer.name)
+        try:
+            self.node.register_peer(peer)
+            await self.node.run_peer(peer)
+        finally:
+            self.inbound.discard(peer.name)
+
+    async def stream_connected(self, reader, writer):
+        """
+        Handles connection accepted by the streams server.
+        """
+        if not self.accept():
+            writer.close()
+            return
+        self.track(current_task())
+        await self.serve(Peer.from_accepted(writer, reader=reader))
+
+    def protocol_connected(self, protocol):
+        """
+        Handles connection accepted by the protocol server.
+        """
+        if not self.accept():
+            protocol.transport.abort()
+            return
+        peer = Peer.from_accepted(protocol.transport, protocol=protocol)
+        self.track(create_task(self.serve(peer)))
+
+    def close(self):
+        """
+        Stops accepting connections and disconnects the accepted peers.
+        """
+        if self.server is not None:
+            self.server.close()
+        for task in list(self.tasks):
+            task.cancel()
+
+    async def wait_closed(self):
+        """
+        Waits until the server is closed.
+        """
+        if self.server is not None:
+            await self.server.wait_closed()
@@ -2,6 +2,7 @@
 List of all network messages.
 """
 
+from . import params
 from .core import serializers as core
 from .secure_messages import serializers as smsg
 
@@ -37,3 +38,27 @@ MESSAGE_MAPPING = {
     "smsgDisabled": smsg.SecureMessageDisabledSerializer,
     "smsgIgnore": smsg.SecureMessageIgnoreSerializer,
 }
+
+
+def get_payload_limits(serializer_class):
+    """
+    Returns (exact, maximum) payload size of messages handled
+    by the serializer. Exact size is None for messages
+    with variable length payload.
+
+    :param serializer_class: message serializer class
+    """
+    exact = serializer_class._fixed_size if serializer_class.exact_size else None
+    maximum = serializer_class.max_payload_size
+    if maximum is None:
+        maximum = exact if exact is not None else params.MAX_PROTOCOL_MESSAGE_LENGTH
+    return (exact, maximum)
+
+# Payload size limits checked as soon as the message header is received.
+PAYLOAD_SIZE_LIMITS = {
+    command: get_payload_limits(serializer_class)
+    for command, serializer_class in MESSAGE_MAPPING.items()
+}
+
+# Limits of messages with commands missing in the mapping.
+DEFAULT_PAYLOAD_SIZE_LIMITS = (None, params.MAX_PROTOCOL_MESSAGE_LENGTH)
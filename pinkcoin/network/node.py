@@ -2,11 +2,39 @@
 Simple Pinkcoin p2p node implementation.
 """
 
-from asyncio import open_connection, create_task, CancelledError
+from asyncio import (
+    create_task, ensure_future, gather, get_event_loop, wait, CancelledError, FIRST_COMPLETED,
+    Queue, Semaphore
+)
+from concurrent.futures import ProcessPoolExecutor
+from typing import FrozenSet
 
+from . import params
+from .base_serializer import MessageHeaderSerializer
 from .buffer import ProtocolBuffer
+from .keepalive import KeepAlive
+from .listener import InboundListener
+from .messages import MESSAGE_MAPPING
+from .outbound import OutboundQueue
+from .peer import Peer
 from .core.serializers import Version, VerAck, Pong
-from .exceptions import NodeDisconnectException, InvalidMessageChecksum
+from .exceptions import (
+    NodeDisconnectException, InvalidMessageChecksum, InvalidMessageSize, OutboundBufferOverflow
+)
+
+
+def handles(*commands):
+    """
+    Decorator registering node method as a handler of the commands.
+    Handlers are called with (peer_name, message_header, message)
+    after handle_<command> method.
+
+    :param commands: message commands handled by the method
+    """
+    def decorator(func):
+        func.handled_commands = getattr(func, "handled_commands", ()) + commands
+        return func
+    return decorator
 
 
 class Node:
@@ -16,29 +44,182 @@ class Node:
 
     :param ip: node ip address
     :param port: node port to it binds to
+    :param buffered_protocol: use PeerProtocol (asyncio BufferedProtocol)
+                              connections instead of streams
     """
     network_type = "main"
 
-    def __init__(self, ip: str, port):
+    # Payloads of at least this size (in bytes) are verified and deserialized
+    # in offload_executor instead of the event loop (None disables it).
+    # Full headers messages (about 160 KB) are above it.
+    offload_threshold = 64*1024
+    # Executor used for big payloads, None means default loop executor
+    # (thread pool). With ProcessPoolExecutor only checksums are calculated
+    # in it, messages are deserialized in the default executor.
+    offload_executor = None
+
+    # Outbound buffer size pausing and resuming writes to peers
+    # and the limit disconnecting peers that don't read fast enough.
+    send_high_water = 256*1024
+    send_low_water = 64*1024
+    send_buffer_limit = 16*1024*1024
+
+    # Size of the per-peer queue of received messages waiting
+    # for handlers, reading from the peer pauses when it's full.
+    handler_queue_size = 256
+    # Commands whose handlers run concurrently (up to parallel_handlers
+    # per peer), other messages of the peer are handled one by one in order.
+    parallel_commands: FrozenSet[str] = frozenset()
+    parallel_handlers = 8
+
+    def __init__(self, ip: str, port, buffered_protocol=False):
         self.node_ip = ip
         self.node_port = port
+        self.buffered_protocol = buffered_protocol
         # Peers connected to the node.
         self.peers = {}
+        self.listener = None
+        # ClusterChannel of the worker process in multi-process mode.
+        self.cluster = None
+        self.keepalive = None
+        self.keepalive_task = None
+        # Bound message handlers by command.
+        self.dispatch_table = {
+            command: [getattr(self, name) for name in names]
+            for command, names in self.get_handler_names().items()
+        }
+
+    @classmethod
+    def get_handler_names(cls):
+        """
+        Returns names of message handlers by command, handle_<command>
+        methods first, decorated methods in definition order.
+        The names are collected once per class.
+        """
+        handler_names = cls.__dict__.get("_handler_names")
+        if handler_names is not None:
+            return handler_names
+
+        handler_names = {}
+        for command in MESSAGE_MAPPING:
+            if callable(getattr(cls, "handle_" + command, None)):
+                handler_names[command] = ["handle_" + command]
+        for klass in reversed(cls.__mro__):
+            for name, value in klass.__dict__.items():
+                for command in getattr(value, "handled_commands", ()):
+                    names = handler_names.setdefault(command, [])
+                    if name not in names:
+                        names.append(name)
+        cls._handler_names = handler_names
+        return handler_names
+
+    def register_handler(self, command, handler):
+        """
+        Adds message handler of the command to this node.
+
+        :param command: message command
+        :param handler: coroutine function called with
+                        (peer_name, message_header, message)
+        """
+        self.dispatch_table.setdefault(command, []).append(handler)
+
+    def unregister_handler(self, command, handler):
+        """
+        Removes message handler added by register_handler().
+
+        :param command: message command
+        :param handler: registered handler
+        """
+        handlers = self.dispatch_table.get(command, [])
+        if handler in handlers:
+            handlers.remove(handler)
 
     def send_message(self, peer_name, message):
         """
         Serializes the message using the appropriate
         serializer based on the message command
-        and sends it to the socket stream.
+        and queues it for sending to the peer.
+        The peer is disconnected when its outbound
+        buffer limit is exceeded.
+
+        :param peer_name: Peer name
+        :param message: The message object to send
+        """
+        return self.send_frame(peer_name, message.get_message(self.network_type))
+
+    def send_frame(self, peer_name, frame):
+        """
+        Queues serialized message for sending to the peer.
+
+        :param peer_name: Peer name
+        :param frame: serialized message with header
+        """
+        try:
+            outbound = self.peers[peer_name].outbound
+        except KeyError:
+            print(f"Error: Connection to {peer_name} doesn't exist.")
+            return False
+
+        try:
+            outbound.put(frame)
+        except OutboundBufferOverflow as ex:
+            print(f"Warning: {ex} Disconnecting {peer_name}.")
+            outbound.close()
+            outbound.transport.abort()
+            return False
+        return True
+
+    def broadcast_message(self, message):
+        """
+        Sends the message to all connected peers, and to peers
+        of other worker processes in multi-process mode.
+        The message is serialized only once.
+
+        :param message: The message object to send
+        """
+        frame = message.get_message(self.network_type, cached=True)
+        self.broadcast_frame(frame)
+        if self.cluster is not None:
+            self.cluster.broadcast(frame)
+
+    def broadcast_frame(self, frame):
+        """
+        Queues serialized message for sending to all connected peers.
+
+        :param frame: serialized message with header
+        """
+        for peer_name in list(self.peers):
+            self.send_frame(peer_name, frame)
+
+    async def send_message_async(self, peer_name, message, flush=False):
+        """
+        Queues the message like send_message() and waits while
+        the peer's outbound buffer is above the high watermark.
 
         :param peer_name: Peer name
         :param message: The message object to send
+        :param flush: wait until all queued messages are written
+        """
+        if not self.send_message(peer_name, message):
+            return
+        outbound = self.peers[peer_name].outbound
+        if flush:
+            await outbound.flush()
+        else:
+            await outbound.wait_writable()
+
+    async def flush_messages(self, peer_name):
+        """
+        Waits until messages queued for the peer are written.
+
+        :param peer_name: Peer name
         """
         try:
-            writer = self.peers[peer_name]["writer"]
-            writer.write(message.get_message(self.network_type))
+            outbound = self.peers[peer_name].outbound
         except KeyError:
             print(f"Error: Connection to {peer_name} doesn't exist.")
+            return
+        await outbound.flush()
 
     async def close_connection(self, peer_name):
         """
@@ -47,12 +228,23 @@ class Node:
         :param peer_name: Peer name
         """
         try:
-            writer = self.peers[peer_name]["writer"]
-            reader = self.peers[peer_name]["reader"]
-            reader.feed_eof()
-            writer.close()
-            await writer.wait_closed()
-            del self.peers[peer_name]
+            peer = self.peers.pop(peer_name)
+        except KeyError:
+            print(f"Error: Connection to {peer_name} doesn't exist.")
+            return
+        if self.keepalive is not None:
+            self.keepalive.remove_peer(peer_name)
+        await peer.close_connection()
+
+    def disconnect(self, peer_name):
+        """
+        Aborts connection to the peer, the task handling
+        the peer then closes it.
+
+        :param peer_name: Peer name
+        """
+        try:
+            self.peers[peer_name].abort()
         except KeyError:
             print(f"Error: Connection to {peer_name} doesn't exist.")
 
@@ -74,23 +266,107 @@ class Node:
         :param peer_ip: Peer ip address
         :param peer_port: Peer port
         """
-        peer_name = f"{peer_ip}:{peer_port}"
         try:
-            reader, writer = await open_connection(peer_ip, peer_port)
-            self.peers[peer_name] = {
-                "reader": reader,
-                "writer": writer,
-                "buffer": ProtocolBuffer()
-            }
+            peer = await self.open_peer(peer_ip, peer_port)
+        except ConnectionError:
+            print(f"Error: connection error for peer {peer_ip}:{peer_port}")
+            return
+        await self.run_peer(peer)
+
+    async def open_peer(self, peer_ip, peer_port):
+        """
+        Creates TCP connection and registers the new peer.
+        Connection errors are raised to the caller.
+
+        :param peer_ip: Peer ip address
+        :param peer_port: Peer port
+        """
+        peer = Peer(peer_ip, peer_port)
+        await peer.open(self.buffered_protocol)
+        self.register_peer(peer)
+        return peer
+
+    def register_peer(self, peer):
+        """
+        Starts writing messages to the connected peer
+        and adds it to the node peers.
+
+        :param peer: connected Peer
+        """
+        peer.start_writer(self.create_outbound(peer.transport, peer.drain))
+        self.peers[peer.name] = peer
+        if self.keepalive is not None:
+            self.keepalive.add_peer(peer)
+
+    def start_keepalive(self, **kwargs):
+        """
+        Starts pinging peers and disconnecting inactive ones.
+        Keyword arguments are passed to KeepAlive.
+        """
+        self.keepalive = KeepAlive(self, **kwargs)
+        self.register_handler("pong", self.keepalive.handle_pong)
+        for peer in self.peers.values():
+            self.keepalive.add_peer(peer)
+        self.keepalive_task = create_task(self.keepalive.run())
+        return self.keepalive
+
+    def stop_keepalive(self):
+        """
+        Stops pinging peers.
+        """
+        if self.keepalive is None:
+            return
+        self.keepalive_task.cancel()
+        self.unregister_handler("pong", self.keepalive.handle_pong)
+        self.keepalive = None
+        self.keepalive_task = None
+
+    async def listen(self, **kwargs):
+        """
+        Starts accepting connections on the node ip and port.
+        Limits of inbound connections are taken from
+        INBOUND_SETTINGS of the node network type.
+        Keyword arguments are passed to the server creation.
+        """
+        settings = params.INBOUND_SETTINGS[self.network_type]
+        self.listener = InboundListener(self, **settings)
+        await self.listener.start(**kwargs)
+        return self.listener
+
+    async def run_peer(self, peer):
+        """
+        Handles communication with the connected peer
+        until it disconnects.
+
+        :param peer: Peer returned by open_peer()
+        """
+        peer_name = peer.name
+        try:
             client_coro = create_task(self.connection_handler(peer_name))
             await client_coro
         except CancelledError:
             print(f"Warning: Task handling connection to {peer_name} canceled.")
         except NodeDisconnectException:
             print(f"Warning: Peer {peer_name} disconnected")
-            await self.close_connection(peer_name)
         except ConnectionError:
             print(f"Error: connection error for peer {peer_name}")
+        finally:
+            if self.peers.get(peer_name) is peer:
+                await self.close_connection(peer_name)
+
+    def create_outbound(self, transport, drain):
+        """
+        Creates outbound queue of the peer connection.
+
+        :param transport: asyncio transport of the connection
+        :param drain: coroutine function waiting until transport is writable
+        """
+        return OutboundQueue(
+            transport, drain,
+            high_water=self.send_high_water,
+            low_water=self.send_low_water,
+            max_buffered=self.send_buffer_limit
+        )
 
     async def connection_handler(self, peer_name):
         """
@@ -99,25 +375,132 @@ class Node:
         # Initialize communitaion.
         self.handshake(peer_name)
         try:
-            writer = self.peers[peer_name]["writer"]
-            # Enters connection read/write loop.
-            while not writer.is_closing():
-                await self.handle_message(peer_name)
+            peer = self.peers[peer_name]
         except KeyError:
             print(f"Error: Connection to {peer_name} doesn't exist.")
+            return
+        peer.messages = Queue(self.handler_queue_size)
+        peer.parallel_limit = Semaphore(self.parallel_handlers)
+        peer.processor = create_task(self.process_messages(peer))
+        # Failed processor aborts the connection, so the pending read ends.
+        peer.processor.add_done_callback(lambda task: self.processor_done(peer, task))
+        try:
+            # Enters connection read loop, messages are handled by the processor.
+            while not peer.is_closing():
+                await self.handle_message(peer_name)
+        except NodeDisconnectException:
+            # Handles messages received before the disconnection.
+            if not peer.processor.done():
+                await self.put_message(peer, None)
+                await gather(peer.processor, return_exceptions=True)
+            await gather(*peer.handler_tasks, return_exceptions=True)
+            raise
+        finally:
+            peer.processor.cancel()
+            for task in list(peer.handler_tasks):
+                task.cancel()
+
+    async def process_messages(self, peer):
+        """
+        Handles messages queued by the read loop until None
+        is queued. Messages of parallel_commands are handled
+        in separate tasks.
+
+        :param peer: connected Peer
+        """
+        while True:
+            item = await peer.messages.get()
+            if item is None:
+                return
+            message_header, payload = item
+            if message_header.command not in self.parallel_commands:
+                await self.handle_frame(peer.name, message_header, payload)
+                continue
+
+            await peer.parallel_limit.acquire()
+            task = create_task(self.handle_frame(peer.name, message_header, payload))
+            peer.handler_tasks.add(task)
+            task.add_done_callback(lambda task: self.parallel_handler_done(peer, task))
+
+    def processor_done(self, peer, task):
+        """
+        Disconnects the peer when its message processor failed.
+
+        :param peer: connected Peer
+        :param task: finished processor task
+        """
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error: message processing failed for peer {peer.name}: {task.exception()!r}")
+            if not peer.is_closing():
+                peer.abort()
+
+    def parallel_handler_done(self, peer, task):
+        """
+        Cleans up after concurrently executed handler,
+        the peer is disconnected when the handler failed.
+
+        :param peer: connected Peer
+        :param task: finished handler task
+        """
+        peer.handler_tasks.discard(task)
+        peer.parallel_limit.release()
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error: handler failed for peer {peer.name}: {task.exception()!r}")
+            self.disconnect(peer.name)
+
+    async def queue_frame(self, peer, message_header, payload):
+        """
+        Puts received message into the peer queue.
+
+        :param peer: connected Peer
+        :param message_header: The message header
+        :param payload: The message payload
+        """
+        if self.keepalive is not None:
+            self.keepalive.message_received(peer.name)
+        await self.put_message(peer, (message_header, payload))
+
+    @staticmethod
+    async def put_message(peer, item):
+        """
+        Puts item into the peer queue, waits while the queue
+        is full. NodeDisconnectException is raised when
+        the message processor stopped.
+
+        :param peer: connected Peer
+        :param item: (header, payload) tuple or None ending the processor
+        """
+        if peer.processor.done():
+            raise NodeDisconnectException(f"Messages of node {peer.name} aren't processed.")
+        if not peer.messages.full():
+            peer.messages.put_nowait(item)
+            return
+
+        put = ensure_future(peer.messages.put(item))
+        await wait({put, peer.processor}, return_when=FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            raise NodeDisconnectException(f"Messages of node {peer.name} aren't processed.")
 
     async def handle_message(self, peer_name):
         """
-        Handles one message received from the peer.
+        Reads data received from the peer and queues
+        all complete messages present in the buffer.
 
         :param peer_name: Peer name
         """
         try:
-            reader = self.peers[peer_name]["reader"]
-            buffer = self.peers[peer_name]["buffer"]
+            peer = self.peers[peer_name]
         except KeyError:
             print(f"Error: Connection to {peer_name} doesn't exist.")
             return
+        reader, buffer, protocol = peer.reader, peer.buffer, peer.protocol
+
+        if protocol is not None:
+            # Protocol has already framed the received data.
+            for message_header, payload in await protocol.read_frames():
+                await self.queue_frame(peer, message_header, payload)
+            return
 
         data = await reader.read(1024*8)
 
@@ -126,22 +509,71 @@ class Node:
 
         buffer.write(data)
         try:
-            message_header, message = buffer.receive_message()
-        except InvalidMessageChecksum as ex:
-            print(f"Warning: {ex} (node {peer_name}).")
-            return
+            for message_header, payload in buffer.frames():
+                await self.queue_frame(peer, message_header, payload)
+        except InvalidMessageSize as ex:
+            # Peer sends data we won't buffer, it's disconnected.
+            raise NodeDisconnectException(f"{ex} (node {peer_name}).") from ex
+
+    async def handle_frame(self, peer_name, message_header, payload):
+        """
+        Deserializes one received message and
+        executes its handlers. The peer is disconnected
+        when decoding or a handler fails.
 
-        if message_header is not None:
-            await self.handle_message_header(peer_name, message_header, data)
+        :param peer_name: Peer name
+        :param message_header: The message header
+        :param payload: The message payload
+        """
+        await self.handle_message_header(peer_name, message_header, payload)
 
-        if not message:
+        # Messages nobody handles are not even deserialized.
+        handlers = self.dispatch_table.get(message_header.command)
+        if not handlers:
             return
 
-        # Executes proper message handler.
-        handle_func_name = "handle_" + message_header.command
-        handle_func = getattr(self, handle_func_name, None)
-        if handle_func and callable(handle_func):
-            await handle_func(peer_name, message_header, message)
+        try:
+            if self.offload_threshold is not None and len(payload) >= self.offload_threshold:
+                message = await self.decode_message_offloaded(message_header, payload)
+            else:
+                message = ProtocolBuffer.decode_message(message_header, payload)
+
+            if message is None:
+                return
+
+            # Executes message handlers.
+            for handler in tuple(handlers):
+                await handler(peer_name, message_header, message)
+        except InvalidMessageChecksum as ex:
+            print(f"Warning: {ex} (node {peer_name}).")
+        except Exception as ex: #pylint: disable=broad-except
+            print(f"Error: {message_header.command} handling failed "
+                  f"for peer {peer_name}: {ex!r}")
+            if peer_name in self.peers:
+                self.disconnect(peer_name)
+
+    async def decode_message_offloaded(self, message_header, payload):
+        """
+        Verifies checksum and deserializes the message in
+        the executor, so big payloads don't block the event loop.
+        Messages of the peer are still handled in order, because
+        its next message waits for this one.
+
+        :param message_header: The message header
+        :param payload: The message payload
+        """
+        loop = get_event_loop()
+        if isinstance(self.offload_executor, ProcessPoolExecutor):
+            payload_checksum = await loop.run_in_executor(
+                self.offload_executor, MessageHeaderSerializer.calc_checksum, payload
+            )
+            ProtocolBuffer.verify_checksum(message_header, payload_checksum)
+            return await loop.run_in_executor(
+                None, ProtocolBuffer.deserialize_payload, message_header, payload
+            )
+        return await loop.run_in_executor(
+            self.offload_executor, ProtocolBuffer.decode_message, message_header, payload
+        )
 
     def handshake(self, peer_name):
         """
@@ -166,6 +598,20 @@ class Node:
         verack = VerAck()
         self.send_message(peer_name, verack)
 
+    @handles("verack")
+    async def record_verack(self, peer_name, message_header, message):
+        #pylint: disable=unused-argument
+        """
+        Marks the peer as ready after the handshake.
+
+        :param peer_name: Peer name
+        :param message_header: The VerAck message header
+        :param message: The VerAck message
+        """
+        peer = self.peers.get(peer_name)
+        if peer is not None:
+            peer.verack_received = True
+
     async def handle_ping(self, peer_name, message_header, message):
         #pylint: disable=unused-argument
         """
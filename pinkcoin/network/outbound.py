@@ -0,0 +1,134 @@
+"""
+Per-peer outbound message queue with write backpressure.
+"""
+
+from asyncio import Event
+from collections import deque
+
+from .exceptions import OutboundBufferOverflow
+
+
+class OutboundQueue:
+    """
+    Queue of serialized messages waiting to be written to the peer.
+
+    Messages queued during one event loop iteration are written by
+    the writer task (run()) together, small ones joined into one write.
+    The transport write buffer limits are set to the watermarks, so
+    the writer task waits after every write until the transport buffer
+    drops below low_water once it went above high_water.
+
+    :param transport: asyncio transport of the connection
+    :param drain: coroutine function waiting until transport is writable
+    :param high_water: transport buffer size pausing writes
+    :param low_water: transport buffer size resuming writes
+    :param max_buffered: limit of queued and transport buffered bytes
+    :param coalesce_size: messages smaller than this are joined into one write
+    """
+    def __init__(self, transport, drain, high_water=256*1024, low_water=64*1024,
+                 max_buffered=16*1024*1024, coalesce_size=64*1024):
+        self.transport = transport
+        self.drain = drain
+        self.high_water = high_water
+        self.low_water = low_water
+        self.max_buffered = max_buffered
+        self.coalesce_size = coalesce_size
+        self.frames = deque()
+        self.queued_size = 0
+        self.writing = False
+        self.closed = False
+        self.queued = Event()
+        self.changed = Event()
+        transport.set_write_buffer_limits(high=high_water, low=low_water)
+
+    def buffered_size(self):
+        """
+        Returns number of bytes queued and buffered by the transport.
+        """
+        return self.queued_size + self.transport.get_write_buffer_size()
+
+    def put(self, frame):
+        """
+        Queues serialized message for writing.
+
+        :param frame: serialized message with header
+        """
+        if self.buffered_size() + len(frame) > self.max_buffered:
+            raise OutboundBufferOverflow(
+                f"Outbound buffer limit {self.max_buffered} exceeded."
+            )
+        self.frames.append(frame)
+        self.queued_size += len(frame)
+        self.queued.set()
+
+    def write_queued(self):
+        """
+        Writes all queued messages to the transport,
+        consecutive small messages in one write.
+        """
+        chunk = []
+        chunk_size = 0
+        while self.frames:
+            frame = self.frames.popleft()
+            self.queued_size -= len(frame)
+            if len(frame) >= self.coalesce_size:
+                if chunk:
+                    self.transport.write(b"".join(chunk))
+                    chunk = []
+                    chunk_size = 0
+                self.transport.write(frame)
+                continue
+            chunk.append(frame)
+            chunk_size += len(frame)
+            if chunk_size >= self.coalesce_size:
+                self.transport.write(b"".join(chunk))
+                chunk = []
+                chunk_size = 0
+        if chunk:
+            self.transport.write(b"".join(chunk))
+
+    async def run(self):
+        """
+        Writer task, writes queued messages until the connection is lost.
+        """
+        try:
+            while True:
+                while not self.frames:
+                    self.queued.clear()
+                    await self.queued.wait()
+                self.writing = True
+                self.write_queued()
+                await self.drain()
+                self.writing = False
+                self.changed.set()
+        except ConnectionError:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Drops queued messages and wakes up waiting tasks.
+        """
+        self.closed = True
+        self.writing = False
+        self.frames.clear()
+        self.queued_size = 0
+        self.changed.set()
+
+    async def wait_writable(self):
+        """
+        Waits while more than high_water bytes are buffered.
+        """
+        while not self.closed and self.buffered_size() > self.high_water:
+            self.changed.clear()
+            await self.changed.wait()
+
+    async def flush(self):
+        """
+        Waits until all queued messages are handed to the transport
+        and its buffer is below the watermarks.
+        """
+        while not self.closed and (self.frames or self.writing):
+            self.changed.clear()
+            await self.changed.wait()
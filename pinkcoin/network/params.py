@@ -12,6 +12,17 @@ MAGIC_VALUES = {
     "test": 0x0D050402,
 }
 
+# Hashes of the genesis blocks.
+GENESIS_BLOCK_HASHES = {
+    "main": "00000f79b700e6444665c4d090c9b8833664c4e2597c7087a6ba6391b956cc89",
+}
+
+# The highest (easiest) proof of work targets. Headers are checked
+# against them only on request, proof of stake headers don't meet them.
+POW_LIMITS = {
+    "main": (1 << 236) - 1,
+}
+
 # The available services.
 SERVICES = {
     "NODE_NONE": 0,
@@ -43,6 +54,43 @@ HARDCODED_NODES = {
     # "primary": {"ip": "159.203.20.96", "port": 9134},
 }
 
+# Number of outbound connections kept by PeerManager.
+MAX_OUTBOUND_CONNECTIONS = 8
+
+# Maximum number of concurrent outbound connection attempts.
+MAX_CONCURRENT_DIALS = 4
+
+# Inbound listener settings: maximum number of inbound connections
+# and accepted connections rate (per second) with allowed burst.
+INBOUND_SETTINGS = {
+    "main": {"max_inbound": 117, "accept_rate": 10.0, "accept_burst": 20},
+    "test": {"max_inbound": 32, "accept_rate": 5.0, "accept_burst": 10},
+}
+
+# Maximum length of a protocol message payload (in bytes).
+MAX_PROTOCOL_MESSAGE_LENGTH = 2*1024*1024
+
+# Maximum size of a block (in bytes).
+MAX_BLOCK_SIZE = 1000000
+
+# Maximum length of the user agent string in the version message.
+MAX_SUBVERSION_LENGTH = 256
+
+# Maximum number of entries in inv, getdata and notfound messages.
+MAX_INV_SZ = 50000
+
+# Maximum number of addresses in addr message.
+MAX_ADDR_SZ = 1000
+
+# Maximum number of headers in headers message.
+MAX_HEADERS_RESULTS = 2000
+
+# Maximum number of hashes in block locator.
+MAX_LOCATOR_SZ = 101
+
+# Time after which headers sync peer not answering getheaders is replaced (in seconds).
+HEADERS_STALL_TIMEOUT = 30
+
 # Time between pings automatically sent out for latency probing and keepalive (in seconds).
 PING_INTERVAL = 2*60
 
@@ -2,28 +2,127 @@
 Network peer implementation.
 """
 
-from asyncio import open_connection, create_task, CancelledError
+from asyncio import open_connection, create_task, get_event_loop
 
 from .buffer import ProtocolBuffer
+from .protocol import PeerProtocol
 
 
 class Peer:
     """
-    Network peer.
-    """
+    Network peer, holds the connection and its buffers.
+    In buffered protocol mode reader is None and writer
+    is the transport of the PeerProtocol.
 
-    async def __init__(self, ip, port):
+    :param ip: peer ip address
+    :param port: peer port
+    :param inbound: connection was accepted from the peer
+    """
+    def __init__(self, ip, port, inbound=False):
         self.ip = ip
         self.port = port
-        self.buffer = ProtocolBuffer()
+        self.name = f"{ip}:{port}"
+        self.inbound = inbound
+        self.reader = None
+        self.writer = None
+        self.protocol = None
+        self.buffer = None
+        self.outbound = None
+        self.writer_task = None
+        # PeerLatency when keepalive pings are enabled.
+        self.latency = None
+        self.verack_received = False
+        # Received messages waiting for handlers and the task handling them.
+        self.messages = None
+        self.processor = None
+        self.parallel_limit = None
+        self.handler_tasks = set()
+
+    @classmethod
+    def from_accepted(cls, writer, reader=None, protocol=None):
+        """
+        Creates peer of the accepted connection.
+
+        :param writer: stream writer or transport of the protocol
+        :param reader: stream reader (streams connection)
+        :param protocol: PeerProtocol (buffered protocol connection)
+        """
+        ip, port = writer.get_extra_info("peername")[:2]
+        peer = cls(ip, port, inbound=True)
+        peer.reader = reader
+        peer.writer = writer
+        peer.protocol = protocol
+        peer.buffer = protocol.buffer if protocol is not None else ProtocolBuffer()
+        return peer
+
+    async def open(self, buffered_protocol=False):
+        """
+        Creates TCP connection to the peer.
 
-        self.reader, self.writer = await open_connection(ip, port)
+        :param buffered_protocol: use PeerProtocol (asyncio BufferedProtocol)
+                                  connection instead of streams
+        """
+        if buffered_protocol:
+            self.writer, self.protocol = await get_event_loop().create_connection(
+                lambda: PeerProtocol(self.name), self.ip, self.port
+            )
+            self.buffer = self.protocol.buffer
+        else:
+            self.reader, self.writer = await open_connection(self.ip, self.port)
+            self.buffer = ProtocolBuffer()
+
+    @property
+    def transport(self):
+        """
+        Transport of the connection.
+        """
+        if self.protocol is not None:
+            return self.writer
+        return self.writer.transport
+
+    def drain(self):
+        """
+        Returns awaitable waiting until the transport is writable.
+        """
+        if self.protocol is not None:
+            return self.protocol.drain()
+        return self.writer.drain()
+
+    def start_writer(self, outbound):
+        """
+        Starts task writing messages queued in outbound.
+
+        :param outbound: OutboundQueue of the connection
+        """
+        self.outbound = outbound
+        self.writer_task = create_task(outbound.run())
+
+    def is_closing(self):
+        """
+        Checks if the connection is closed or being closed.
+        """
+        return self.writer.is_closing()
+
+    def abort(self):
+        """
+        Closes the connection immediately, buffered data is dropped.
+        """
+        self.transport.abort()
 
     async def close_connection(self):
         """
         Closes TCP connection and ensures it's closed.
-
-        :param peer_name: Peer name
         """
-        self.reader.feed_eof()
-        self.writer.close()
+        if self.outbound is not None:
+            self.outbound.close()
+            self.writer_task.cancel()
+        if self.protocol is not None:
+            self.writer.close()
+            await self.protocol.wait_closed()
+        else:
+            self.reader.feed_eof()
+            self.writer.close()
+            await self.writer.wait_closed()
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} Name=[{self.name}]>"
@@ -0,0 +1,193 @@
+"""
+Outbound peer connections management.
+"""
+
+import random
+import time
+from asyncio import (
+    Event, create_task, ensure_future, wait, wait_for, TimeoutError as AsyncTimeoutError
+)
+
+from . import params
+
+
+class AddressState:
+    """
+    Connection attempts history of a candidate address.
+
+    :param address: (ip, port) tuple
+    """
+    __slots__ = ("address", "failures", "retry_at", "connected_at")
+
+    def __init__(self, address):
+        self.address = address
+        self.failures = 0
+        self.retry_at = 0.0
+        self.connected_at = None
+
+    def __repr__(self):
+        return "<{} Address=[{}:{}] Failures=[{}]>".format(
+            self.__class__.__name__, *self.address, self.failures
+        )
+
+
+class PeerManager:
+    """
+    Keeps target_outbound connections of the node open.
+    Dropped peers are replaced by other candidate addresses.
+    Failing addresses are retried after exponential backoff
+    with jitter and at most max_dialing connection attempts
+    are made at the same time.
+
+    :param node: Node making the connections
+    :param candidates: iterable of (ip, port) tuples
+    :param target_outbound: number of outbound connections to keep
+    :param max_dialing: maximum number of concurrent connection attempts
+    :param connect_timeout: connection attempt timeout (in seconds)
+    :param base_backoff: retry delay after the first failure (in seconds)
+    :param max_backoff: maximum retry delay (in seconds)
+    :param stable_time: connection lasting shorter is counted as failure (in seconds)
+    """
+    def __init__(self, node, candidates=(), target_outbound=params.MAX_OUTBOUND_CONNECTIONS,
+                 max_dialing=params.MAX_CONCURRENT_DIALS, connect_timeout=10.0,
+                 base_backoff=1.0, max_backoff=10*60.0, stable_time=60.0):
+        self.node = node
+        self.target_outbound = target_outbound
+        self.max_dialing = max_dialing
+        self.connect_timeout = connect_timeout
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.stable_time = stable_time
+        self.candidates = {}
+        self.dialing = set()
+        self.connected = {}
+        self.tasks = set()
+        self.changed = Event()
+        self.add_candidates(candidates)
+
+    @classmethod
+    def from_hardcoded_nodes(cls, node, **kwargs):
+        """
+        Creates manager with HARDCODED_NODES candidates.
+
+        :param node: Node making the connections
+        """
+        candidates = [(v["ip"], v["port"]) for v in params.HARDCODED_NODES.values()]
+        return cls(node, candidates, **kwargs)
+
+    def add_candidates(self, addresses):
+        """
+        Adds addresses which can be connected to.
+
+        :param addresses: iterable of (ip, port) tuples
+        """
+        for address in addresses:
+            address = (address[0], int(address[1]))
+            if address not in self.candidates:
+                self.candidates[address] = AddressState(address)
+        self.changed.set()
+
+    def backoff(self, failures):
+        """
+        Returns retry delay after given number of failures,
+        the delay is randomized to spread reconnection attempts.
+
+        :param failures: number of consecutive failures
+        """
+        delay = min(self.max_backoff, self.base_backoff * 2**(failures - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def record_failure(self, state):
+        """
+        Schedules retry of the failed address.
+
+        :param state: AddressState of the address
+        """
+        state.failures += 1
+        state.retry_at = time.monotonic() + self.backoff(state.failures)
+
+    def ready_candidates(self, now):
+        """
+        Returns candidates which can be connected to now,
+        the least failing first.
+
+        :param now: current monotonic time
+        """
+        ready = [
+            state for address, state in self.candidates.items()
+            if state.retry_at <= now
+            and address not in self.dialing and address not in self.connected
+        ]
+        random.shuffle(ready)
+        ready.sort(key=lambda state: state.failures)
+        return ready
+
+    def fill(self):
+        """
+        Starts connection attempts to reach target number of connections.
+        """
+        missing = self.target_outbound - len(self.connected) - len(self.dialing)
+        available = self.max_dialing - len(self.dialing)
+        for state in self.ready_candidates(time.monotonic())[:max(0, min(missing, available))]:
+            self.dialing.add(state.address)
+            task = create_task(self.dial(state))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    def next_retry_delay(self):
+        """
+        Returns time until the earliest waiting candidate can be retried.
+        """
+        now = time.monotonic()
+        delays = [
+            state.retry_at - now for address, state in self.candidates.items()
+            if state.retry_at > now and address not in self.connected
+        ]
+        return max(0.0, min(delays)) if delays else None
+
+    async def dial(self, state):
+        """
+        Connects to the address and handles the connection until
+        it's closed, the address is then scheduled for retry.
+
+        :param state: AddressState of the address
+        """
+        address = state.address
+        try:
+            peer = await wait_for(self.node.open_peer(*address), self.connect_timeout)
+        except (OSError, AsyncTimeoutError):
+            self.record_failure(state)
+            return
+        finally:
+            self.dialing.discard(address)
+            self.changed.set()
+
+        self.connected[address] = peer
+        state.connected_at = time.monotonic()
+        try:
+            await self.node.run_peer(peer)
+        finally:
+            del self.connected[address]
+            if time.monotonic() - state.connected_at < self.stable_time:
+                self.record_failure(state)
+            else:
+                state.failures = 0
+                state.retry_at = time.monotonic() + self.backoff(1)
+            self.changed.set()
+
+    async def run(self):
+        """
+        Maintains outbound connections until canceled.
+        """
+        try:
+            while True:
+                self.changed.clear()
+                self.fill()
+                changed = ensure_future(self.changed.wait())
+                try:
+                    await wait({changed}, timeout=self.next_retry_delay())
+                finally:
+                    changed.cancel()
+        finally:
+            for task in list(self.tasks):
+                task.cancel()
@@ -0,0 +1,113 @@
+"""
+Peer connection protocol built on asyncio BufferedProtocol.
+"""
+
+from asyncio import BufferedProtocol, Event, get_event_loop
+from collections import deque
+
+from .buffer import ProtocolBuffer
+from .exceptions import NodeDisconnectException, InvalidMessageSize
+
+
+class PeerProtocol(BufferedProtocol):
+    """
+    Protocol receiving peer data directly into the free space
+    of ProtocolBuffer, without intermediate bytes objects.
+    Complete frames are queued and read with read_frames().
+
+    :param peer_name: Peer name, taken from the transport when None
+    :param read_size: minimal free space offered for each socket read
+    :param connected_callback: called with the protocol when connection is made
+    :param max_frames: reading pauses when this many frames are not read
+    """
+    def __init__(self, peer_name=None, read_size=64*1024, connected_callback=None,
+                 max_frames=256):
+        self.peer_name = peer_name
+        self.read_size = read_size
+        self.max_frames = max_frames
+        self.reading_paused = False
+        self.connected_callback = connected_callback
+        self.buffer = ProtocolBuffer()
+        self.transport = None
+        self.frames = deque()
+        self.frames_event = Event()
+        self.closed = get_event_loop().create_future()
+        self.error = None
+        self.writable = Event()
+        self.writable.set()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if self.peer_name is None:
+            self.peer_name = "{}:{}".format(*transport.get_extra_info("peername")[:2])
+        if self.connected_callback is not None:
+            self.connected_callback(self)
+
+    def get_buffer(self, sizehint):
+        return self.buffer.get_write_buffer(max(sizehint, self.read_size))
+
+    def buffer_updated(self, nbytes):
+        self.buffer.commit(nbytes)
+        try:
+            self.frames.extend(self.buffer.frames())
+        except InvalidMessageSize as ex:
+            # Peer sends data we won't buffer, it's disconnected.
+            self.error = NodeDisconnectException(f"{ex} (node {self.peer_name}).")
+            self.transport.abort()
+        else:
+            if len(self.frames) >= self.max_frames and not self.reading_paused:
+                self.reading_paused = True
+                self.transport.pause_reading()
+        self.frames_event.set()
+
+    def pause_writing(self):
+        self.writable.clear()
+
+    def resume_writing(self):
+        self.writable.set()
+
+    def eof_received(self):
+        # Closes the transport.
+        return False
+
+    def connection_lost(self, exc):
+        if not self.closed.done():
+            self.closed.set_result(None)
+        self.frames_event.set()
+        self.writable.set()
+
+    async def read_frames(self):
+        """
+        Waits for received frames and returns list of all
+        (header, payload) tuples received so far.
+        """
+        while not self.frames:
+            if self.error is not None:
+                raise self.error
+            if self.closed.done():
+                raise NodeDisconnectException(f"Node {self.peer_name} disconnected.")
+            self.frames_event.clear()
+            await self.frames_event.wait()
+
+        frames = list(self.frames)
+        self.frames.clear()
+        if self.reading_paused:
+            self.reading_paused = False
+            if not self.closed.done():
+                self.transport.resume_reading()
+        return frames
+
+    async def drain(self):
+        """
+        Waits until the transport write buffer is below its low limit
+        when writing was paused.
+        """
+        await self.writable.wait()
+        if self.closed.done():
+            raise ConnectionResetError(f"Connection to {self.peer_name} lost.")
+
+    async def wait_closed(self):
+        """
+        Waits until the connection is lost.
+        """
+        await self.closed
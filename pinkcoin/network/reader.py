@@ -0,0 +1,164 @@
+"""
+Defines reader used to deserialize protocol messages
+directly from received buffers without copying them.
+"""
+
+from .exceptions import InsufficientDataException
+
+
+class BufferReader:
+    """
+    Cursor over a memoryview of binary data. It exposes file-like
+    read method, but returned chunks are memoryview slices sharing
+    the underlying buffer. Call bytes() on them to materialise data.
+
+    :param data: bytes-like object to read from
+    :param offset: position of the first byte to read
+    """
+    __slots__ = ("view", "offset")
+
+    def __init__(self, data, offset=0):
+        self.view = memoryview(data)
+        self.offset = offset
+
+    def read(self, size):
+        """
+        Reads size bytes and moves the cursor after them.
+
+        :param size: number of bytes to read
+        :returns: memoryview slice of the buffer
+        """
+        start = self.offset
+        end = start + size
+        if end > len(self.view):
+            raise InsufficientDataException(
+                f"Can't read {size} bytes at offset {start} of {len(self.view)} bytes buffer."
+            )
+        self.offset = end
+        return self.view[start:end]
+
+    def skip(self, size):
+        """
+        Moves the cursor size bytes forward.
+
+        :param size: number of bytes to skip
+        """
+        end = self.offset + size
+        if end > len(self.view):
+            raise InsufficientDataException(
+                f"Can't skip {size} bytes at offset {self.offset} of {len(self.view)} bytes buffer."
+            )
+        self.offset = end
+
+    def unpack(self, compiled_struct):
+        """
+        Unpacks data at the cursor with precompiled struct
+        and moves the cursor after it.
+
+        :param compiled_struct: struct.Struct instance
+        :returns: tuple of unpacked values
+        """
+        start = self.offset
+        end = start + compiled_struct.size
+        if end > len(self.view):
+            raise InsufficientDataException(
+                f"Can't unpack {compiled_struct.size} bytes at offset {start} "
+                f"of {len(self.view)} bytes buffer."
+            )
+        self.offset = end
+        return compiled_struct.unpack_from(self.view, start)
+
+    def slice(self, start, end):
+        """
+        Returns memoryview of the already read data between the offsets.
+
+        :param start: offset of the first byte
+        :param end: offset after the last byte
+        """
+        return self.view[start:end]
+
+    def remaining(self):
+        """
+        Returns number of bytes left to read.
+        """
+        return len(self.view) - self.offset
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} Offset=[{self.offset}] Size=[{len(self.view)}]>"
+
+
+class StreamReader:
+    """
+    Reader with BufferReader methods reading from file-like stream
+    (socket file, pipe, etc.) which doesn't have to be seekable.
+    Only the needed bytes are read from the stream, read data are
+    kept (for slice()) and returned as bytes.
+
+    :param stream: file-like object with read method
+    """
+    __slots__ = ("stream", "data", "offset")
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.data = bytearray()
+        self.offset = 0
+
+    def fill(self, size):
+        """
+        Reads data from the stream until size bytes are available at the cursor.
+
+        :param size: number of needed bytes
+        """
+        missing = self.offset + size - len(self.data)
+        while missing > 0:
+            chunk = self.stream.read(missing)
+            if not chunk:
+                raise InsufficientDataException(
+                    f"Can't read {size} bytes at offset {self.offset}, the stream ended."
+                )
+            self.data += chunk
+            missing -= len(chunk)
+
+    def read(self, size):
+        """
+        Reads size bytes and moves the cursor after them.
+
+        :param size: number of bytes to read
+        """
+        self.fill(size)
+        start = self.offset
+        self.offset += size
+        return bytes(self.data[start:self.offset])
+
+    def skip(self, size):
+        """
+        Moves the cursor size bytes forward.
+
+        :param size: number of bytes to skip
+        """
+        self.fill(size)
+        self.offset += size
+
+    def unpack(self, compiled_struct):
+        """
+        Unpacks data at the cursor with precompiled struct
+        and moves the cursor after it.
+
+        :param compiled_struct: struct.Struct instance
+        """
+        self.fill(compiled_struct.size)
+        start = self.offset
+        self.offset += compiled_struct.size
+        return compiled_struct.unpack_from(self.data, start)
+
+    def slice(self, start, end):
+        """
+        Returns bytes of the already read data between the offsets.
+
+        :param start: offset of the first byte
+        :param end: offset after the last byte
+        """
+        return bytes(self.data[start:end])
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} Offset=[{self.offset}]>"
@@ -18,6 +18,8 @@ class SecureMessagesInventorySerializer(Serializer):
     The serializer for the Secure Messages Inventory.
     """
     model_class = SecureMessagesInventory
+    # Payload is not deserialized yet, so its size is not checked.
+    exact_size = False
 
 
 class SecureMessagesPing(SerializableMessage):
@@ -26,6 +28,7 @@ class SecureMessagesPing(SerializableMessage):
     answered with a Pong.
     """
     command = "smsgPing"
+    constant_frame = True
 
     def __repr__(self):
         return f"<{self.__class__.__name__}>"
@@ -43,6 +46,7 @@ class SecureMessagesPong(SerializableMessage):
     when a ping command arrives.
     """
     command = "smsgPong"
+    constant_frame = True
 
     def __repr__(self):
         return f"<{self.__class__.__name__}>"
@@ -59,6 +63,7 @@ class SecureMessagesDisabled(SerializableMessage):
     The secure messages: disabled command.
     """
     command = "smsgDisabled"
+    constant_frame = True
 
     def __repr__(self):
         return f"<{self.__class__.__name__}>"
@@ -0,0 +1,449 @@
+"""
+Block index, all known block headers with their chain state.
+"""
+
+from array import array
+
+from .hashes import Hash256
+
+
+HEADER_SIZE = 80
+# Size of the block hash followed by the chain work.
+BLOCK_DATA_SIZE = 64
+
+
+class InvalidHeaders(ValueError):
+    """
+    This exception is thrown when headers don't connect to
+    the chain or aren't linked to each other.
+    """
+
+
+def get_target(bits):
+    """
+    Returns the target encoded in compact format, 0 for negative targets.
+
+    :param bits: target in compact format
+    """
+    size = bits >> 24
+    word = bits & 0x007FFFFF
+    if bits & 0x00800000:
+        return 0
+    if size <= 3:
+        return word >> (8 * (3 - size))
+    return word << (8 * (size - 3))
+
+
+def get_block_proof(bits):
+    """
+    Returns amount of work represented by the block target.
+
+    :param bits: target in compact format
+    """
+    target = get_target(bits)
+    if target == 0:
+        return 0
+    return (1 << 256) // (target + 1)
+
+
+def check_proof_of_work(header_hash, bits, pow_limit):
+    """
+    Checks that the target isn't above the limit and the hash meets it.
+
+    :param header_hash: Hash256 of the header
+    :param bits: target in compact format
+    :param pow_limit: the highest allowed target
+    """
+    target = get_target(bits)
+    return 0 < target <= pow_limit and int.from_bytes(header_hash, "little") <= target
+
+
+def get_skip_height(height):
+    """
+    Returns height the skip pointer of the block at height points to.
+
+    :param height: block height
+    """
+    if height < 2:
+        return 0
+    # Turns the lowest set bits off, the skip heights then
+    # make get_ancestor() take O(log n) steps.
+    if height & 1:
+        height = (height - 1) & (height - 2)
+        return (height & (height - 1)) + 1
+    return height & (height - 1)
+
+
+class BlockIds(dict):
+    """
+    Hash to block id map, blocks of the chain the index was loaded
+    with aren't kept in the dict but looked up in a copy of the store
+    hash table. The table is an open addressing table with height + 1
+    in the slots (0 marks empty slot), stored blocks have id equal
+    to height and the hash found is compared with the index one.
+
+    :param index: BlockIndex the ids belong to
+    :param stored_slots: array of the hash table slots
+    :param stored_size: number of blocks loaded from the store
+    """
+    def __init__(self, index, stored_slots=None, stored_size=0):
+        super().__init__()
+        self.index = index
+        self.stored_slots = stored_slots
+        self.stored_size = stored_size
+
+    def get_stored(self, block_hash):
+        """
+        Returns id of the loaded block or None.
+
+        :param block_hash: hash of the block
+        """
+        slots = self.stored_slots
+        mask = len(slots) - 1
+        slot = int.from_bytes(block_hash[:8], "little") & mask
+        while slots[slot]:
+            block_id = slots[slot] - 1
+            # Slots of heights truncated before the load don't match.
+            if block_id < self.stored_size and self.index.get_hash(block_id) == block_hash:
+                return block_id
+            slot = (slot + 1) & mask
+        return None
+
+    def get(self, block_hash, default=None):
+        block_id = dict.get(self, block_hash)
+        if block_id is None and self.stored_slots is not None:
+            block_id = self.get_stored(block_hash)
+        return default if block_id is None else block_id
+
+    def __contains__(self, block_hash):
+        return self.get(block_hash) is not None
+
+    def __len__(self):
+        return dict.__len__(self) + self.stored_size
+
+
+class BlockIndex:
+    """
+    Index of all known block headers, a block is identified by its id
+    (position in the index). Data of the blocks are kept in arrays,
+    only the hash to id map is a dict. Hash and chain work of
+    the block are kept together in 64 bytes of block_data.
+    The active (most work) chain is kept as an array of ids by height.
+    Candidate tips are the valid blocks without valid children,
+    the best one becomes the tip when the active one is invalidated.
+    The genesis header isn't known, its header data is zeroed.
+
+    Proof of work of the added headers is only checked with pow_limit.
+    Proof of stake blocks aren't mined to their target and they can't
+    be told from proof of work blocks by the header alone, so the check
+    would reject headers of hybrid chains (like Pinkcoin) and is off
+    by default.
+
+    :param genesis_hash: hash of the genesis block (Hash256, int or hex),
+                         None creates empty index
+    :param pow_limit: the highest target of the added headers,
+                      None disables proof of work checks
+    """
+    STATUS_VALID_HEADER = 1
+    STATUS_HAVE_DATA = 2
+    STATUS_FAILED = 4
+    STATUS_FAILED_PARENT = 8
+
+    def __init__(self, genesis_hash, pow_limit=None):
+        self.pow_limit = pow_limit
+        self.ids = BlockIds(self)
+        # Blocks with id lower than linear_size have id equal to height.
+        self.linear_size = 0
+        self.block_data = bytearray()
+        self.header_data = bytearray()
+        self.parents = array("l")
+        self.heights = array("l")
+        self.skips = array("l")
+        self.status = array("B")
+        self.chain = array("l")
+        self.tips = set()
+        if genesis_hash is not None:
+            self.append(Hash256.from_value(genesis_hash), bytes(HEADER_SIZE), -1, 0)
+            self.chain.append(0)
+
+    @classmethod
+    def from_chain_data(cls, header_data, block_data, stored_slots, pow_limit=None):
+        """
+        Creates index of a single chain from its headers and block data
+        (in height order) without processing the blocks one by one.
+        Nothing is computed per block, the hashes are looked up
+        in stored_slots and ancestors are found by height.
+
+        :param header_data: 80 bytes headers of the blocks
+        :param block_data: 64 bytes hash and chain work of the blocks
+        :param stored_slots: array of hash table slots indexing all the blocks
+        :param pow_limit: the highest target of the added headers,
+                          None disables proof of work checks
+        """
+        count = len(block_data) // BLOCK_DATA_SIZE
+        index = cls(None, pow_limit)
+        index.ids = BlockIds(index, stored_slots, count)
+        index.linear_size = count
+        index.header_data = bytearray(header_data)
+        index.block_data = bytearray(block_data)
+        index.chain = array("l", range(count))
+        index.heights = array("l", index.chain)
+        index.parents = array("l", [-1]) + index.chain[:-1]
+        # Skip pointers aren't used by get_ancestor() for linear blocks.
+        index.skips = array("l", [-1]) * count
+        index.status = array("B", [cls.STATUS_VALID_HEADER]) * count
+        index.tips = {count - 1} if count else set()
+        return index
+
+    def __len__(self):
+        return len(self.parents)
+
+    def __contains__(self, block_hash):
+        return block_hash in self.ids
+
+    def append(self, block_hash, header_data, parent, work):
+        """
+        Adds entry of the block and returns its id.
+
+        :param block_hash: Hash256 of the block
+        :param header_data: 80 bytes of the header
+        :param parent: id of the parent block, -1 for genesis
+        :param work: work of the block
+        """
+        block_id = len(self.parents)
+        height = self.heights[parent] + 1 if parent >= 0 else 0
+        chainwork = self.get_chainwork(parent) + work if parent >= 0 else work
+        self.ids[block_hash] = block_id
+        self.block_data += block_hash
+        self.block_data += chainwork.to_bytes(32, "little")
+        self.header_data += header_data
+        self.parents.append(parent)
+        self.heights.append(height)
+        self.skips.append(self.get_ancestor(parent, get_skip_height(height)) if parent >= 0 else -1)
+        status = self.STATUS_VALID_HEADER
+        if parent >= 0 and self.status[parent] & (self.STATUS_FAILED | self.STATUS_FAILED_PARENT):
+            status |= self.STATUS_FAILED_PARENT
+        self.status.append(status)
+        self.tips.discard(parent)
+        if not status & self.STATUS_FAILED_PARENT:
+            self.tips.add(block_id)
+        return block_id
+
+    def get_id(self, block_hash):
+        """
+        Returns id of the block or None when it's unknown.
+
+        :param block_hash: hash of the block
+        """
+        return self.ids.get(block_hash)
+
+    def get_hash(self, block_id):
+        """
+        Returns Hash256 of the block.
+        """
+        offset = block_id*BLOCK_DATA_SIZE
+        return Hash256(self.block_data[offset:offset + 32])
+
+    def get_header_data(self, block_id):
+        """
+        Returns 80 bytes of the block header, zeros for genesis.
+        """
+        return bytes(self.header_data[block_id*HEADER_SIZE:(block_id + 1)*HEADER_SIZE])
+
+    def get_chainwork(self, block_id):
+        """
+        Returns total work of the chain ending with the block.
+        """
+        offset = block_id*BLOCK_DATA_SIZE + 32
+        return int.from_bytes(self.block_data[offset:offset + 32], "little")
+
+    def get_height(self, block_id):
+        """
+        Returns height of the block.
+        """
+        return self.heights[block_id]
+
+    def get_parent(self, block_id):
+        """
+        Returns id of the parent block, -1 for genesis.
+        """
+        return self.parents[block_id]
+
+    @property
+    def tip_id(self):
+        """
+        Id of the active chain tip.
+        """
+        return self.chain[-1]
+
+    @property
+    def tip(self):
+        """
+        Hash of the active chain tip.
+        """
+        return self.get_hash(self.chain[-1])
+
+    @property
+    def height(self):
+        """
+        Height of the active chain tip.
+        """
+        return len(self.chain) - 1
+
+    def in_active_chain(self, block_id):
+        """
+        Checks if the block is in the active chain.
+        """
+        height = self.heights[block_id]
+        return height < len(self.chain) and self.chain[height] == block_id
+
+    def get_ancestor(self, block_id, height):
+        """
+        Returns id of the block ancestor at the height,
+        -1 when the height is above the block.
+
+        :param block_id: block id
+        :param height: ancestor height
+        """
+        walk_height = self.heights[block_id]
+        if height > walk_height or height < 0:
+            return -1
+        if self.in_active_chain(block_id):
+            return self.chain[height]
+
+        walk = block_id
+        while walk_height > height:
+            if walk < self.linear_size:
+                return height
+            skip_height = get_skip_height(walk_height)
+            skip_height_prev = get_skip_height(walk_height - 1)
+            if self.skips[walk] != -1 and (skip_height == height or (
+                    skip_height > height
+                    and not (skip_height_prev < skip_height - 2 and skip_height_prev >= height))):
+                walk = self.skips[walk]
+                walk_height = skip_height
+            else:
+                walk = self.parents[walk]
+                walk_height -= 1
+        return walk
+
+    def find_fork(self, block_id):
+        """
+        Returns id of the last active chain block which is the ancestor of the block.
+
+        :param block_id: block id
+        """
+        if self.heights[block_id] > self.height:
+            block_id = self.get_ancestor(block_id, self.height)
+        while not self.in_active_chain(block_id):
+            block_id = self.parents[block_id]
+        return block_id
+
+    def set_tip(self, block_id):
+        """
+        Makes the block the tip of the active chain.
+
+        :param block_id: block id
+        """
+        fork_id = self.find_fork(block_id)
+        del self.chain[self.heights[fork_id] + 1:]
+        branch = []
+        while block_id != fork_id:
+            branch.append(block_id)
+            block_id = self.parents[block_id]
+        self.chain.extend(reversed(branch))
+
+    def is_valid(self, block_id):
+        """
+        Checks if the block and its ancestors aren't marked invalid.
+        """
+        return not self.status[block_id] & (self.STATUS_FAILED | self.STATUS_FAILED_PARENT)
+
+    def add_header(self, header, header_hash):
+        """
+        Adds the header and returns its id. The header becomes
+        the tip when its chain has more work than the active one.
+        With pow_limit, headers not meeting their target
+        or with target above pow_limit are rejected.
+
+        :param header: BlockHeader
+        :param header_hash: Hash256 of the header
+        """
+        block_id = self.ids.get(header_hash)
+        if block_id is not None:
+            return block_id
+        parent = self.ids.get(header.prev_block)
+        if parent is None:
+            raise InvalidHeaders(f"Header {header_hash} doesn't connect to the index.")
+        if self.pow_limit is not None \
+                and not check_proof_of_work(header_hash, header.bits, self.pow_limit):
+            raise InvalidHeaders(f"Header {header_hash} has invalid proof of work.")
+        block_id = self.append(
+            Hash256.from_value(header_hash), bytes(header.get_header_data()),
+            parent, get_block_proof(header.bits)
+        )
+        chainwork = self.get_chainwork(block_id)
+        if self.is_valid(block_id) and chainwork > self.get_chainwork(self.tip_id):
+            self.set_tip(block_id)
+        return block_id
+
+    def add_headers(self, headers, hashes):
+        """
+        Adds linked headers, returns number of new blocks in the index.
+
+        :param headers: list of BlockHeader
+        :param hashes: Hash256 hashes of the headers
+        """
+        size = len(self)
+        for header, header_hash in zip(headers, hashes):
+            self.add_header(header, header_hash)
+        return len(self) - size
+
+    def mark_invalid(self, block_id):
+        """
+        Marks the block and its descendants invalid and moves
+        the tip to the candidate tip with the most work.
+        Only descendants on the way to the candidate tips
+        are visited, the genesis block can't be invalidated.
+
+        :param block_id: block id
+        """
+        parent = self.parents[block_id]
+        if parent < 0:
+            raise InvalidHeaders("Genesis block can't be marked invalid.")
+        if not self.is_valid(block_id):
+            self.status[block_id] |= self.STATUS_FAILED
+            return
+        self.status[block_id] |= self.STATUS_FAILED
+        height = self.heights[block_id]
+        for tip in list(self.tips):
+            if self.get_ancestor(tip, height) != block_id:
+                continue
+            self.tips.discard(tip)
+            # Branches are marked down to the first marked block.
+            while tip != block_id and self.is_valid(tip):
+                self.status[tip] |= self.STATUS_FAILED_PARENT
+                tip = self.parents[tip]
+        self.tips.add(parent)
+        if self.in_active_chain(block_id):
+            del self.chain[height:]
+            self.set_tip(max(self.tips, key=self.get_chainwork))
+
+    def get_locator(self, max_size=101):
+        """
+        Returns block locator of the active chain, hashes of the last
+        ten blocks followed by hashes in exponentially growing steps
+        back to the genesis block.
+
+        :param max_size: maximum number of hashes
+        """
+        locator = []
+        height = self.height
+        step = 1
+        while height > 0 and len(locator) < max_size - 1:
+            locator.append(self.get_hash(self.chain[height]))
+            if len(locator) >= 10:
+                step *= 2
+            height -= step
+        locator.append(self.get_hash(self.chain[0]))
+        return locator
@@ -0,0 +1,92 @@
+"""
+Hash value types shared by network messages and chain data.
+"""
+
+
+class Hash256(bytes):
+    """
+    256-bit hash (block hash, transaction id, merkle root) stored as
+    32 raw bytes in the internal byte order used on the wire.
+    It hashes and compares like bytes, so it can be used directly
+    as a dict key. Conversions to int and hex are done on request.
+
+    Hex representation uses the reversed (big-endian) byte order,
+    the same as block explorers and the reference client.
+
+    :param data: 32 bytes in the internal byte order
+    """
+    __slots__ = ()
+
+    size = 32
+
+    def __new__(cls, data=b"\x00"*32):
+        if len(data) != cls.size:
+            raise ValueError(f"Hash256 requires {cls.size} bytes, got {len(data)}.")
+        return super().__new__(cls, data)
+
+    @classmethod
+    def from_int(cls, value):
+        """
+        Creates hash from its integer value.
+
+        :param value: hash as little-endian integer
+        """
+        return cls(value.to_bytes(cls.size, byteorder="little"))
+
+    @classmethod
+    def from_hex(cls, text):
+        """
+        Creates hash from its hex representation.
+
+        :param text: hex string in big-endian byte order, "0x" prefix is optional
+        """
+        if text.startswith(("0x", "0X")):
+            text = text[2:]
+        return cls(bytes.fromhex(text.zfill(cls.size*2))[::-1])
+
+    @classmethod
+    def from_value(cls, value):
+        """
+        Converts hash given as Hash256, bytes, int or hex string.
+
+        :param value: hash value
+        """
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, int):
+            return cls.from_int(value)
+        if isinstance(value, str):
+            return cls.from_hex(value)
+        return cls(value)
+
+    def to_int(self):
+        """
+        Returns integer value of the hash.
+        """
+        return int.from_bytes(self, byteorder="little")
+
+    def to_hex(self):
+        """
+        Returns hex representation of the hash.
+        """
+        return self[::-1].hex()
+
+    def is_null(self):
+        """
+        Checks if all bytes of the hash are zeros.
+        """
+        return not any(self)
+
+    def __int__(self):
+        return self.to_int()
+
+    def __format__(self, format_spec):
+        if format_spec:
+            return format(self.to_int(), format_spec)
+        return self.to_hex()
+
+    def __str__(self):
+        return self.to_hex()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}('{self.to_hex()}')"
@@ -0,0 +1,210 @@
+"""
+Scrypt proof-of-work hashing of block headers in batches.
+"""
+
+import hashlib
+import os
+from asyncio import gather, get_event_loop
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from .hashes import Hash256
+
+
+def scrypt_hash(header_data):
+    """
+    Returns scrypt hash of 80 bytes of block header data.
+
+    :param header_data: binary header data
+    """
+    return hashlib.scrypt(
+        password=header_data, salt=header_data, n=1024, r=1, p=1, maxmem=0, dklen=32
+    )
+
+
+def scrypt_hash_batch(headers_data):
+    """
+    Returns scrypt hashes of the headers data, it's run by executors.
+
+    :param headers_data: list of binary headers data
+    """
+    return [scrypt_hash(header_data) for header_data in headers_data]
+
+
+class HeaderHashCache:
+    """
+    Thread safe LRU cache of header hashes keyed by header data.
+
+    :param max_size: maximum number of cached hashes
+    """
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.hashes = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, header_data):
+        """
+        Returns cached hash of the header data or None.
+
+        :param header_data: binary header data
+        """
+        with self.lock:
+            header_hash = self.hashes.get(header_data)
+            if header_hash is not None:
+                self.hashes.move_to_end(header_data)
+            return header_hash
+
+    def put(self, header_data, header_hash):
+        """
+        Caches hash of the header data.
+
+        :param header_data: binary header data
+        :param header_hash: Hash256 of the header
+        """
+        with self.lock:
+            self.hashes[header_data] = header_hash
+            self.hashes.move_to_end(header_data)
+            if len(self.hashes) > self.max_size:
+                self.hashes.popitem(last=False)
+
+    def clear(self):
+        """
+        Drops all cached hashes.
+        """
+        with self.lock:
+            self.hashes.clear()
+
+    def __len__(self):
+        return len(self.hashes)
+
+
+# Hashes of headers calculated by BlockHeader.calculate_hash() and HeaderHasher.
+HEADER_HASH_CACHE = HeaderHashCache()
+
+
+def cached_scrypt_hash(header_data):
+    """
+    Returns Hash256 of the header data, using HEADER_HASH_CACHE.
+
+    :param header_data: binary header data
+    """
+    header_data = bytes(header_data)
+    header_hash = HEADER_HASH_CACHE.get(header_data)
+    if header_hash is None:
+        header_hash = Hash256(scrypt_hash(header_data))
+        HEADER_HASH_CACHE.put(header_data, header_hash)
+    return header_hash
+
+
+class HeaderHasher:
+    """
+    Calculates hashes of many headers in executor workers.
+    hashlib.scrypt releases the GIL, so both thread and
+    process pools use all cores. Headers found in the cache
+    are not hashed again.
+
+    :param executor: thread or process pool, the thread pool
+                     shared by all hashers is used when None
+    :param chunk_size: number of headers hashed by one executor job
+    :param cache: HeaderHashCache, HEADER_HASH_CACHE by default
+    """
+    # Thread pool with a thread per CPU, created by the first hasher using it.
+    shared_executor = None
+    shared_executor_lock = Lock()
+
+    def __init__(self, executor=None, chunk_size=100, cache=None):
+        self.uses_shared_executor = executor is None
+        self.executor = executor or self.get_shared_executor()
+        self.chunk_size = chunk_size
+        self.cache = cache if cache is not None else HEADER_HASH_CACHE
+
+    @classmethod
+    def get_shared_executor(cls):
+        """
+        Returns the thread pool shared by hashers without executor.
+        """
+        with cls.shared_executor_lock:
+            if cls.shared_executor is None:
+                cls.shared_executor = ThreadPoolExecutor(os.cpu_count())
+            return cls.shared_executor
+
+    def split_missing(self, headers_data):
+        """
+        Returns list of cached hashes (None for missing ones)
+        and chunks of (index, data) lists of missing ones.
+
+        :param headers_data: iterable of binary headers data
+        """
+        hashes = []
+        missing = []
+        for index, header_data in enumerate(headers_data):
+            header_data = bytes(header_data)
+            header_hash = self.cache.get(header_data)
+            hashes.append(header_hash)
+            if header_hash is None:
+                missing.append((index, header_data))
+        chunks = [
+            missing[start:start + self.chunk_size]
+            for start in range(0, len(missing), self.chunk_size)
+        ]
+        return hashes, chunks
+
+    def merge(self, hashes, chunks, results):
+        """
+        Puts hashed chunks into hashes list and the cache.
+        """
+        for chunk, chunk_hashes in zip(chunks, results):
+            for (index, header_data), header_hash in zip(chunk, chunk_hashes):
+                header_hash = Hash256(header_hash)
+                self.cache.put(header_data, header_hash)
+                hashes[index] = header_hash
+        return hashes
+
+    def hash_headers(self, headers_data):
+        """
+        Returns Hash256 hashes of the headers, blocks until they are calculated.
+
+        :param headers_data: iterable of 80 bytes binary headers data
+        """
+        hashes, chunks = self.split_missing(headers_data)
+        results = self.executor.map(
+            scrypt_hash_batch, [[data for _, data in chunk] for chunk in chunks]
+        )
+        return self.merge(hashes, chunks, results)
+
+    async def hash_headers_async(self, headers_data):
+        """
+        Returns Hash256 hashes of the headers without blocking the event loop.
+
+        :param headers_data: iterable of 80 bytes binary headers data
+        """
+        hashes, chunks = self.split_missing(headers_data)
+        loop = get_event_loop()
+        results = await gather(*[
+            loop.run_in_executor(
+                self.executor, scrypt_hash_batch, [data for _, data in chunk]
+            ) for chunk in chunks
+        ])
+        return self.merge(hashes, chunks, results)
+
+    async def hash_block_headers(self, headers):
+        """
+        Calculates hashes of BlockHeader objects, hashes of deserialized
+        headers are memoised so calculate_hash() returns them.
+
+        :param headers: list of BlockHeader
+        """
+        hashes = await self.hash_headers_async(header.get_header_data() for header in headers)
+        for header, header_hash in zip(headers, hashes):
+            if header._raw is not None:
+                header._hash = header_hash
+        return hashes
+
+    def shutdown(self):
+        """
+        Shuts the executor passed to the hasher down,
+        the shared executor is kept for other hashers.
+        """
+        if not self.uses_shared_executor:
+            self.executor.shutdown()
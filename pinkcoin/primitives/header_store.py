@@ -0,0 +1,461 @@
+"""
+Persistent store of the best headers chain in memory mapped flat files.
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from .chain import BLOCK_DATA_SIZE, HEADER_SIZE, BlockIndex, get_block_proof
+from .hashes import Hash256
+from .header_hashing import scrypt_hash
+
+
+class HashIndex:
+    """
+    Open addressing hash table mapping block hash to height, kept
+    in a memory mapped file. A slot holds height + 1 (0 marks empty
+    slot), the hash is compared with the hash stored at the height,
+    so slots of truncated heights are left in place and don't match.
+
+    :param path: path of the table file
+    :param get_hash: callable returning stored hash at the height or None
+    :param min_slots: number of slots of a new table (power of 2)
+    """
+    HEADER = struct.Struct("<4s4xQQQ")
+    SLOT = struct.Struct("<I")
+    MAGIC = b"PKHI"
+
+    def __init__(self, path, get_hash, min_slots=1 << 16):
+        self.path = path
+        self.get_hash = get_hash
+        self.min_slots = min_slots
+        self.file = None
+        self.map = None
+        self.slots = 0
+        self.used = 0
+        self.indexed = 0
+
+    def open(self):
+        """
+        Opens the table file, a new table is created
+        when the file is missing or damaged.
+        """
+        try:
+            self.map_file()
+        except (OSError, ValueError, struct.error):
+            self.close()
+            self.create(self.path, self.min_slots)
+            self.map_file()
+
+    def map_file(self):
+        """
+        Maps the table file and reads its header.
+        """
+        self.file = open(self.path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        magic, self.slots, self.used, self.indexed = self.HEADER.unpack_from(self.map)
+        if magic != self.MAGIC or len(self.map) != self.HEADER.size + self.slots*self.SLOT.size:
+            raise ValueError(f"Damaged hash index {self.path}.")
+
+    def create(self, path, slots):
+        """
+        Writes empty table file.
+
+        :param path: path of the table file
+        :param slots: number of slots
+        """
+        with open(path, "wb") as table_file:
+            table_file.write(self.HEADER.pack(self.MAGIC, slots, 0, 0))
+            table_file.truncate(self.HEADER.size + slots*self.SLOT.size)
+
+    def write_header(self):
+        """
+        Writes number of slots and indexed heights into the table file.
+        """
+        self.HEADER.pack_into(self.map, 0, self.MAGIC, self.slots, self.used, self.indexed)
+
+    def find_slot(self, block_hash, height=None):
+        """
+        Returns (slot, height) of the hash, or of the first free
+        slot (or slot of the height) with None height.
+
+        :param block_hash: hash of the block
+        :param height: height the slot can be reused for
+        """
+        mask = self.slots - 1
+        slot = int.from_bytes(block_hash[:8], "little") & mask
+        while True:
+            value = self.SLOT.unpack_from(self.map, self.HEADER.size + slot*self.SLOT.size)[0]
+            if not value or value - 1 == height:
+                return slot, None
+            if self.get_hash(value - 1) == block_hash:
+                return slot, value - 1
+            slot = (slot + 1) & mask
+
+    def get(self, block_hash):
+        """
+        Returns height of the block or None when it isn't stored.
+
+        :param block_hash: hash of the block
+        """
+        return self.find_slot(block_hash)[1]
+
+    def insert(self, block_hash, height):
+        """
+        Maps the hash to the height.
+
+        :param block_hash: hash of the block
+        :param height: height of the block
+        """
+        slot, stored_height = self.find_slot(block_hash, height)
+        if stored_height is not None:
+            return
+        offset = self.HEADER.size + slot*self.SLOT.size
+        if not self.SLOT.unpack_from(self.map, offset)[0]:
+            self.used += 1
+        self.SLOT.pack_into(self.map, offset, height + 1)
+
+    def truncate(self, count):
+        """
+        Marks heights from count up to be indexed again.
+
+        :param count: number of stored blocks
+        """
+        if self.map is not None and self.indexed > count:
+            self.indexed = count
+            self.write_header()
+
+    def update(self, count):
+        """
+        Indexes stored heights from the last indexed one up to count.
+
+        :param count: number of stored blocks
+        """
+        if self.indexed > count:
+            self.indexed = count
+        if (self.used + count - self.indexed) * 2 > self.slots:
+            self.rebuild(count)
+            return
+        for height in range(self.indexed, count):
+            self.insert(self.get_hash(height), height)
+        self.indexed = count
+        self.write_header()
+
+    def rebuild(self, count):
+        """
+        Replaces the table by a larger one without stale slots.
+
+        :param count: number of stored blocks
+        """
+        slots = self.min_slots
+        while count * 4 > slots:
+            slots *= 2
+        # The old table is valid until the new one replaces it.
+        new_path = self.path + ".new"
+        self.create(new_path, slots)
+        self.close()
+        os.replace(new_path, self.path)
+        self.map_file()
+        self.indexed = 0
+        self.update(count)
+
+    def get_slots(self):
+        """
+        Returns copy of the table slots as array.
+        """
+        slots = array("I")
+        with memoryview(self.map) as view:
+            slots.frombytes(view[self.HEADER.size:])
+        if sys.byteorder == "big":
+            slots.byteswap()
+        return slots
+
+    def flush(self):
+        """
+        Writes changes of the table to the disk.
+        """
+        self.map.flush()
+
+    def close(self):
+        """
+        Closes the table file.
+        """
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class HeaderStore:
+    """
+    Append-only store of the active headers chain. Headers are kept
+    as 80 bytes records in headers.dat, hash and chain work of
+    the blocks as 64 bytes records in blocks.dat, record position
+    is the block height. Both files are memory mapped, so loading
+    the chain copies them into BlockIndex without parsing the headers.
+    Hash to height map is kept in headers.idx sidecar.
+
+    Records are appended before the index is updated. save_chain()
+    hands the records to the OS, so they survive a crash of the process,
+    they are written to the disk only by flush() (HeaderSync flushes
+    the store when the sync finishes). After a power loss, records
+    appended since the last flush may be missing, zeroed or torn.
+    On open, torn records at the end of the files, records not linked
+    to the previous ones or with chain work not matching their parents
+    are truncated, then the hash of the tip record is recomputed from
+    its header and records are truncated until it matches. Together
+    with the links, this verifies the hashes of the checked records.
+    The index is then updated. Genesis record has zeroed header data
+    as the genesis header isn't stored, only its hash.
+
+    :param directory: directory with the store files
+    :param genesis_hash: hash of the genesis block (Hash256, int or hex)
+    :param check_depth: number of the last records checked on open
+    """
+    def __init__(self, directory, genesis_hash, check_depth=2000):
+        self.directory = directory
+        self.genesis_hash = Hash256.from_value(genesis_hash)
+        self.check_depth = check_depth
+        self.headers_file = None
+        self.blocks_file = None
+        self.headers_map = None
+        self.blocks_map = None
+        self.count = 0
+        self.index = HashIndex(os.path.join(directory, "headers.idx"), self.get_hash)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def height(self):
+        """
+        Height of the last stored block.
+        """
+        return self.count - 1
+
+    def open(self):
+        """
+        Opens the store, creates it when it doesn't exist.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self.headers_file = self.open_file("headers.dat")
+        self.blocks_file = self.open_file("blocks.dat")
+        self.count = min(
+            os.fstat(self.headers_file.fileno()).st_size // HEADER_SIZE,
+            os.fstat(self.blocks_file.fileno()).st_size // BLOCK_DATA_SIZE,
+        )
+        if not self.count:
+            self.headers_file.truncate(0)
+            self.blocks_file.truncate(0)
+            self.write_records(bytes(HEADER_SIZE), self.genesis_hash + bytes(32))
+            self.count = 1
+        self.truncate(self.count)
+        if self.get_hash(0) != self.genesis_hash:
+            self.close()
+            raise ValueError(f"Header store {self.directory} has different genesis block.")
+        self.truncate(self.check_links())
+        self.truncate(self.check_tip())
+        self.index.open()
+        self.index.update(self.count)
+
+    def open_file(self, name):
+        """
+        Opens the store file for reading and writing.
+
+        :param name: file name
+        """
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        return open(path, "r+b")
+
+    def check_links(self):
+        """
+        Returns number of records linked to their previous ones
+        with chain work of the previous ones increased by their work,
+        only the last check_depth records are checked.
+        """
+        for height in range(max(1, self.count - self.check_depth), self.count):
+            offset = height*HEADER_SIZE
+            if self.headers_map[offset + 4:offset + 36] != self.get_hash(height - 1) \
+                    or not self.check_chainwork(height):
+                print(f"Warning: Header store is truncated to height {height - 1}.")
+                return height
+        return self.count
+
+    def check_chainwork(self, height):
+        """
+        Checks that chain work of the record is chain work
+        of the previous record increased by work of its header.
+
+        :param height: block height above genesis
+        """
+        offset = height*HEADER_SIZE + 72
+        bits = int.from_bytes(self.headers_map[offset:offset + 4], "little")
+        return self.get_chainwork(height) == self.get_chainwork(height - 1) + get_block_proof(bits)
+
+    def check_tip(self):
+        """
+        Returns number of records up to the highest one
+        with hash matching its header.
+        """
+        count = self.count
+        while count > 1:
+            if scrypt_hash(self.get_header_data(count - 1)) == self.get_hash(count - 1):
+                break
+            count -= 1
+        if count < self.count:
+            print(f"Warning: Header store is truncated to height {count - 1}.")
+        return count
+
+    def map_files(self):
+        """
+        Maps the files after their size changed.
+        """
+        self.unmap_files()
+        self.headers_map = mmap.mmap(self.headers_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.blocks_map = mmap.mmap(self.blocks_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def unmap_files(self):
+        """
+        Closes the file maps.
+        """
+        if self.headers_map is not None:
+            self.headers_map.close()
+            self.blocks_map.close()
+            self.headers_map = self.blocks_map = None
+
+    def write_records(self, header_data, block_data):
+        """
+        Appends records to the files.
+
+        :param header_data: 80 bytes records of headers
+        :param block_data: 64 bytes records of hashes and chain work
+        """
+        self.headers_file.seek(0, os.SEEK_END)
+        self.headers_file.write(header_data)
+        self.headers_file.flush()
+        self.blocks_file.seek(0, os.SEEK_END)
+        self.blocks_file.write(block_data)
+        self.blocks_file.flush()
+
+    def truncate(self, count):
+        """
+        Removes records from count height up.
+
+        :param count: number of kept records
+        """
+        self.index.truncate(count)
+        self.unmap_files()
+        self.headers_file.truncate(count*HEADER_SIZE)
+        self.blocks_file.truncate(count*BLOCK_DATA_SIZE)
+        self.count = count
+        self.map_files()
+
+    def get_hash(self, height):
+        """
+        Returns Hash256 of the block at the height, None above the tip.
+
+        :param height: block height
+        """
+        if height >= self.count:
+            return None
+        offset = height*BLOCK_DATA_SIZE
+        return Hash256(self.blocks_map[offset:offset + 32])
+
+    def get_header_data(self, height):
+        """
+        Returns 80 bytes of the block header at the height.
+
+        :param height: block height
+        """
+        return self.headers_map[height*HEADER_SIZE:(height + 1)*HEADER_SIZE]
+
+    def get_chainwork(self, height):
+        """
+        Returns total work of the chain ending with the block at the height.
+
+        :param height: block height
+        """
+        offset = height*BLOCK_DATA_SIZE + 32
+        return int.from_bytes(self.blocks_map[offset:offset + 32], "little")
+
+    def get_height(self, block_hash):
+        """
+        Returns height of the block or None when it isn't stored.
+
+        :param block_hash: hash of the block
+        """
+        return self.index.get(block_hash)
+
+    def save_chain(self, chain):
+        """
+        Makes the store equal to the active chain of the index,
+        returns number of appended records.
+
+        :param chain: BlockIndex
+        """
+        fork = min(self.count, chain.height + 1)
+        while fork and self.get_hash(fork - 1) != chain.get_hash(chain.chain[fork - 1]):
+            fork -= 1
+        if not fork:
+            raise ValueError("Chain has different genesis block than the header store.")
+        if fork < self.count:
+            self.truncate(fork)
+        block_ids = chain.chain[fork:]
+        if not block_ids:
+            return 0
+        self.unmap_files()
+        self.write_records(
+            b"".join(chain.get_header_data(block_id) for block_id in block_ids),
+            b"".join(
+                chain.block_data[block_id*BLOCK_DATA_SIZE:(block_id + 1)*BLOCK_DATA_SIZE]
+                for block_id in block_ids
+            ),
+        )
+        self.count += len(block_ids)
+        self.map_files()
+        self.index.update(self.count)
+        return len(block_ids)
+
+    def load_index(self, pow_limit=None):
+        """
+        Returns BlockIndex of the stored chain. The index
+        doesn't use the store, it copies the files and the hash table.
+
+        :param pow_limit: the highest target of headers added to the index,
+                          None disables proof of work checks
+        """
+        # Views are released so the files can be mapped again.
+        with memoryview(self.headers_map) as headers_view, \
+                memoryview(self.blocks_map) as blocks_view:
+            return BlockIndex.from_chain_data(
+                headers_view[:self.count*HEADER_SIZE],
+                blocks_view[:self.count*BLOCK_DATA_SIZE],
+                self.index.get_slots(),
+                pow_limit,
+            )
+
+    def flush(self):
+        """
+        Writes stored records and the index to the disk.
+        """
+        os.fsync(self.headers_file.fileno())
+        os.fsync(self.blocks_file.fileno())
+        self.index.flush()
+
+    def close(self):
+        """
+        Closes the store files.
+        """
+        self.index.close()
+        self.unmap_files()
+        for store_file in (self.headers_file, self.blocks_file):
+            if store_file is not None:
+                store_file.close()
+        self.headers_file = self.blocks_file = None
@@ -32,11 +32,11 @@ class TestAddrNode(Node):
 
         if peer_name in NODES:
             NODES[peer_name]["version"] = message.version
-            NODES[peer_name]["agent"] = message.user_agent.decode("utf-8")
+            NODES[peer_name]["agent"] = bytes(message.user_agent).decode("utf-8")
         else:
             NODES[peer_name] = {
                 "version": message.version,
-                "agent": message.user_agent.decode("utf-8"),
+                "agent": bytes(message.user_agent).decode("utf-8"),
             }
 
         await super().handle_version(peer_name, message_header, message)
@@ -42,7 +42,7 @@ class TestAddrNode(Node):
         if peer_name not in NODES:
             NODES[peer_name] = {
                 "version": message.version,
-                "agent": message.user_agent.decode("utf-8"),
+                "agent": bytes(message.user_agent).decode("utf-8"),
                 "offset": message.timestamp - my_time,
                 "last_header": None,
                 "performance_time": None,
@@ -82,6 +82,8 @@ class TestAddrNode(Node):
         """
         Handles Headers message.
         """
+        if not message.headers:
+            return
         chunk_len = len(message.headers)
         blocks_num = self.blocks_num_per_peer.get(peer_name, 0)
         if not blocks_num:
@@ -105,7 +107,7 @@ class TestAddrNode(Node):
             print("="*31)
             await self.close_connection(peer_name)
         else:
-            get_headers = GetHeaders([int(last_hash, 16)])
+            get_headers = GetHeaders([last_hash])
             self.send_message(peer_name, get_headers)
 
 
@@ -4,10 +4,10 @@ After receiving it payload is deserialized and printed.
 """
 
 from asyncio import get_event_loop, ensure_future, gather
-from io import BytesIO
 
 from pinkcoin.network.node import Node
 from pinkcoin.network.core.serializers import AlertPayloadSerializer
+from pinkcoin.network.reader import BufferReader
 
 
 class TestAlertNode(Node):
@@ -38,7 +38,7 @@ class TestAlertNode(Node):
 
         # TODO: Check signature before alert payload deserialization.
         deserializer = AlertPayloadSerializer()
-        alert = deserializer.deserialize(BytesIO(message.payload))
+        alert = deserializer.deserialize(BufferReader(message.payload))
 
         print("version:", alert.version)
         print("relay_until:", alert.relay_until)
@@ -0,0 +1,82 @@
+"""
+Tests checking buffer extracting protocol messages.
+"""
+
+import struct
+
+import pytest
+
+from pinkcoin.network.buffer import ProtocolBuffer
+from pinkcoin.network.core import serializers
+from pinkcoin.network.exceptions import InvalidMessageSize
+
+
+def _header(command, length):
+    return struct.pack("<I12sII", 0xFBF9F4F2, command.encode(), length, 0)
+
+
+def test_receive_messages():
+    """
+    Checks receiving messages split between writes.
+    """
+    ping = serializers.Ping()
+    data = serializers.Version().get_message() + ping.get_message()
+    buffer = ProtocolBuffer()
+    buffer.write(data[:50])
+    assert buffer.receive_message()[1] is None
+    buffer.write(data[50:])
+    header, message = buffer.receive_message()
+    assert header.command == "version"
+    assert bytes(message.user_agent) == b"/pink-scanner:0.0.1/"
+    header, message = buffer.receive_message()
+    assert message.nonce == ping.nonce
+
+
+@pytest.mark.parametrize("command,length", [
+    ("block", 64*1024*1024),
+    ("ping", 9),
+    ("verack", 1),
+    ("unknown", 0xFFFFFFFF),
+])
+def test_payload_size_limits(command, length):
+    """
+    Checks rejecting messages with invalid size before reading payload.
+    """
+    buffer = ProtocolBuffer()
+    buffer.write(_header(command, length))
+    with pytest.raises(InvalidMessageSize):
+        buffer.receive_message()
+
+
+def test_frames_drain_buffer():
+    """
+    Checks extracting all complete frames after one write.
+    """
+    pings = [serializers.Ping() for _ in range(50)]
+    data = b"".join(ping.get_message() for ping in pings)
+    buffer = ProtocolBuffer(size=256)
+    buffer.write(data + data[:10])
+
+    nonces = [message.nonce for _, message in buffer.messages()]
+    assert nonces == [ping.nonce for ping in pings]
+    assert len(buffer) == 10, "Incomplete frame was not kept"
+
+    buffer.write(data[10:32])
+    header, payload = next(buffer.frames())
+    assert header.command == "ping" and len(payload) == 8
+    assert len(buffer) == 0 and buffer.start == 0
+
+
+def test_buffer_compaction():
+    """
+    Checks that unread data is moved instead of growing the buffer.
+    """
+    frame = serializers.Ping().get_message()
+    buffer = ProtocolBuffer(size=100)
+    for _ in range(20):
+        buffer.write(frame)
+        buffer.write(frame[:16])
+        assert len(list(buffer.frames())) == 1
+        buffer.write(frame[16:])
+        assert len(list(buffer.frames())) == 1
+    assert len(buffer.data) == 100, "Buffer grew instead of compacting"
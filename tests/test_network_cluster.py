@@ -0,0 +1,83 @@
+"""
+Tests checking coordination of node worker processes.
+"""
+
+import asyncio
+from multiprocessing import Pipe
+
+from pinkcoin.network.cluster import ClusterHub, ClusterChannel, PipeSender
+
+
+class FakeNode:
+    """
+    Node recording frames and cluster notifications.
+    """
+    def __init__(self):
+        self.frames = []
+        self.tips = []
+
+    def broadcast_frame(self, frame):
+        # pylint: disable=missing-docstring
+        self.frames.append(frame)
+
+    def handle_cluster_tip(self, height, tip_hash):
+        # pylint: disable=missing-docstring
+        self.tips.append((height, tip_hash))
+
+
+def test_cluster_forwarding():
+    """
+    Checks inventory dedupe, tip updates and broadcasts between workers.
+    """
+    async def run():
+        pipes = [Pipe() for _ in range(3)]
+        hub = ClusterHub([hub_end for hub_end, _ in pipes])
+        nodes = [FakeNode() for _ in pipes]
+        channels = [
+            ClusterChannel(worker_end, node, index, len(pipes))
+            for index, ((_, worker_end), node) in enumerate(zip(pipes, nodes))
+        ]
+
+        def forward():
+            for channel in channels:
+                channel.sender.join()
+            for hub_end in list(hub.connections):
+                while hub_end.poll():
+                    hub.process(hub_end, hub_end.recv())
+            for sender in hub.senders.values():
+                sender.join()
+            for channel in channels:
+                channel.receive()
+
+        assert channels[0].is_new_inventory(1, b"\x01"*32)
+        assert not channels[0].is_new_inventory(1, b"\x01"*32)
+        assert channels[1].is_new_inventory(2, b"\x01"*32)
+        forward()
+        assert not channels[2].is_new_inventory(1, b"\x01"*32)
+
+        channels[1].update_tip(10, b"\x0a"*32)
+        channels[2].update_tip(9, b"\x09"*32)
+        forward()
+        assert nodes[0].tips == [(10, b"\x0a"*32)]
+        assert nodes[2].tips == [(10, b"\x0a"*32)]
+        assert channels[2].tip == (10, b"\x0a"*32)
+
+        channels[0].broadcast(b"frame")
+        forward()
+        assert [node.frames for node in nodes] == [[], [b"frame"], [b"frame"]]
+
+    asyncio.run(run())
+
+
+def test_pipe_sender_overflow():
+    """
+    Checks that sending to a pipe nobody reads doesn't block.
+    """
+    reader, writer = Pipe()
+    sender = PipeSender(writer, max_queued=2)
+    results = [sender.send(("broadcast", bytes(1024*1024))) for _ in range(10)]
+    assert not all(results) and sender.dropped
+    sender.close()
+    reader.close()
+    sender.thread.join(5)
+    assert not sender.thread.is_alive()
@@ -3,6 +3,7 @@ Tests checking fields primitieves used by network messaging code.
 """
 
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 
 from pinkcoin.network import data_fields
 
@@ -16,4 +17,28 @@ def test_int16LE():
     serialized_data = field.serialize()
     buffer = BytesIO()
     buffer.write(serialized_data)
+    buffer.seek(0)
     assert field.deserialize(buffer) == 2, "Wrong number"
+
+
+def test_var_int_encode():
+    """
+    Checks variable integer field encoding.
+    """
+    field = data_fields.VariableIntegerField()
+    for value, size in ((0xFC, 1), (0xFD, 3), (0x10000, 5), (0x100000000, 9)):
+        bin_data = field.encode(value)
+        assert len(bin_data) == size, "Wrong encoded size"
+        assert field.deserialize(BytesIO(bin_data)) == value, "Wrong number"
+
+
+def test_concurrent_encode():
+    """
+    Checks that shared fields encode values from many threads.
+    """
+    field = data_fields.VariableStringField()
+    values = [b"x" * size for size in range(300)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(field.encode, values * 10))
+    for value, bin_data in zip(values * 10, results):
+        assert bin_data.endswith(value) and len(bin_data) - len(value) in (1, 3)
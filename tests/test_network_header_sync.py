@@ -0,0 +1,230 @@
+"""
+Tests checking headers chain and its synchronization.
+"""
+
+import asyncio
+
+import pytest
+
+from pinkcoin.network import params
+from pinkcoin.network.core import serializers
+from pinkcoin.network.header_sync import HeaderSync
+from pinkcoin.network.keepalive import PeerLatency
+from pinkcoin.primitives.chain import (
+    BlockIndex, InvalidHeaders, check_proof_of_work, get_block_proof
+)
+from pinkcoin.primitives.hashes import Hash256
+from pinkcoin.primitives.header_hashing import HeaderHasher, HeaderHashCache
+
+
+GENESIS = Hash256.from_hex(params.GENESIS_BLOCK_HASHES["main"])
+# About every other hash meets the target of the test headers.
+EASY_BITS = 0x207fffff
+EASY_LIMIT = (1 << 256) - 1
+MAIN_LIMIT = params.POW_LIMITS["main"]
+
+
+def _build_headers(prev_hash, count, nonce=0):
+    headers = []
+    for _ in range(count):
+        header = serializers.BlockHeader()
+        header.prev_block = prev_hash
+        header.bits = EASY_BITS
+        header.nonce = nonce
+        while not check_proof_of_work(header.calculate_hash(), header.bits, EASY_LIMIT):
+            header.nonce += 1
+        nonce = header.nonce + 1
+        prev_hash = header.calculate_hash()
+        headers.append(header)
+    return headers
+
+
+def test_locator():
+    """
+    Checks exponential steps of block locator.
+    """
+    chain = BlockIndex(GENESIS, EASY_LIMIT)
+    headers = _build_headers(GENESIS, 1000)
+    chain.add_headers(headers, [header.calculate_hash() for header in headers])
+    heights = [chain.get_height(chain.get_id(block_hash)) for block_hash in chain.get_locator()]
+    assert heights[:10] == list(range(1000, 990, -1))
+    assert heights[10:13] == [989, 985, 977]
+    assert heights[-1] == 0
+    assert len(chain.get_locator(max_size=5)) == 5
+
+
+def test_add_headers():
+    """
+    Checks connecting headers and switching to a longer fork.
+    """
+    chain = BlockIndex(GENESIS, EASY_LIMIT)
+    headers = _build_headers(GENESIS, 3)
+    hashes = [header.calculate_hash() for header in headers]
+    assert chain.add_headers(headers, hashes) == 3
+    assert chain.add_headers(headers[:2], hashes[:2]) == 0
+
+    fork = _build_headers(hashes[0], 3, nonce=100)
+    fork_hashes = [header.calculate_hash() for header in fork]
+    assert chain.add_headers(fork[:1], fork_hashes[:1]) == 1
+    assert chain.tip == hashes[-1], "Switched to chain with less work"
+    assert chain.add_headers(fork, fork_hashes) == 2
+    assert chain.height == 4 and chain.tip == fork_hashes[-1]
+    assert not chain.in_active_chain(chain.get_id(hashes[2]))
+    assert chain.get_ancestor(chain.get_id(hashes[2]), 1) == chain.get_id(hashes[0])
+
+    assert chain.tips == {chain.get_id(hashes[2]), chain.get_id(fork_hashes[2])}
+    chain.mark_invalid(chain.get_id(fork_hashes[1]))
+    assert chain.tip == hashes[2], "Tip didn't move to valid chain"
+    assert not chain.is_valid(chain.get_id(fork_hashes[2]))
+    assert chain.tips == {chain.get_id(hashes[2]), chain.get_id(fork_hashes[0])}
+    extension = _build_headers(fork_hashes[2], 1, nonce=200)
+    chain.add_headers(extension, [extension[0].calculate_hash()])
+    assert chain.tip == hashes[2] and len(chain.tips) == 2
+
+    chain.mark_invalid(chain.get_id(hashes[0]))
+    assert chain.height == 0 and chain.tips == {0}
+    with pytest.raises(InvalidHeaders):
+        chain.mark_invalid(0)
+    assert chain.tip == GENESIS
+
+    with pytest.raises(InvalidHeaders):
+        chain.add_headers(_build_headers(Hash256.from_int(1), 1), [Hash256.from_int(2)])
+
+
+def test_block_index():
+    """
+    Checks chainwork, skip pointers and ancestors of a long fork.
+    """
+    assert get_block_proof(0x1d00ffff) == 0x100010001
+    assert get_block_proof(0x1e0fffff) == 0x100001
+    assert get_block_proof(0) == 0
+
+    index = BlockIndex(GENESIS, MAIN_LIMIT)
+    prev_hash = GENESIS
+    for height in range(1, 3001):
+        header = serializers.BlockHeader()
+        header.prev_block = prev_hash
+        header.bits = 0x1e0fffff
+        prev_hash = Hash256.from_int(height)
+        index.add_header(header, prev_hash)
+    assert index.height == 3000 and index.tip_id == 3000
+    assert index.get_chainwork(index.tip_id) == 3000 * 0x100001
+
+    # Fork from genesis with more work per block.
+    prev_hash = GENESIS
+    for height in range(1, 2001):
+        header = serializers.BlockHeader()
+        header.prev_block = prev_hash
+        header.bits = 0x1d00ffff
+        prev_hash = Hash256.from_int(10000 + height)
+        block_id = index.add_header(header, prev_hash)
+    assert index.tip_id == block_id and index.height == 2000
+    assert index.get_ancestor(2999, 1234) == 1234, "Wrong ancestor of inactive branch"
+    assert index.get_ancestor(block_id, 1) == 3001
+    assert index.find_fork(2999) == 0
+
+    # Claimed work is checked against the hash and the limit.
+    tip_id = index.tip_id
+    invalid = [(0x1b00ffff, Hash256(b"\xff"*32)), (0x207fffff, Hash256.from_int(20000))]
+    for bits, header_hash in invalid:
+        header = serializers.BlockHeader()
+        header.prev_block = index.tip
+        header.bits = bits
+        with pytest.raises(InvalidHeaders):
+            index.add_header(header, header_hash)
+    assert index.tip_id == tip_id and len(index) == tip_id + 1
+
+    # Proof of stake headers don't meet their target, the check is opt-in.
+    index = BlockIndex(GENESIS)
+    header = serializers.BlockHeader()
+    header.prev_block = GENESIS
+    header.bits = 0x1b00ffff
+    stake_hash = Hash256(b"\xff"*32)
+    assert not check_proof_of_work(stake_hash, header.bits, MAIN_LIMIT)
+    assert index.add_header(header, stake_hash) == 1
+    assert index.tip == stake_hash
+
+
+class FakePeer:
+    """
+    Connected peer with known latency.
+    """
+    # pylint: disable=too-few-public-methods
+    def __init__(self, name, rtt):
+        self.name = name
+        self.verack_received = True
+        self.latency = PeerLatency(0)
+        self.latency.ewma_rtt = rtt
+
+
+class FakeNode:
+    """
+    Node recording sent messages.
+    """
+    network_type = "main"
+    cluster = None
+
+    def __init__(self):
+        self.peers = {"slow": FakePeer("slow", 0.5), "fast": FakePeer("fast", 0.1)}
+        self.sent = []
+        self.handlers = {}
+
+    def send_message(self, peer_name, message):
+        # pylint: disable=missing-docstring
+        self.sent.append((peer_name, message))
+
+    def register_handler(self, command, handler):
+        # pylint: disable=missing-docstring
+        self.handlers[command] = handler
+
+    def unregister_handler(self, command, handler):
+        # pylint: disable=missing-docstring,unused-argument
+        del self.handlers[command]
+
+
+def test_header_sync(monkeypatch):
+    """
+    Checks failover from stalled peer and pipelined requests.
+    """
+    monkeypatch.setattr(params, "MAX_HEADERS_RESULTS", 2)
+    headers = _build_headers(GENESIS, 3)
+
+    async def run():
+        node = FakeNode()
+        sync = HeaderSync(node, chain=BlockIndex(GENESIS, EASY_LIMIT),
+                          hasher=HeaderHasher(cache=HeaderHashCache()), stall_timeout=0.1)
+        task = asyncio.ensure_future(sync.run(poll_interval=0.01))
+        await asyncio.sleep(0.01)
+        assert [(name, msg.block_hashes) for name, msg in node.sent] == [("fast", [GENESIS])]
+
+        await asyncio.sleep(0.15)
+        assert node.sent[-1][0] == "slow", "Stalled peer was not replaced"
+
+        message = serializers.HeaderVector()
+        message.headers = headers[:2]
+        await node.handlers["headers"]("slow", None, message)
+        assert node.sent[-1][1].block_hashes[0] == headers[1].calculate_hash()
+        assert sync.chain.height == 2
+
+        message.headers = headers[2:]
+        await node.handlers["headers"]("slow", None, message)
+        chain = await task
+        assert chain.height == 3 and chain.tip == headers[2].calculate_hash()
+        assert "headers" not in node.handlers
+
+    asyncio.run(run())
+
+
+def test_unknown_network():
+    """
+    Checks that sync without a chain fails clearly on unknown network.
+    """
+    node = FakeNode()
+    node.network_type = "test"
+    with pytest.raises(ValueError, match="test network"):
+        HeaderSync(node)
+    assert HeaderSync(node, chain=BlockIndex(GENESIS, EASY_LIMIT)).chain.height == 0
+
+    node.network_type = "main"
+    assert HeaderSync(node).chain.pow_limit is None
+    assert HeaderSync(node, check_pow=True).chain.pow_limit == MAIN_LIMIT
@@ -0,0 +1,63 @@
+"""
+Tests checking bulk decoding of headers messages.
+"""
+
+import pytest
+
+from pinkcoin.network.core import serializers
+from pinkcoin.primitives.hashes import Hash256
+
+np = pytest.importorskip("numpy")
+headers_array = pytest.importorskip("pinkcoin.network.core.headers_array")
+
+
+def _make_headers(count, txns_count=0):
+    headers = []
+    prev_hash = Hash256()
+    for index in range(count):
+        header = serializers.BlockHeader()
+        header.prev_block = prev_hash
+        header.timestamp = 1400000000 + index * 60
+        header.bits = 0x1e0fffff
+        header.nonce = index
+        header.txns_count = txns_count
+        prev_hash = header.calculate_hash()
+        headers.append(header)
+    return headers
+
+
+@pytest.mark.parametrize("txns_count", [0, 0x1234])
+def test_decode_headers(txns_count):
+    """
+    Checks decoding headers into arrays with short and long varints.
+    """
+    message = serializers.HeaderVector()
+    message.headers = _make_headers(5, txns_count)
+    payload = serializers.HeaderVectorSerializer().serialize(message)
+
+    result = headers_array.decode_headers(payload)
+    assert len(result) == 5
+    assert list(result["nonce"]) == [0, 1, 2, 3, 4]
+    assert list(result["timestamp"][1:] - result["timestamp"][:-1]) == [60] * 4
+    assert list(result.txns_count) == [txns_count] * 5
+    assert result.header_data(2) == bytes(message.headers[2].get_header_data())
+
+    hashes = [header.calculate_hash() for header in message.headers]
+    assert result.find_broken_link(hashes, Hash256()) == -1
+    hashes[2] = Hash256()
+    assert result.find_broken_link(hashes) == 3
+
+    decoded = result.to_headers()
+    assert decoded[4].calculate_hash() == message.headers[4].calculate_hash()
+    assert decoded[4].txns_count == txns_count
+
+
+def test_empty_headers():
+    """
+    Checks decoding and link checking of headers message without headers.
+    """
+    payload = serializers.HeaderVectorSerializer().serialize(serializers.HeaderVector())
+    result = headers_array.decode_headers(payload)
+    assert len(result) == 0
+    assert result.find_broken_link([], Hash256()) == -1
+    assert result.to_headers() == []
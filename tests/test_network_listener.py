@@ -0,0 +1,95 @@
+"""
+Tests checking inbound connections listener.
+"""
+
+import asyncio
+
+import pytest
+
+from pinkcoin.network.buffer import ProtocolBuffer
+from pinkcoin.network.core import serializers
+from pinkcoin.network.listener import AcceptRateLimiter
+from pinkcoin.network.node import Node
+
+
+async def _read_commands(reader, count):
+    buffer = ProtocolBuffer()
+    commands = []
+    while len(commands) < count:
+        data = await asyncio.wait_for(reader.read(4096), 5)
+        if not data:
+            break
+        buffer.write(data)
+        commands.extend(header.command for header, _ in buffer.frames())
+    return commands
+
+
+@pytest.mark.parametrize("buffered_protocol", [False, True])
+def test_inbound_peer(buffered_protocol):
+    """
+    Checks handshake and messages handling of accepted peers.
+    """
+    async def run():
+        node = Node("127.0.0.1", 0, buffered_protocol=buffered_protocol)
+        listener = await node.listen()
+        listener.max_inbound = 1
+        port = listener.server.sockets[0].getsockname()[1]
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        assert await _read_commands(reader, 1) == ["version"]
+        writer.write(serializers.Ping().get_message())
+        assert await _read_commands(reader, 1) == ["pong"]
+        assert len(node.peers) == 1
+        assert next(iter(node.peers.values())).inbound
+
+        # Over the inbound limit.
+        reader2, writer2 = await asyncio.open_connection("127.0.0.1", port)
+        assert await _read_commands(reader2, 1) == []
+        writer2.close()
+
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        for _ in range(50):
+            if not node.peers:
+                break
+            await asyncio.sleep(0.01)
+        assert not node.peers
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("buffered_protocol", [False, True])
+def test_close_disconnects_peers(buffered_protocol):
+    """
+    Checks that closing the listener cancels serving of accepted peers.
+    """
+    async def run():
+        node = Node("127.0.0.1", 0, buffered_protocol=buffered_protocol)
+        listener = await node.listen()
+        port = listener.server.sockets[0].getsockname()[1]
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        assert await _read_commands(reader, 1) == ["version"]
+        assert len(listener.tasks) == 1
+
+        listener.close()
+        await listener.wait_closed()
+        assert await asyncio.wait_for(reader.read(), 5) == b""
+        for _ in range(50):
+            if not node.peers and not listener.tasks:
+                break
+            await asyncio.sleep(0.01)
+        assert not node.peers
+        assert not listener.tasks
+        writer.close()
+
+    asyncio.run(run())
+
+
+def test_accept_rate_limiter():
+    """
+    Checks limiting burst of accepted connections.
+    """
+    limiter = AcceptRateLimiter(rate=0.001, burst=3)
+    assert [limiter.allow() for _ in range(4)] == [True, True, True, False]
@@ -0,0 +1,285 @@
+"""
+Tests checking node message dispatching.
+"""
+
+import asyncio
+import gc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from pinkcoin.network import params
+from pinkcoin.network.base_serializer import MessageHeader, MessageHeaderSerializer
+from pinkcoin.network.buffer import ProtocolBuffer
+from pinkcoin.network.core import serializers
+from pinkcoin.network.keepalive import TimerWheel
+from pinkcoin.network.node import Node, handles
+
+
+class RecordingNode(Node):
+    """
+    Node recording called handlers.
+    """
+    def __init__(self):
+        super().__init__("127.0.0.1", 9134)
+        self.calls = []
+
+    def send_message(self, peer_name, message):
+        self.calls.append(("send", message.command))
+
+    async def handle_ping(self, peer_name, message_header, message):
+        self.calls.append(("handle_ping", message.nonce))
+
+    @handles("ping", "pong")
+    async def record(self, peer_name, message_header, message):
+        # pylint: disable=missing-docstring,unused-argument
+        self.calls.append(("record", message_header.command))
+
+
+def _frames(*messages):
+    buffer = ProtocolBuffer()
+    for message in messages:
+        buffer.write(message.get_message())
+    return list(buffer.frames())
+
+
+def test_dispatch_table():
+    """
+    Checks calling all handlers of the command in order.
+    """
+    assert RecordingNode.get_handler_names()["ping"] == ["handle_ping", "record"]
+    assert "ping" in Node.get_handler_names()
+    assert "pong" not in Node.get_handler_names()
+
+    async def run():
+        node = RecordingNode()
+        ping, pong = serializers.Ping(), serializers.Pong()
+        extra = []
+
+        async def handler(peer_name, message_header, message):
+            # pylint: disable=unused-argument
+            extra.append(message.nonce)
+
+        node.register_handler("pong", handler)
+        for header, payload in _frames(ping, pong):
+            await node.handle_frame("peer", header, payload)
+        assert node.calls == [
+            ("handle_ping", ping.nonce), ("record", "ping"), ("record", "pong")
+        ]
+        assert extra == [pong.nonce]
+
+    asyncio.run(run())
+
+
+def test_unhandled_not_decoded(capsys):
+    """
+    Checks that messages without handlers are not deserialized.
+    """
+    async def run():
+        node = RecordingNode()
+        (header, payload), = _frames(serializers.GetAddr())
+        header.checksum ^= 1
+        await node.handle_frame("peer", header, payload)
+        (header, payload), = _frames(serializers.Ping())
+        header.checksum ^= 1
+        await node.handle_frame("peer", header, payload)
+
+    asyncio.run(run())
+    assert capsys.readouterr().out.count("Bad checksum") == 1
+
+
+def test_keepalive():
+    """
+    Checks pinging peers, RTT tracking and inactive peers disconnection.
+    """
+    class FakePeer:
+        # pylint: disable=missing-docstring,too-few-public-methods
+        name = "peer"
+        latency = None
+
+    async def run():
+        node = RecordingNode()
+        disconnected = []
+        node.disconnect = disconnected.append
+        sent = []
+        node.send_message = lambda peer_name, message: sent.append(message)
+        keepalive = node.start_keepalive(ping_interval=3, timeout=7, tick=1)
+        keepalive_task = node.keepalive_task
+        peer = FakePeer()
+        keepalive.add_peer(peer)
+
+        for _ in range(3):
+            keepalive.advance()
+        assert len(sent) == 1 and peer.latency.ping_nonce == sent[0].nonce
+
+        pong = serializers.Pong()
+        pong.nonce = sent[0].nonce
+        (header, payload), = _frames(pong)
+        await node.handle_frame("peer", header, payload)
+        assert peer.latency.ping_nonce is None
+        assert peer.latency.last_rtt == peer.latency.min_rtt == peer.latency.ewma_rtt >= 0
+
+        peer.latency.last_received -= 8
+        for _ in range(3):
+            keepalive.advance()
+        assert disconnected == ["peer"]
+        assert len(keepalive.wheel) == 0
+        node.stop_keepalive()
+        await asyncio.gather(keepalive_task, return_exceptions=True)
+
+    asyncio.run(run())
+
+
+def test_timer_wheel():
+    """
+    Checks expiration of keys scheduled beyond one wheel turn.
+    """
+    wheel = TimerWheel(tick=1, slots=4)
+    wheel.schedule("a", 2)
+    wheel.schedule("b", 6)
+    wheel.schedule("c", 1)
+    wheel.cancel("c")
+    expired = [wheel.advance() for _ in range(7)]
+    assert expired == [[], ["a"], [], [], [], ["b"], []]
+
+
+def test_message_processing():
+    """
+    Checks reading while handlers are busy and concurrent handlers.
+    """
+    class SlowNode(Node):
+        # pylint: disable=missing-docstring
+        parallel_commands = frozenset(["ping"])
+        handler_queue_size = 2
+
+        def __init__(self):
+            super().__init__("127.0.0.1", 0)
+            self.release = asyncio.Event()
+            self.handled = []
+
+        async def handle_ping(self, peer_name, message_header, message):
+            await self.release.wait()
+            self.handled.append("ping")
+
+        async def handle_pong(self, peer_name, message_header, message):
+            await self.release.wait()
+            self.handled.append("pong")
+
+    async def run():
+        node = SlowNode()
+        listener = await node.listen()
+        port = listener.server.sockets[0].getsockname()[1]
+        _, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"".join(
+            message.get_message() for message in
+            [serializers.Ping(), serializers.Pong(), serializers.Ping(), serializers.Pong()]
+        ))
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            peer = next(iter(node.peers.values()), None)
+            if peer is not None and peer.messages.full():
+                break
+        # First ping is handled in its own task, first pong blocks
+        # the processor and the rest waits in the full queue.
+        assert len(peer.handler_tasks) == 1, "Ping is not handled concurrently"
+        assert peer.messages.qsize() == 2
+        node.release.set()
+        writer.close()
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            if not node.peers:
+                break
+        assert sorted(node.handled) == ["ping", "ping", "pong", "pong"]
+        listener.close()
+
+    asyncio.run(run())
+
+
+def test_malformed_payload():
+    """
+    Checks that peer sending undecodable message is disconnected.
+    """
+    class SmallQueueNode(Node):
+        # pylint: disable=missing-docstring
+        handler_queue_size = 1
+
+    message_header = MessageHeader()
+    message_header.command = "version"
+    message_header.length = 2
+    message_header.checksum = MessageHeaderSerializer.calc_checksum(b"\x01\x02")
+    truncated = MessageHeaderSerializer().serialize(message_header) + b"\x01\x02"
+
+    async def run():
+        errors = []
+        asyncio.get_event_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        node = SmallQueueNode("127.0.0.1", 0)
+        listener = await node.listen()
+        port = listener.server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(truncated + serializers.Ping().get_message()*20)
+        await asyncio.wait_for(reader.read(), 2)
+        for _ in range(50):
+            await asyncio.sleep(0.01)
+            if not node.peers:
+                break
+        assert not node.peers, "Peer was not disconnected"
+        writer.close()
+        listener.close()
+        await asyncio.sleep(0.01)
+        gc.collect()
+        assert not errors, "Connection task failed"
+
+    asyncio.run(run())
+
+
+def test_offloaded_decoding(capsys):
+    """
+    Checks decoding full headers messages in thread and process pools.
+    """
+    headers = serializers.HeaderVector()
+    for nonce in range(params.MAX_HEADERS_RESULTS):
+        header = serializers.BlockHeader()
+        header.nonce = nonce
+        headers.headers.append(header)
+    (header, payload), = _frames(headers)
+    assert len(payload) >= Node.offload_threshold
+
+    class CountingThreadPool(ThreadPoolExecutor):
+        # pylint: disable=missing-docstring
+        submitted = 0
+
+        def submit(self, *args, **kwargs):
+            self.submitted += 1
+            return super().submit(*args, **kwargs)
+
+    class CountingProcessPool(ProcessPoolExecutor):
+        # pylint: disable=missing-docstring
+        submitted = 0
+
+        def submit(self, *args, **kwargs):
+            self.submitted += 1
+            return super().submit(*args, **kwargs)
+
+    async def run(executor):
+        node = RecordingNode()
+        node.offload_executor = executor
+        received = []
+
+        async def handler(peer_name, message_header, message):
+            # pylint: disable=unused-argument
+            received.append(message)
+
+        node.register_handler("headers", handler)
+        await node.handle_frame("peer", header, payload)
+        assert [item.nonce for item in received[0]] == list(range(params.MAX_HEADERS_RESULTS))
+
+        bad_header = MessageHeader()
+        bad_header.command = header.command
+        bad_header.length = header.length
+        bad_header.checksum = header.checksum ^ 1
+        await node.handle_frame("peer", bad_header, payload)
+        assert len(received) == 1
+        assert "checksum" in capsys.readouterr().out
+
+    for executor in (CountingThreadPool(1), CountingProcessPool(1)):
+        with executor:
+            asyncio.run(run(executor))
+        assert executor.submitted == 2
@@ -0,0 +1,70 @@
+"""
+Tests checking outbound message queue.
+"""
+
+import asyncio
+
+import pytest
+
+from pinkcoin.network.exceptions import OutboundBufferOverflow
+from pinkcoin.network.outbound import OutboundQueue
+
+
+class FakeTransport:
+    """
+    Transport recording writes, its buffer is emptied by drain().
+    """
+    def __init__(self):
+        self.writes = []
+        self.buffered = 0
+        self.limits = None
+
+    def set_write_buffer_limits(self, high, low):
+        # pylint: disable=missing-docstring
+        self.limits = (high, low)
+
+    def get_write_buffer_size(self):
+        # pylint: disable=missing-docstring
+        return self.buffered
+
+    def write(self, data):
+        # pylint: disable=missing-docstring
+        self.writes.append(bytes(data))
+        self.buffered += len(data)
+
+    async def drain(self):
+        # pylint: disable=missing-docstring
+        await asyncio.sleep(0)
+        self.buffered = 0
+
+
+def test_coalesced_writes():
+    """
+    Checks joining small messages and writing big ones separately.
+    """
+    async def run():
+        transport = FakeTransport()
+        outbound = OutboundQueue(transport, transport.drain, high_water=100,
+                                 low_water=10, coalesce_size=50)
+        assert transport.limits == (100, 10)
+        task = asyncio.ensure_future(outbound.run())
+        for frame in [b"a"*10, b"b"*10, b"c"*60, b"d"*10]:
+            outbound.put(frame)
+        await outbound.flush()
+        assert transport.writes == [b"a"*10 + b"b"*10, b"c"*60, b"d"*10]
+        assert outbound.buffered_size() == 0
+        task.cancel()
+
+    asyncio.run(run())
+
+
+def test_buffer_limit():
+    """
+    Checks rejecting messages above outbound buffer limit.
+    """
+    transport = FakeTransport()
+    outbound = OutboundQueue(transport, transport.drain, max_buffered=100)
+    outbound.put(b"x"*60)
+    transport.buffered = 30
+    with pytest.raises(OutboundBufferOverflow):
+        outbound.put(b"x"*20)
@@ -0,0 +1,86 @@
+"""
+Tests checking outbound connections management.
+"""
+
+import asyncio
+
+from pinkcoin.network.peer_manager import PeerManager
+
+
+class FakeNode:
+    """
+    Node whose connections to refused addresses fail.
+    """
+    def __init__(self, refused=()):
+        self.refused = set(refused)
+        self.attempts = []
+        self.open_peers = {}
+
+    async def open_peer(self, peer_ip, peer_port):
+        # pylint: disable=missing-docstring
+        self.attempts.append((peer_ip, peer_port))
+        await asyncio.sleep(0)
+        if (peer_ip, peer_port) in self.refused:
+            raise ConnectionRefusedError()
+        peer = asyncio.Event()
+        self.open_peers[(peer_ip, peer_port)] = peer
+        return peer
+
+    async def run_peer(self, peer):
+        # pylint: disable=missing-docstring
+        await peer.wait()
+
+
+def test_outbound_target():
+    """
+    Checks keeping target number of connections and replacing dropped peers.
+    """
+    async def run():
+        candidates = [("10.0.0.1", 9134), ("10.0.0.2", 9134), ("10.0.0.3", 9134)]
+        node = FakeNode(refused=[candidates[0]])
+        manager = PeerManager(node, candidates, target_outbound=1, max_dialing=1,
+                              base_backoff=60.0)
+        task = asyncio.ensure_future(manager.run())
+        for _ in range(20):
+            await asyncio.sleep(0)
+        assert len(manager.connected) == 1
+        assert len(node.attempts) <= 2
+
+        first = next(iter(manager.connected))
+        node.open_peers[first].set()
+        for _ in range(20):
+            await asyncio.sleep(0)
+        assert list(manager.connected) == [
+            address for address in candidates[1:] if address != first
+        ], "Dropped peer was not replaced"
+        assert manager.candidates[candidates[0]].failures <= 1
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+
+
+def test_backoff():
+    """
+    Checks exponential retry delays with jitter.
+    """
+    manager = PeerManager(FakeNode(), base_backoff=1.0, max_backoff=30.0)
+    for failures, delay in [(1, 1.0), (3, 4.0), (10, 30.0)]:
+        for _ in range(10):
+            assert delay / 2 <= manager.backoff(failures) <= delay
+
+
+def test_fill_above_target():
+    """
+    Checks that no connections are started above the target.
+    """
+    async def run():
+        candidates = [(f"10.0.0.{index}", 9134) for index in range(1, 6)]
+        node = FakeNode()
+        manager = PeerManager(node, candidates, target_outbound=1)
+        manager.connected = {candidates[0]: None, candidates[1]: None}
+        manager.fill()
+        assert not manager.dialing
+        assert not manager.tasks
+
+    asyncio.run(run())
@@ -0,0 +1,70 @@
+"""
+Tests checking peer connection protocol.
+"""
+
+import asyncio
+
+import pytest
+
+from pinkcoin.network.core import serializers
+from pinkcoin.network.exceptions import NodeDisconnectException
+from pinkcoin.network.protocol import PeerProtocol
+
+
+class FakeTransport:
+    """
+    Transport recording calls made by the protocol.
+    """
+    def __init__(self):
+        self.aborted = False
+
+    def abort(self):
+        # pylint: disable=missing-docstring
+        self.aborted = True
+
+
+def _receive(protocol, data, chunk_size):
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start:start + chunk_size]
+        buf = protocol.get_buffer(-1)
+        buf[:len(chunk)] = chunk
+        protocol.buffer_updated(len(chunk))
+
+
+def test_read_frames():
+    """
+    Checks framing data received into the protocol buffer.
+    """
+    async def run():
+        protocol = PeerProtocol("peer")
+        protocol.connection_made(FakeTransport())
+        pings = [serializers.Ping() for _ in range(10)]
+        _receive(protocol, b"".join(ping.get_message() for ping in pings), 7)
+        frames = await protocol.read_frames()
+        assert [payload for _, payload in frames] == [
+            serializers.PingSerializer().serialize(ping) for ping in pings
+        ]
+
+        protocol.connection_lost(None)
+        with pytest.raises(NodeDisconnectException):
+            await protocol.read_frames()
+
+    asyncio.run(run())
+
+
+def test_oversized_frame():
+    """
+    Checks aborting connection when peer sends too big message.
+    """
+    async def run():
+        protocol = PeerProtocol("peer")
+        transport = FakeTransport()
+        protocol.connection_made(transport)
+        frame = bytearray(serializers.Ping().get_message())
+        frame[16:20] = (1 << 30).to_bytes(4, "little")
+        _receive(protocol, frame, 64)
+        assert transport.aborted
+        with pytest.raises(NodeDisconnectException):
+            await protocol.read_frames()
+
+    asyncio.run(run())
@@ -0,0 +1,85 @@
+"""
+Tests checking buffer reader used by deserializers.
+"""
+
+import pickle
+
+import pytest
+
+from pinkcoin.network.reader import BufferReader
+from pinkcoin.network.exceptions import InsufficientDataException
+from pinkcoin.network.core import serializers
+
+
+def test_read_shares_buffer():
+    """
+    Checks that read data is a view of the buffer.
+    """
+    data = b"\x03abcdef"
+    reader = BufferReader(data)
+    assert reader.read(1)[0] == 3
+    chunk = reader.read(3)
+    assert isinstance(chunk, memoryview)
+    assert chunk.obj is data, "Data was copied"
+    assert bytes(chunk) == b"abc"
+    assert reader.remaining() == 3
+
+
+def test_read_past_end():
+    """
+    Checks reading more data than available.
+    """
+    reader = BufferReader(b"\x00\x01")
+    with pytest.raises(InsufficientDataException):
+        reader.read(3)
+    assert reader.offset == 0, "Cursor moved after failed read"
+
+
+def test_version_deserialization():
+    """
+    Checks deserialization of the version message from the buffer.
+    """
+    version = serializers.Version()
+    serializer = serializers.VersionSerializer()
+    payload = serializer.serialize(version)
+
+    result = serializer.deserialize(BufferReader(payload))
+    assert result.user_agent == version.user_agent.encode("utf-8")
+    assert result.nonce == version.nonce
+    assert result.addr_recv.port == 9134
+    assert serializer.serialize(result) == payload
+    assert pickle.loads(pickle.dumps(result)).user_agent == result.user_agent
+
+
+class ChunkedStream:
+    """
+    Non-seekable stream returning at most 3 bytes per read.
+    """
+    # pylint: disable=too-few-public-methods
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, size):
+        # pylint: disable=missing-docstring
+        size = min(size, 3)
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+
+def test_stream_deserialization():
+    """
+    Checks deserialization from a stream which can't seek.
+    """
+    header = serializers.BlockHeader()
+    header.nonce = 7
+    serializer = serializers.BlockHeaderSerializer()
+    data = serializer.serialize(header)
+    stream = ChunkedStream(data + data[:40])
+
+    result = serializer.deserialize(stream)
+    assert result.nonce == 7
+    assert result._raw == data
+    assert result.calculate_hash() == header.calculate_hash()
+    assert stream.data == data[:40], "Data after the header was read"
+    with pytest.raises(InsufficientDataException):
+        serializer.deserialize(stream)
@@ -0,0 +1,303 @@
+"""
+Tests checking serializers of network messages.
+"""
+
+from io import BytesIO
+import pickle
+
+import pytest
+
+from pinkcoin.network import data_fields
+from pinkcoin.network.base_serializer import (
+    Serializer, StructRun, MessageHeaderSerializer, FrameCache
+)
+from pinkcoin.network.core import serializers
+from pinkcoin.network.reader import BufferReader
+from pinkcoin.primitives.hashes import Hash256
+
+
+def test_struct_runs():
+    """
+    Checks grouping of fixed width fields into struct runs.
+    """
+    layout = serializers.IPv4AddressSerializer._layout
+    assert len(layout) == 2, "Fields with different byte order in one run"
+    assert layout[0].names == ("services", "ip_address")
+    assert layout[1].struct.format == ">H"
+
+    layout = serializers.BlockSerializer._layout
+    assert isinstance(layout[0], StructRun)
+    assert layout[0].size == 80, "Wrong block header size"
+
+
+def test_block_header_roundtrip():
+    """
+    Checks serialization and deserialization of block header.
+    """
+    header = serializers.BlockHeader()
+    header.version = 7
+    header.prev_block = Hash256.from_hex(
+        "00000f79b700e6444665c4d090c9b8833664c4e2597c7087a6ba6391b956cc89"
+    )
+    header.merkle_root = Hash256.from_int(1 << 255)
+    header.timestamp = 1400000000
+    header.bits = 0x1e0fffff
+    header.nonce = 12345
+
+    serializer = serializers.BlockHeaderSerializer()
+    bin_data = serializer.serialize(header)
+    assert len(bin_data) == 82, "Wrong serialized header size"
+
+    result = serializer.deserialize(BytesIO(bin_data))
+    for field_name in serializers.BlockHeaderSerializer._fields:
+        assert getattr(result, field_name) == getattr(header, field_name), field_name
+
+
+def test_address_roundtrip():
+    """
+    Checks IPv4 address with timestamp serialization.
+    """
+    address = serializers.IPv4AddressTimestamp()
+    address.ip_address = "45.32.49.237"
+    address.port = 9134
+
+    serializer = serializers.IPv4AddressTimestampSerializer()
+    bin_data = serializer.serialize(address)
+    assert bin_data[12:24] == b"\x00"*10 + b"\xff"*2
+    assert bin_data[-2:] == b"\x23\xae", "Port is not big-endian"
+
+    result = serializer.deserialize(BytesIO(bin_data))
+    assert result.ip_address == "45.32.49.237"
+    assert result.port == 9134
+    assert result.timestamp == address.timestamp
+
+
+def test_get_headers_locator():
+    """
+    Checks serialization of hashes given as integers in block locator.
+    """
+    genesis = 0x00000f79b700e6444665c4d090c9b8833664c4e2597c7087a6ba6391b956cc89
+    get_headers = serializers.GetHeaders([genesis, Hash256.from_int(genesis)])
+    bin_data = serializers.GetHeadersSerializer().serialize(get_headers)
+    assert len(bin_data) == 4 + 1 + 3*32
+    assert bin_data[5:37] == bin_data[37:69] == genesis.to_bytes(32, "little")
+
+
+def _make_tx(value):
+    tx_in = serializers.TxIn()
+    tx_in.previous_output = serializers.OutPoint()
+    tx_in.previous_output.out_hash = Hash256.from_int(value)
+    tx_in.signature_script = b"\x01\x02"
+    tx_out = serializers.TxOut()
+    tx_out.value = value
+    tx_out.pk_script = b"\x76\xa9"
+    tx = serializers.Tx()
+    tx.tx_in = [tx_in]
+    tx.tx_out = [tx_out, tx_out]
+    return tx
+
+
+def test_lazy_block_transactions():
+    """
+    Checks that block transactions are parsed on access.
+    """
+    block = serializers.Block()
+    block.txns = [_make_tx(1), _make_tx(300)]
+    block.block_sig = b"\x30\x44"
+    serializer = serializers.BlockSerializer()
+    bin_data = serializer.serialize(block)
+
+    result = serializer.deserialize(BufferReader(bin_data))
+    assert len(result) == 2
+    assert bytes(result.block_sig) == b"\x30\x44"
+    assert result.txns.items == [None, None], "Transactions parsed eagerly"
+
+    tx = result.txns[-1]
+    assert result.txns.items[0] is None
+    assert tx.tx_out[1].value == 300
+    assert tx.tx_in[0].previous_output.out_hash == Hash256.from_int(300)
+    assert result.txns.item_raw(1) == serializers.TxSerializer().serialize(block.txns[1])
+    assert serializer.serialize(result) == bin_data
+
+
+def test_lazy_block_modified_transaction():
+    """
+    Checks that modified transactions of a lazy block are serialized.
+    """
+    block = serializers.Block()
+    block.txns = [_make_tx(1), _make_tx(300), _make_tx(5)]
+    block.block_sig = b"\x30"
+    serializer = serializers.BlockSerializer()
+    bin_data = serializer.serialize(block)
+
+    result = serializer.deserialize(BufferReader(bin_data))
+    assert result.txns[2].lock_time == block.txns[2].lock_time
+    result.txns[1].version = 5
+    result.clear_raw()
+    block.txns[1].version = 5
+    expected = serializer.serialize(block)
+    assert expected != bin_data
+
+    assert serializer.serialized_size(result) == len(expected)
+    assert serializer.serialize(result) == expected
+    buf = bytearray()
+    serializer.encode_into(buf, result)
+    assert buf == expected
+    buf = bytearray(len(expected))
+    assert serializer.serialize_into(buf, 0, result) == len(expected)
+    assert buf == expected
+
+
+def test_pickle_decoded_models():
+    """
+    Checks pickling models sharing the received buffer.
+    """
+    block = serializers.Block()
+    block.txns = [_make_tx(1), _make_tx(300)]
+    block.block_sig = b"\x30"
+    serializer = serializers.BlockSerializer()
+    bin_data = serializer.serialize(block)
+
+    result = serializer.deserialize(BufferReader(bin_data))
+    tx_hash = result.txns[0].calculate_hash()
+    loaded = pickle.loads(pickle.dumps(result))
+    assert loaded.txns[0]._raw == result.txns[0]._raw
+    assert loaded.txns[0].calculate_hash() == tx_hash
+    assert loaded.txns[1].tx_out[1].value == 300
+    assert serializer.serialize(loaded) == bin_data
+
+
+def test_slots_models():
+    """
+    Checks that slotted models are built by the generated factory.
+    """
+    assert serializers.TxInSerializer._model_factory is not None
+    assert serializers.VersionSerializer._model_factory is None
+
+    tx_in = serializers.TxInSerializer().deserialize(
+        BufferReader(serializers.TxInSerializer().serialize(_make_tx(5).tx_in[0]))
+    )
+    assert not hasattr(tx_in, "__dict__")
+    assert tx_in.previous_output.out_hash == Hash256.from_int(5)
+    assert tx_in.sequence == 0xFFFFFFFF
+
+
+def test_slots_verification():
+    """
+    Checks that fields without slots in the model are rejected.
+    """
+    class Model:
+        # pylint: disable=missing-docstring
+        __slots__ = ("nonce",)
+
+    with pytest.raises(TypeError):
+        class ModelSerializer(Serializer):
+            # pylint: disable=missing-docstring,unused-variable
+            model_class = Model
+            nonce = data_fields.UInt64LEField()
+            user_agent = data_fields.VariableStringField()
+
+
+def test_retained_raw_data():
+    """
+    Checks hashing and serialization from retained binary data.
+    """
+    header = serializers.BlockHeader()
+    header.timestamp = 1400000000
+    header.nonce = 12345
+    serializer = serializers.BlockHeaderSerializer()
+    bin_data = serializer.serialize(header)
+
+    result = serializer.deserialize(BufferReader(bin_data))
+    assert result._raw.obj is bin_data, "Binary data was copied"
+    header_hash = result.calculate_hash()
+    assert header_hash == header.calculate_hash()
+    assert result.calculate_hash() is header_hash, "Hash was not memoised"
+
+    result.nonce = 1
+    header.nonce = 1
+    assert result._raw is None, "Retained data was not dropped"
+    assert serializer.serialize(result) == serializer.serialize(header) != bin_data
+    assert result.calculate_hash() == header.calculate_hash() != header_hash
+
+    tx = _make_tx(7)
+    result = serializers.TxSerializer().deserialize(
+        BufferReader(serializers.TxSerializer().serialize(tx))
+    )
+    assert result.calculate_hash() == tx.calculate_hash()
+    assert "Hash=[" in repr(result)
+    result.lock_time = tx.lock_time = 500
+    assert serializers.TxSerializer().serialize(result) == serializers.TxSerializer().serialize(tx)
+    assert result.calculate_hash() == tx.calculate_hash()
+
+
+def test_serialize_into():
+    """
+    Checks serialization into preallocated buffers.
+    """
+    block = serializers.Block()
+    block.txns = [_make_tx(1), _make_tx(0x10000)]
+    block.block_sig = "sig"
+    serializer = serializers.BlockSerializer()
+    bin_data = bytearray()
+    serializer.encode_into(bin_data, block)
+    assert serializer.serialized_size(block) == len(bin_data)
+
+    buf = bytearray(len(bin_data) + 4)
+    assert serializer.serialize_into(buf, 2, block) == len(bin_data) + 2
+    assert buf[2:-2] == bin_data
+
+    lazy_block = serializer.deserialize(BufferReader(bytes(bin_data)))
+    lazy_block.clear_raw()
+    assert serializer.serialized_size(lazy_block) == len(bin_data)
+    assert serializer.serialize(lazy_block) == bin_data
+
+
+def test_get_message():
+    """
+    Checks framing of the message with header.
+    """
+    message = serializers.Version()
+    frame = message.get_message("test")
+    payload = serializers.VersionSerializer().serialize(message)
+    assert frame[24:] == payload
+    header = MessageHeaderSerializer().deserialize(BufferReader(frame[:24]))
+    assert header.command == "version"
+    assert header.length == len(payload)
+    assert header.checksum == MessageHeaderSerializer.calc_checksum(payload)
+    assert header.magic == 0x0D050402
+
+
+def test_frame_cache(monkeypatch):
+    """
+    Checks reusing frames of constant and repeated messages.
+    """
+    frame = serializers.VerAck().get_message("test")
+    assert isinstance(frame, bytes)
+    assert frame == serializers.VerAck().build_frame("test")
+    assert serializers.VerAck().get_message("test") is frame
+    assert serializers.VerAck().get_message("main") != frame
+
+    cache = FrameCache(max_frames=2)
+    pings = [serializers.Ping() for _ in range(3)]
+    frames = [cache.get("main", ping) for ping in pings]
+    assert [ping.build_frame() for ping in pings] == frames
+    assert all(isinstance(frame, bytes) for frame in frames)
+    assert cache.get("main", pings[2]) is frames[2]
+    assert cache.get("main", pings[0]) is not frames[0], "Frame was not evicted"
+
+    serialized = []
+    serialize_into = serializers.PingSerializer.serialize_into
+    monkeypatch.setattr(
+        serializers.PingSerializer, "serialize_into",
+        lambda self, *args: serialized.append(1) or serialize_into(self, *args)
+    )
+    cache.get("main", serializers.Ping())
+    assert len(serialized) == 1, "Message was serialized more than once"
+
+    cache = FrameCache(max_payload_size=8)
+    version = serializers.Version()
+    frame = cache.get("main", version)
+    assert isinstance(frame, bytes)
+    assert frame == version.build_frame()
+    assert not cache.frames
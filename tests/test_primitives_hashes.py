@@ -0,0 +1,36 @@
+"""
+Tests checking hash value types.
+"""
+
+import pytest
+
+from pinkcoin.primitives.hashes import Hash256
+
+
+GENESIS_HEX = "00000f79b700e6444665c4d090c9b8833664c4e2597c7087a6ba6391b956cc89"
+
+
+def test_hash256_conversions():
+    """
+    Checks conversions between hash representations.
+    """
+    hash_ = Hash256.from_hex(GENESIS_HEX)
+    assert hash_.to_hex() == GENESIS_HEX
+    assert str(hash_) == GENESIS_HEX
+    assert hash_.to_int() == int(GENESIS_HEX, 16)
+    assert Hash256.from_int(int(GENESIS_HEX, 16)) == hash_
+    assert Hash256.from_value("0x" + GENESIS_HEX) == hash_
+    assert bytes(hash_) == bytes.fromhex(GENESIS_HEX)[::-1]
+    assert "{:x}".format(hash_) == GENESIS_HEX.lstrip("0")
+
+
+def test_hash256_as_key():
+    """
+    Checks that hashes work as dict keys.
+    """
+    raw = bytes(range(32))
+    index = {Hash256(raw): 1}
+    assert index[Hash256(bytearray(raw))] == 1
+    assert Hash256().is_null()
+    with pytest.raises(ValueError):
+        Hash256(b"\x00"*31)
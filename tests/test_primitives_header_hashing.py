@@ -0,0 +1,59 @@
+"""
+Tests checking batch hashing of block headers.
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+from pinkcoin.network.core import serializers
+from pinkcoin.network.reader import BufferReader
+from pinkcoin.primitives.header_hashing import (
+    HeaderHasher, HeaderHashCache, scrypt_hash
+)
+from pinkcoin.primitives.hashes import Hash256
+
+
+def _headers(count):
+    headers = []
+    for nonce in range(count):
+        header = serializers.BlockHeader()
+        header.nonce = nonce
+        headers.append(header)
+    return headers
+
+
+def test_hash_headers():
+    """
+    Checks batch hashes against single header hashes and caching.
+    """
+    headers = _headers(10)
+    headers_data = [header.get_header_data() for header in headers]
+    cache = HeaderHashCache(max_size=8)
+    hasher = HeaderHasher(chunk_size=3, cache=cache)
+    hashes = hasher.hash_headers(headers_data)
+    assert hashes == [Hash256(scrypt_hash(data)) for data in headers_data]
+    assert len(cache) == 8
+    assert cache.get(headers_data[0]) is None, "Oldest hash was not evicted"
+    assert cache.get(headers_data[-1]) is hashes[-1]
+    assert hasher.hash_headers(headers_data[-2:]) == hashes[-2:]
+    hasher.shutdown()
+
+    other = HeaderHasher(cache=HeaderHashCache())
+    assert other.executor is hasher.executor, "Executor was not shared"
+    assert other.hash_headers(headers_data[:1]) == hashes[:1]
+
+
+def test_hash_block_headers():
+    """
+    Checks memoising hashes of deserialized headers hashed in processes.
+    """
+    serializer = serializers.BlockHeaderSerializer()
+    headers = [
+        serializer.deserialize(BufferReader(serializer.serialize(header)))
+        for header in _headers(4)
+    ]
+    with ProcessPoolExecutor(2) as executor:
+        hasher = HeaderHasher(executor, chunk_size=2, cache=HeaderHashCache())
+        hashes = asyncio.run(hasher.hash_block_headers(headers))
+    assert [header._hash for header in headers] == hashes
+    assert hashes == [header.calculate_hash() for header in _headers(4)]
@@ -0,0 +1,179 @@
+"""
+Tests checking persistent header store.
+"""
+
+import os
+
+import pytest
+
+from pinkcoin.network import params
+from pinkcoin.network.core import serializers
+from pinkcoin.primitives.chain import BlockIndex, check_proof_of_work
+from pinkcoin.primitives.hashes import Hash256
+from pinkcoin.primitives.header_store import HeaderStore
+
+
+GENESIS = Hash256.from_hex(params.GENESIS_BLOCK_HASHES["main"])
+EASY_BITS = 0x207fffff
+EASY_LIMIT = (1 << 256) - 1
+
+
+def _build_chain(count, nonce=0, chain=None, prev_hash=GENESIS):
+    chain = chain or BlockIndex(GENESIS, EASY_LIMIT)
+    headers = []
+    for _ in range(count):
+        header = serializers.BlockHeader()
+        header.prev_block = prev_hash
+        header.bits = EASY_BITS
+        header.nonce = nonce
+        while not check_proof_of_work(header.calculate_hash(), header.bits, EASY_LIMIT):
+            header.nonce += 1
+        nonce = header.nonce + 1
+        prev_hash = header.calculate_hash()
+        headers.append(header)
+    chain.add_headers(headers, [header.calculate_hash() for header in headers])
+    return chain
+
+
+def _open_store(directory):
+    store = HeaderStore(str(directory), GENESIS)
+    store.index.min_slots = 16
+    store.open()
+    return store
+
+
+def test_save_and_load(tmp_path):
+    """
+    Checks that loaded index equals the saved active chain.
+    """
+    chain = _build_chain(50)
+    store = _open_store(tmp_path)
+    assert store.save_chain(chain) == 50
+    assert store.save_chain(chain) == 0
+    store.flush()
+    store.close()
+
+    store = _open_store(tmp_path)
+    assert len(store) == 51
+    loaded = store.load_index(EASY_LIMIT)
+    assert loaded.height == 50
+    assert loaded.tip == chain.tip
+    assert loaded.get_chainwork(loaded.tip_id) == chain.get_chainwork(chain.tip_id)
+    assert loaded.get_locator() == chain.get_locator()
+    for height in (0, 1, 17, 50):
+        block_hash = chain.get_hash(chain.chain[height])
+        assert store.get_height(block_hash) == height
+        assert loaded.get_id(block_hash) == height
+        assert loaded.get_header_data(height) == chain.get_header_data(chain.chain[height])
+    assert store.get_height(Hash256.from_int(1)) is None
+
+    # Headers connect to the loaded chain and forks find their ancestors.
+    _build_chain(3, chain=loaded, prev_hash=loaded.tip)
+    assert loaded.height == 53
+    _build_chain(30, nonce=1000, chain=loaded, prev_hash=loaded.get_hash(10))
+    fork_tip = len(loaded) - 1
+    assert loaded.get_ancestor(fork_tip, 5) == 5
+    assert loaded.get_ancestor(fork_tip, 20) == fork_tip - 20
+
+    # Invalidated loaded blocks move the tip to the fork.
+    loaded.mark_invalid(30)
+    assert loaded.tip_id == fork_tip
+    assert not loaded.is_valid(53) and loaded.is_valid(29)
+    store.close()
+
+
+def test_reorg(tmp_path):
+    """
+    Checks that records of the replaced chain are rewritten.
+    """
+    chain = _build_chain(20)
+    store = _open_store(tmp_path)
+    store.save_chain(chain)
+    old_hash = chain.get_hash(chain.chain[15])
+    _build_chain(30, nonce=1000, chain=chain, prev_hash=chain.get_hash(chain.chain[10]))
+    assert store.save_chain(chain) == 30
+    assert len(store) == 41
+    assert store.get_hash(40) == chain.tip
+    assert store.get_height(old_hash) is None
+    assert store.get_height(chain.get_hash(chain.chain[15])) == 15
+
+    loaded = store.load_index(EASY_LIMIT)
+    assert loaded.get_id(old_hash) is None
+    assert loaded.tip == chain.tip
+    store.close()
+
+
+def test_loaded_index_after_reorg(tmp_path):
+    """
+    Checks that loaded index keeps its blocks when the store is rewritten.
+    """
+    chain = _build_chain(20)
+    store = _open_store(tmp_path)
+    store.save_chain(chain)
+    loaded = store.load_index(EASY_LIMIT)
+    old_hash = chain.get_hash(chain.chain[15])
+
+    _build_chain(30, nonce=1000, chain=chain, prev_hash=chain.get_hash(chain.chain[10]))
+    store.save_chain(chain)
+    store.close()
+    assert loaded.get_id(old_hash) == 15
+    assert chain.tip not in loaded
+
+    _build_chain(2, nonce=5000, chain=loaded, prev_hash=loaded.tip)
+    assert loaded.height == 22
+    assert loaded.get_ancestor(loaded.tip_id, 15) == 15
+
+
+def test_recovery(tmp_path):
+    """
+    Checks truncation of torn and unlinked records on open.
+    """
+    chain = _build_chain(20)
+    store = _open_store(tmp_path)
+    store.save_chain(chain)
+    store.close()
+
+    with open(os.path.join(str(tmp_path), "headers.dat"), "ab") as headers_file:
+        headers_file.write(bytes(50))
+    with open(os.path.join(str(tmp_path), "blocks.dat"), "ab") as blocks_file:
+        blocks_file.write(bytes(64))
+    store = _open_store(tmp_path)
+    assert len(store) == 21
+    store.close()
+
+    with open(os.path.join(str(tmp_path), "headers.dat"), "r+b") as headers_file:
+        headers_file.seek(15*80 + 4)
+        headers_file.write(bytes(32))
+    store = _open_store(tmp_path)
+    assert len(store) == 15
+    assert store.get_height(chain.get_hash(chain.chain[16])) is None
+    assert store.save_chain(chain) == 6
+    assert store.load_index(EASY_LIMIT).tip == chain.tip
+    store.close()
+
+    # Zeroed tip record is linked to the previous one by its header.
+    with open(os.path.join(str(tmp_path), "blocks.dat"), "r+b") as blocks_file:
+        blocks_file.seek(20*64)
+        blocks_file.write(bytes(64))
+    store = _open_store(tmp_path)
+    assert len(store) == 20
+    assert store.save_chain(chain) == 1
+    store.close()
+
+    # Tip hash not matching its header, chain work is still right.
+    with open(os.path.join(str(tmp_path), "blocks.dat"), "r+b") as blocks_file:
+        blocks_file.seek(20*64)
+        blocks_file.write(bytes(32))
+    store = _open_store(tmp_path)
+    assert len(store) == 20
+    assert Hash256(bytes(32)) not in store.load_index(EASY_LIMIT).get_locator()
+    assert store.save_chain(chain) == 1
+    store.close()
+
+    os.remove(os.path.join(str(tmp_path), "headers.idx"))
+    store = _open_store(tmp_path)
+    assert store.get_height(chain.tip) == 20
+    store.close()
+
+    with pytest.raises(ValueError):
+        HeaderStore(str(tmp_path), Hash256.from_int(1)).open()